@@ -68,6 +68,18 @@ class CoreConfig(AppConfig):
             dispatch_uid='waldur_core.core.handlers.log_token_create',
         )
 
+        signals.post_save.connect(
+            handlers.invalidate_token_cache,
+            sender=Token,
+            dispatch_uid='waldur_core.core.handlers.invalidate_token_cache',
+        )
+
+        signals.post_delete.connect(
+            handlers.delete_token_cache,
+            sender=Token,
+            dispatch_uid='waldur_core.core.handlers.delete_token_cache',
+        )
+
         for index, model in enumerate(StateMixin.get_all_models()):
             fsm_signals.post_transition.connect(
                 handlers.delete_error_message,
@@ -1,11 +1,11 @@
 from __future__ import unicode_literals
 
 from django.conf import settings
-from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 from rest_framework import exceptions
 import rest_framework.authentication
 
+from waldur_core.core import token_activity
 import waldur_core.logging.middleware
 
 TOKEN_KEY = settings.WALDUR_CORE.get('TOKEN_KEY', 'x-auth-token')
@@ -47,20 +47,16 @@ class TokenAuthentication(rest_framework.authentication.TokenAuthentication):
         return auth
 
     def authenticate_credentials(self, key):
-        model = self.get_model()
         try:
-            token = model.objects.select_related('user').get(key=key)
-        except model.DoesNotExist:
+            token = token_activity.get_token(key)
+        except self.get_model().DoesNotExist:
             raise exceptions.AuthenticationFailed(_('Invalid token.'))
 
         if not token.user.is_active:
             raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
 
-        if token.user.token_lifetime:
-            lifetime = timezone.timedelta(seconds=token.user.token_lifetime)
-
-            if token.created < timezone.now() - lifetime:
-                raise exceptions.AuthenticationFailed(_('Token has expired.'))
+        if token_activity.is_expired(token):
+            raise exceptions.AuthenticationFailed(_('Token has expired.'))
 
         return token.user, token
 
@@ -91,12 +87,12 @@ def user_capturing_auth(auth):
         def authenticate(self, request):
             result = super(CapturingAuthentication, self).authenticate(request)
             if result is not None:
-                user, _ = result
+                user, token = result
                 waldur_core.logging.middleware.set_current_user(user)
-                token = user.auth_token
+                if token is None:
+                    token = user.auth_token
                 if token:
-                    token.created = timezone.now()
-                    token.save()
+                    token_activity.touch(token)
             return result
 
     return CapturingAuthentication
@@ -1,3 +1,8 @@
+from celery import chain
+from celery.canvas import maybe_signature
+from celery.result import GroupResult
+from celery.utils import uuid
+
 from waldur_core.core import utils, tasks
 
 
@@ -22,7 +27,10 @@ class BaseExecutor(object):
         Examples:
          - to execute only one task - return Signature of necessary task: `task.si(serialized_instance)`
          - to execute several tasks - return Chain of tasks: `chain(t1.s(), t2.s())`
-        Note! Celery chord and group is not supported.
+         - to execute independent tasks in parallel - return Group of tasks: `group(t1.si(), t2.si())`,
+           it could be combined with other tasks: `chain(t1.si(), group(t2.si(), t3.si()), t4.si())`
+        Success signature is applied once after all tasks are completed, failure signature
+        is applied on failure of any task.
         """
         raise NotImplementedError('Executor %s should implement method `get_task_signature`' % cls.__name__)
 
@@ -65,10 +73,13 @@ class BaseExecutor(object):
         link_error = cls.get_failure_signature(instance, serialized_instance, **kwargs)
 
         if async:
+            if has_groups(signature):
+                signature = link_signature(signature, link)
+                link = None
             return signature.apply_async(link=link, link_error=link_error, countdown=countdown,
                                          queue=is_heavy_task and 'heavy' or None)
         else:
-            result = signature.apply()
+            result = apply_signature_sync(signature)
             callback = link if not result.failed() else link_error
             if callback is not None:
                 cls._apply_callback(callback, result)
@@ -83,6 +94,63 @@ class BaseExecutor(object):
         callback.apply()
 
 
+def get_subtasks(signature):
+    """ Return signatures of chain, group or chord members, chord body is the last one. """
+    subtask_type = getattr(signature, 'subtask_type', None)
+    if subtask_type not in ('chain', 'group', 'chord'):
+        return []
+    subtasks = [maybe_signature(task) for task in signature.tasks]
+    if subtask_type == 'chord':
+        subtasks.append(maybe_signature(signature.body))
+    return subtasks
+
+
+def has_groups(signature):
+    if getattr(signature, 'subtask_type', None) in ('group', 'chord'):
+        return True
+    return any(has_groups(task) for task in get_subtasks(signature))
+
+
+def link_signature(signature, link=None):
+    """ Append success callback to signature with groups.
+
+    Signature is converted to chain, so Celery executes each group followed by a task
+    as a chord. Success callback is applied once after all tasks of the last group
+    are completed. Error callback passed to chain is attached to each of its steps
+    and to body of each chord, so it is applied once if any task has failed.
+    """
+    # Group has to be followed by a task, otherwise error callback is not applied.
+    return chain(signature, link or tasks.EmptyTask().si())
+
+
+def apply_signature_sync(signature, args=()):
+    """ Execute signature in current process and return result of the last or failed task.
+
+    Members of groups are executed sequentially, result of group is passed to the next task.
+    """
+    subtask_type = getattr(signature, 'subtask_type', None)
+    if subtask_type == 'chain':
+        result = None
+        for task in get_subtasks(signature):
+            result = apply_signature_sync(task, args)
+            if result.failed():
+                break
+            args = (result.get(),)
+        return result
+
+    if subtask_type in ('group', 'chord'):
+        results = [apply_signature_sync(task, args) for task in map(maybe_signature, signature.tasks)]
+        failed_results = [result for result in results if result.failed()]
+        if failed_results:
+            return failed_results[0]
+        result = GroupResult(uuid(), results)
+        if subtask_type == 'chord':
+            result = apply_signature_sync(maybe_signature(signature.body), (result.get(),))
+        return result
+
+    return signature.apply(args)
+
+
 class ExecutorException(Exception):
     pass
 
@@ -5,6 +5,7 @@ from django.forms import model_to_dict
 from rest_framework.authtoken.models import Token
 import six
 
+from waldur_core.core import token_activity
 from waldur_core.core.log import event_logger
 from waldur_core.core.models import StateMixin
 
@@ -127,3 +128,12 @@ def log_token_create(sender, instance, created=False, **kwargs):
             'Token has been updated for {affected_user_username}',
             event_type='token_created',
             event_context={'affected_user': instance.user})
+
+
+def invalidate_token_cache(sender, instance, **kwargs):
+    token_activity.invalidate(instance.key)
+
+
+def delete_token_cache(sender, instance, **kwargs):
+    """ Token is deleted on logout or when it is expired. """
+    token_activity.invalidate(instance.key, activity=True)
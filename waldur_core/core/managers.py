@@ -1,10 +1,15 @@
+import base64
+from collections import defaultdict, OrderedDict
 import copy
-import functools
-import heapq
-import itertools
+import json
 
 from django.contrib.contenttypes.models import ContentType
-from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, models
+from django.db.models import F, Min, Value
+from django.db.models.constants import LOOKUP_SEP
+from django.db.models.functions import Lower
+from django.utils.encoding import force_bytes, force_text
 import six
 
 
@@ -76,7 +81,21 @@ class GenericKeyMixin(object):
 
 
 class SummaryQuerySet(object):
-    """ Fake queryset that emulates union of different models querysets """
+    """ Fake queryset that emulates union of different models querysets.
+
+    Count, ordering and slicing are executed by database as one query over UNION ALL of
+    querysets projected to common columns: model index, primary key and ordering keys.
+    Only objects of the requested page are fetched from querysets of their models.
+    If ordering is not defined explicitly, common ordering of querysets is used.
+    Objects with equal ordering keys are ordered by model index and primary key.
+
+    Deep pages can be fetched with keyset pagination instead of offset:
+        objects, next_cursor = summary_queryset.get_page(size=10)
+        objects, next_cursor = summary_queryset.get_page(size=10, cursor=next_cursor)
+    """
+    MODEL_COLUMN = 'summary_model'
+    PK_COLUMN = 'summary_pk'
+    KEY_COLUMN = 'summary_key_%s'
 
     def __init__(self, summary_models):
         self.querysets = [model.objects.all() for model in summary_models]
@@ -94,13 +113,36 @@ class SummaryQuerySet(object):
         self.querysets = [qs.distinct(*copy.deepcopy(args), **copy.deepcopy(kwargs)) for qs in self.querysets]
         return self
 
-    def order_by(self, order_by):
-        self._order_by = order_by
-        self.querysets = [qs.order_by(copy.deepcopy(order_by)) for qs in self.querysets]
+    def order_by(self, *field_names):
+        self._order_by = field_names
+        self.querysets = [qs.order_by(*copy.deepcopy(field_names)) for qs in self.querysets]
         return self
 
     def count(self):
-        return sum([qs.count() for qs in self.querysets])
+        if not self.querysets:
+            return 0
+        union_sql, params = self._get_union_sql([qs.order_by().values('pk') for qs in self.querysets])
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM (%s) summary' % union_sql, params)
+            return cursor.fetchone()[0]
+
+    def count_per_queryset(self):
+        """ Return list of numbers of objects of querysets, they are counted by one grouped query. """
+        if not self.querysets:
+            return []
+        branches = [qs.order_by().annotate(**{
+            self.MODEL_COLUMN: Value(index, output_field=models.IntegerField()),
+            self.PK_COLUMN: F('pk'),
+        }).values(self.MODEL_COLUMN, self.PK_COLUMN) for index, qs in enumerate(self.querysets)]
+        union_sql, params = self._get_union_sql(branches)
+        model_column = connection.ops.quote_name(self.MODEL_COLUMN)
+        sql = 'SELECT %s, COUNT(*) FROM (%s) summary GROUP BY %s' % (model_column, union_sql, model_column)
+        counts = [0] * len(self.querysets)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            for index, count in cursor.fetchall():
+                counts[index] = count
+        return counts
 
     def all(self):
         return self
@@ -112,82 +154,173 @@ class SummaryQuerySet(object):
             return
 
     def __getitem__(self, val):
-        chained_querysets = self._get_chained_querysets()
         if isinstance(val, slice):
-            return list(itertools.islice(chained_querysets, val.start, val.stop))
+            if val.step is not None:
+                raise ValueError('Slicing with step is not supported.')
+            return self._get_objects(self._get_rows(offset=val.start, limit=self._get_limit(val.start, val.stop)))
         else:
-            try:
-                return next(itertools.islice(chained_querysets, val, val + 1))
-            except StopIteration:
+            if val < 0:
+                raise ValueError('Negative indexing is not supported.')
+            objects = self._get_objects(self._get_rows(offset=val, limit=1))
+            if not objects:
                 raise IndexError
+            return objects[0]
 
     def __len__(self):
-        return sum([q.count() for q in self.querysets])
-
-    def _get_chained_querysets(self):
-        if self._order_by:
-            return self._merge([qs.iterator() for qs in self.querysets], compared_attr=self._order_by)
-        else:
-            return itertools.chain(*[qs.iterator() for qs in self.querysets])
-
-    def _merge(self, subsequences, compared_attr='pk'):
-
-        @functools.total_ordering
-        class Compared(object):
-            """ Order objects by their attributes, reverse ordering if <reverse> is True """
-
-            def __init__(self, obj, attr, reverse=False):
-                self.attr = functools.reduce(Compared.get_obj_attr, attr.split("__"), obj)
-                if isinstance(self.attr, six.string_types):
-                    self.attr = self.attr.lower()
-                self.reverse = reverse
-
-            @staticmethod
-            def get_obj_attr(obj, attr):
-                # for m2m relationship support - get first instance of manager.
-                # for example: get first project group if resource has to be ordered by project groups.
-                if isinstance(obj, models.Manager):
-                    obj = obj.first()
-                return getattr(obj, attr) if obj else None
-
-            def __eq__(self, other):
-                return self.attr == other.attr
-
-            def __le__(self, other):
-                # In MySQL NULL values come *first* with ascending sort order.
-                # We use the same behaviour.
-                if self.attr is None:
-                    return not self.reverse
-                elif other.attr is None:
-                    return self.reverse
-                else:
-                    return self.attr < other.attr if not self.reverse else self.attr >= other.attr
-
-        reverse = compared_attr.startswith('-')
-        if reverse:
-            compared_attr = compared_attr[1:]
-
-        # prepare a heap whose items are
-        # (compared, current-value, iterator), one each per (non-empty) subsequence
-        # <compared> is used for model instances comparison based on given attribute
-        heap = []
-        for subseq in subsequences:
-            iterator = iter(subseq)
-            for current_value in iterator:
-                # subseq is not empty, therefore add this subseq's item to the list
-                heapq.heappush(
-                    heap, (Compared(current_value, compared_attr, reverse=reverse), current_value, iterator))
-                break
-
-        while heap:
-            # get and yield lowest current value (and corresponding iterator)
-            _, current_value, iterator = heap[0]
-            yield current_value
-            for current_value in iterator:
-                # subseq is not finished, therefore add this subseq's item back into the priority queue
-                heapq.heapreplace(
-                    heap, (Compared(current_value, compared_attr, reverse=reverse), current_value, iterator))
-                break
+        return self.count()
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def get_page(self, size, cursor=None):
+        """ Return objects following cursor and cursor of the next page, or None if it is the last page. """
+        keys = self._get_ordering_keys()
+        after = self._decode_cursor(cursor, len(keys) + 2) if cursor else None
+        rows = self._get_rows(limit=size + 1, after=after)
+        next_cursor = self._encode_cursor(rows[size - 1]) if len(rows) > size else None
+        return self._get_objects(rows[:size]), next_cursor
+
+    def _get_limit(self, start, stop):
+        if stop is None:
+            return None
+        if (start or 0) < 0 or stop < 0:
+            raise ValueError('Negative indexing is not supported.')
+        return max(stop - (start or 0), 0)
+
+    def _get_ordering_keys(self):
+        """ Return list of (field path, is descending) pairs of summary queryset ordering. """
+        order_by = self._order_by
+        if order_by is None:
+            orderings = set(tuple(qs.query.order_by) for qs in self.querysets)
+            order_by = orderings.pop() if len(orderings) == 1 else ()
+        keys = []
+        for field_name in order_by:
+            if not isinstance(field_name, six.string_types) or field_name == '?':
+                continue
+            if field_name.startswith('-'):
+                keys.append((field_name[1:], True))
+            else:
+                keys.append((field_name, False))
+        return keys
+
+    def _get_key_expression(self, model, path):
+        """ Get expression of ordering key. Multi-valued relations are reduced to their minimal value
+            and strings are compared case insensitively.
+        """
+        field, is_multivalued = None, False
+        for name in path.split(LOOKUP_SEP):
+            if field is not None:
+                if not field.is_relation:
+                    break
+                model = field.related_model
+            field = model._meta.pk if name == 'pk' else model._meta.get_field(name)
+            is_multivalued = is_multivalued or field.many_to_many or field.one_to_many
+        expression = Min(path) if is_multivalued else F(path)
+        if isinstance(field, (models.CharField, models.TextField)):
+            expression = Lower(expression)
+        return expression
+
+    def _get_union_sql(self, querysets):
+        sqls, params = [], []
+        for qs in querysets:
+            sql, qs_params = qs.query.get_compiler(using=qs.db).as_sql()
+            sqls.append(sql)
+            params.extend(qs_params)
+        return ' UNION ALL '.join(sqls), params
+
+    def _get_rows(self, offset=None, limit=None, after=None):
+        """ Return rows (model index, pk, ordering keys...) of ordered summary queryset. """
+        if not self.querysets or limit == 0:
+            return []
+        keys = self._get_ordering_keys()
+        key_columns = [self.KEY_COLUMN % index for index in range(len(keys))]
+        branches = []
+        for index, qs in enumerate(self.querysets):
+            annotations = OrderedDict([
+                (self.MODEL_COLUMN, Value(index, output_field=models.IntegerField())),
+                (self.PK_COLUMN, F('pk')),
+            ])
+            for column, (path, _) in zip(key_columns, keys):
+                annotations[column] = self._get_key_expression(qs.model, path)
+            branches.append(qs.order_by().annotate(**annotations).values(*annotations.keys()))
+        union_sql, params = self._get_union_sql(branches)
+
+        quote = connection.ops.quote_name
+        columns = [(quote(column), is_descending) for column, (_, is_descending) in zip(key_columns, keys)]
+        columns += [(quote(self.MODEL_COLUMN), False), (quote(self.PK_COLUMN), False)]
+
+        sql = 'SELECT %s FROM (%s) summary' % (', '.join(column for column, _ in columns), union_sql)
+        if after is not None:
+            condition, condition_params = self._get_keyset_condition(columns, after)
+            sql += ' WHERE ' + condition
+            params.extend(condition_params)
+        # NULL values of keys come first with ascending sort order in the same way as in MySQL.
+        ordering = []
+        for index, (column, is_descending) in enumerate(columns):
+            direction = 'DESC' if is_descending else 'ASC'
+            if index < len(keys):
+                ordering.append('CASE WHEN %s IS NULL THEN 0 ELSE 1 END %s' % (column, direction))
+            ordering.append('%s %s' % (column, direction))
+        sql += ' ORDER BY ' + ', '.join(ordering)
+        if limit is not None:
+            sql += ' LIMIT %s'
+            params.append(limit)
+        elif offset and connection.ops.no_limit_value() is not None:
+            sql += ' LIMIT %s'
+            params.append(connection.ops.no_limit_value())
+        if offset:
+            sql += ' OFFSET %s'
+            params.append(offset)
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            # move model index and pk columns to the beginning of row
+            return [row[-2:] + row[:-2] for row in map(tuple, cursor.fetchall())]
+
+    def _get_keyset_condition(self, columns, after):
+        """ Get condition of rows that follow row with given ordering values. """
+        values = list(after[2:]) + list(after[:2])
+        disjuncts, params = [], []
+        equalities, equalities_params = [], []
+        for (column, is_descending), value in zip(columns, values):
+            if value is None:
+                following = None if is_descending else ('%s IS NOT NULL' % column, [])
+                equality = ('%s IS NULL' % column, [])
             else:
-                # subseq has been exhausted, therefore remove it from the queue
-                heapq.heappop(heap)
+                if is_descending:
+                    following = ('(%s < %%s OR %s IS NULL)' % (column, column), [value])
+                else:
+                    following = ('%s > %%s' % column, [value])
+                equality = ('%s = %%s' % column, [value])
+            if following is not None:
+                disjuncts.append('(%s)' % ' AND '.join(equalities + [following[0]]))
+                params.extend(equalities_params + following[1])
+            equalities.append(equality[0])
+            equalities_params.extend(equality[1])
+        if not disjuncts:
+            return '1 = 0', []
+        return '(%s)' % ' OR '.join(disjuncts), params
+
+    def _get_objects(self, rows):
+        """ Fetch objects of rows from querysets of their models, keeping order of rows. """
+        pks_by_model = defaultdict(list)
+        for row in rows:
+            pks_by_model[row[0]].append(row[1])
+        objects = {}
+        for index, pks in pks_by_model.items():
+            for obj in self.querysets[index].filter(pk__in=pks):
+                objects[(index, obj.pk)] = obj
+        return [objects[row[:2]] for row in rows if row[:2] in objects]
+
+    def _encode_cursor(self, row):
+        data = json.dumps(list(row), cls=DjangoJSONEncoder)
+        return force_text(base64.urlsafe_b64encode(force_bytes(data)))
+
+    def _decode_cursor(self, cursor, size):
+        try:
+            row = json.loads(force_text(base64.urlsafe_b64decode(force_bytes(cursor))))
+        except (TypeError, ValueError):
+            raise ValueError('Invalid cursor.')
+        if not isinstance(row, list) or len(row) != size:
+            raise ValueError('Invalid cursor.')
+        return row
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import waldur_core.core.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_remove_organization'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PolledTask',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task_name', models.CharField(max_length=255)),
+                ('task_id', models.CharField(max_length=255)),
+                ('serialized_instance', models.CharField(max_length=255)),
+                ('arguments', waldur_core.core.fields.JSONField(default=dict)),
+                ('request', waldur_core.core.fields.JSONField(default=dict)),
+                ('batch_key', models.CharField(max_length=255)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_poll', models.DateTimeField(db_index=True)),
+                ('deadline', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -1,6 +1,7 @@
 from __future__ import unicode_literals
 
 from datetime import datetime
+import hashlib
 import logging
 import re
 
@@ -27,7 +28,7 @@ from reversion import revisions as reversion
 from reversion.models import Version
 import six
 
-from waldur_core.core.fields import CronScheduleField, UUIDField
+from waldur_core.core.fields import CronScheduleField, JSONField, UUIDField
 from waldur_core.core.validators import validate_name, MinCronValueValidator
 from waldur_core.logging.loggers import LoggableMixin
 
@@ -202,6 +203,9 @@ class User(LoggableMixin, UuidMixin, DescribableMixin, AbstractBaseUser, Permiss
         else:
             return {'user_uuid': [user.uuid]}
 
+    def get_permitted_users(self):
+        return User.objects.filter(pk=self.pk)
+
     def clean(self):
         super(User, self).clean()
         # User email has to be unique or empty
@@ -276,6 +280,23 @@ class SshPublicKey(LoggableMixin, UuidMixin, models.Model):
         return '%s - %s, user: %s, %s' % (self.name, self.fingerprint, self.user.username, self.user.full_name)
 
 
+class PolledTask(models.Model):
+    """ Task that waits until instance reaches expected state, instance is polled by poller.
+
+        Request contains remaining chain, callbacks and error callbacks of the task,
+        they are applied by poller when polling is completed.
+    """
+    task_name = models.CharField(max_length=255)
+    task_id = models.CharField(max_length=255)
+    serialized_instance = models.CharField(max_length=255)
+    arguments = JSONField(default=dict)
+    request = JSONField(default=dict)
+    batch_key = models.CharField(max_length=255)
+    attempts = models.PositiveIntegerField(default=0)
+    next_poll = models.DateTimeField(db_index=True)
+    deadline = models.DateTimeField()
+
+
 class RuntimeStateMixin(models.Model):
     """ Provide runtime_state field """
     class RuntimeStates(object):
@@ -375,6 +396,9 @@ class ReversionMixin(object):
         Note: `ReversionMixin` model should be registered in django-reversion,
               using one of supported methods:
               http://django-reversion.readthedocs.org/en/latest/api.html#registering-models-with-django-reversion
+
+        Model can define `version_fingerprint` field to store hash of tracked fields of the latest version.
+        Then duplicate versions are detected by comparison with stored fingerprint, without versions query.
     """
 
     def get_version_fields(self):
@@ -382,6 +406,19 @@ class ReversionMixin(object):
         options = reversion._get_options(self)
         return options.fields or [f.name for f in self._meta.fields if f not in options.exclude]
 
+    def get_version_fingerprint(self):
+        """ Get hash of tracked fields values. Numbers are hashed as floats to ignore <float> vs <int> difference. """
+        values = []
+        for field in sorted(self.get_version_fields()):
+            value = getattr(self, field)
+            if isinstance(value, six.integer_types + (float,)) and not isinstance(value, bool):
+                value = float(value)
+            values.append('%s=%r' % (field, value))
+        return hashlib.md5('\n'.join(values).encode('utf-8')).hexdigest()
+
+    def _has_version_fingerprint(self):
+        return hasattr(self, 'version_fingerprint')
+
     def _is_version_duplicate(self):
         """ Define should new version be created for object or no.
 
@@ -392,6 +429,12 @@ class ReversionMixin(object):
         """
         if self.id is None:
             return False
+        if self._has_version_fingerprint():
+            # Fingerprint is read from database, because in-memory instance could be stale.
+            stored_fingerprint = self.__class__._default_manager.filter(pk=self.pk)\
+                .values_list('version_fingerprint', flat=True).first()
+            if stored_fingerprint:
+                return stored_fingerprint == self.get_version_fingerprint()
         try:
             latest_version = Version.objects.get_for_object(self).latest('revision__date_created')
         except Version.DoesNotExist:
@@ -401,7 +444,12 @@ class ReversionMixin(object):
         return all([getattr(self, f) == getattr(latest_version_object, f) for f in fields])
 
     def save(self, **kwargs):
-        if self._is_version_duplicate():
+        is_duplicate = self._is_version_duplicate()
+        if self._has_version_fingerprint():
+            self.version_fingerprint = self.get_version_fingerprint()
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = set(kwargs['update_fields']) | {'version_fingerprint'}
+        if is_duplicate:
             return super(ReversionMixin, self).save(**kwargs)
         with reversion.create_revision():
             return super(ReversionMixin, self).save(**kwargs)
@@ -1,15 +1,129 @@
 from __future__ import unicode_literals
 
 from collections import OrderedDict
+import hashlib
+import json
 
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db import connections
+from django.db.models import QuerySet
+from django.utils.encoding import force_bytes
+from django.utils.functional import cached_property
+from django.utils.translation import ugettext_lazy as _
 from rest_framework import pagination
 from rest_framework.response import Response
 from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
+def get_approximate_count(queryset):
+    """
+    Return approximate count of queryset objects.
+
+    On PostgreSQL count is estimated by query planner. Estimation is used only if it
+    exceeds THRESHOLD, otherwise exact count is calculated because it is cheap.
+    On other databases exact count is cached for CACHE_TIMEOUT seconds.
+    """
+    options = settings.WALDUR_CORE['APPROXIMATE_COUNT']
+    if not isinstance(queryset, QuerySet):
+        return queryset.count()
+
+    sql, params = queryset.query.get_compiler(using=queryset.db).as_sql()
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+            plan = cursor.fetchone()[0]
+        if not isinstance(plan, list):
+            plan = json.loads(plan)
+        estimate = int(plan[0]['Plan']['Plan Rows'])
+        if estimate >= options['THRESHOLD']:
+            return estimate
+        return queryset.count()
+
+    key = 'waldur_core.core.pagination.count.%s' % hashlib.md5(force_bytes('%s %r' % (sql, params))).hexdigest()
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, options['CACHE_TIMEOUT'])
+    return count
+
+
+class ApproximateCountPaginator(Paginator):
+    """ Paginator that uses approximate count of objects.
+        Pages are not truncated or rejected by count, because it could be lower than actual one.
+    """
+
+    @cached_property
+    def count(self):
+        return get_approximate_count(self.object_list)
+
+    def validate_number(self, number):
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(_('That page number is not an integer'))
+        if number < 1:
+            raise EmptyPage(_('That page number is less than 1'))
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        return Page(self.object_list[bottom:bottom + self.per_page], number, self)
+
+
+class KeysetPagination(pagination.CursorPagination):
+    """ Cursor pagination by ordering key that is defined by LinkHeaderPagination. """
+
+    def __init__(self, ordering, page_size):
+        self.ordering = ordering
+        self.page_size = page_size
+
+    def get_page_size(self, request):
+        return self.page_size
+
+    def get_ordering(self, request, queryset, view):
+        return self.ordering
+
+
 class LinkHeaderPagination(pagination.PageNumberPagination):
+    """
+    Page number pagination with links to the first, previous, next and last pages in Link header
+    and count of all objects in X-Result-Count header.
+
+    View could change pagination by attributes:
+     - pagination_ordering - stable ordering key, for example ('-created',). If it is defined and
+       request contains cursor query parameter, objects are paginated by cursor, so deep pages
+       are fetched without offset. Links to the last page are not provided in this mode.
+     - pagination_approximate_count - if True, approximate count of objects is used.
+    """
     page_size_query_param = 'page_size'
     max_page_size = 300
+    cursor_query_param = 'cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.keyset_pagination = None
+        self.count = None
+        if getattr(view, 'pagination_approximate_count', False):
+            self.django_paginator_class = ApproximateCountPaginator
+
+        ordering = getattr(view, 'pagination_ordering', None)
+        if ordering and self.cursor_query_param in request.query_params:
+            page_size = self.get_page_size(request)
+            if not page_size:
+                return None
+            self.count = self.django_paginator_class(queryset, page_size).count
+            self.keyset_pagination = KeysetPagination(ordering, page_size)
+            self.keyset_pagination.cursor_query_param = self.cursor_query_param
+            page = self.keyset_pagination.paginate_queryset(queryset, request, view)
+            self.keyset_pagination.base_url = remove_query_param(
+                self.keyset_pagination.base_url, self.page_query_param)
+            return page
+
+        return super(LinkHeaderPagination, self).paginate_queryset(queryset, request, view)
 
     def get_paginated_response(self, data):
         link_candidates = OrderedDict((
@@ -26,17 +140,36 @@ class LinkHeaderPagination(pagination.PageNumberPagination):
         )
 
         headers = {
-            'X-Result-Count': self.page.paginator.count,
+            'X-Result-Count': self.get_count(),
             'Link': link,
         }
 
         return Response(data, headers=headers)
 
+    def get_count(self):
+        if self.keyset_pagination:
+            return self.count
+        return self.page.paginator.count
+
     def get_first_link(self):
         url = self.request.build_absolute_uri()
+        if self.keyset_pagination:
+            return replace_query_param(remove_query_param(url, self.page_query_param), self.cursor_query_param, '')
         return remove_query_param(url, self.page_query_param)
 
+    def get_previous_link(self):
+        if self.keyset_pagination:
+            return self.keyset_pagination.get_previous_link()
+        return super(LinkHeaderPagination, self).get_previous_link()
+
+    def get_next_link(self):
+        if self.keyset_pagination:
+            return self.keyset_pagination.get_next_link()
+        return super(LinkHeaderPagination, self).get_next_link()
+
     def get_last_link(self):
+        if self.keyset_pagination:
+            return None
         url = self.request.build_absolute_uri()
         page_number = self.page.paginator.page_range[-1]
         if page_number == 1:
@@ -0,0 +1,192 @@
+""" Poller of instances that wait for expected state.
+
+Tasks PollRuntimeStateTask and PollBackendCheckTask do not retry themselves via broker.
+If instance has not reached expected state, task stops executor chain and registers itself in
+PolledTask table. Registered instances are polled by PollInstancesTask in batches grouped by
+service settings, one backend is used for all instances of batch connected to the same service settings.
+Delay between polls of instance grows from INITIAL_DELAY to MAX_DELAY seconds.
+When instance reaches expected state, executor chain is continued. If polling fails or task
+deadline is reached, error callbacks of executor are called.
+
+Configuration example:
+    WALDUR_CORE['POLLING'] = {
+        'ENABLED': True,
+        'INITIAL_DELAY': 5,
+        'MAX_DELAY': 60,
+        'BACKOFF_FACTOR': 1.5,
+        'BATCH_SIZE': 50,
+        'CLAIM_TIMEOUT': 300,
+    }
+"""
+from __future__ import unicode_literals
+
+from collections import defaultdict
+import datetime
+import logging
+import traceback
+
+from celery import current_app, signature
+from celery.app.task import Context
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.utils import timezone
+
+from waldur_core.core import models, utils
+from waldur_core.core.exceptions import RuntimeStateException
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POLLING_SETTINGS = {
+    'ENABLED': True,
+    'INITIAL_DELAY': 5,
+    'MAX_DELAY': 60,
+    'BACKOFF_FACTOR': 1.5,
+    'BATCH_SIZE': 50,
+    'CLAIM_TIMEOUT': 300,
+}
+
+
+def get_polling_settings():
+    return dict(DEFAULT_POLLING_SETTINGS, **settings.WALDUR_CORE.get('POLLING', {}))
+
+
+def get_delay(attempts):
+    conf = get_polling_settings()
+    return min(conf['INITIAL_DELAY'] * conf['BACKOFF_FACTOR'] ** attempts, conf['MAX_DELAY'])
+
+
+def get_batch_key(instance):
+    """ Instances connected to the same service settings are polled together. """
+    try:
+        return 'settings:%s' % instance.service_project_link.service.settings_id
+    except (AttributeError, ObjectDoesNotExist):
+        return utils.serialize_instance(instance)
+
+
+def is_supported(task):
+    """ Eagerly executed tasks are not continued by poller, because their chain is not passed in request.
+        Tasks of chord header are not continued by poller too, because chord body is called on their return.
+    """
+    request = task.request
+    return (get_polling_settings()['ENABLED'] and bool(request.id) and
+            not request.is_eager and not request.chord)
+
+
+def suspend(task, instance, timeout):
+    """ Stop executor chain of task and register instance in poller, chain is continued by poller. """
+    request = task.request
+    now = timezone.now()
+    models.PolledTask.objects.create(
+        task_name=task.name,
+        task_id=request.id,
+        serialized_instance=utils.serialize_instance(instance),
+        arguments={'args': list(task.args), 'kwargs': task.kwargs},
+        request={
+            'chain': request.chain,
+            'callbacks': request.callbacks,
+            'errbacks': request.errbacks,
+            'root_id': request.root_id,
+            'parent_id': request.parent_id,
+        },
+        batch_key=get_batch_key(instance),
+        next_poll=now + datetime.timedelta(seconds=get_delay(0)),
+        deadline=now + datetime.timedelta(seconds=timeout),
+    )
+    request.chain = None
+    request.callbacks = None
+
+
+def claim_batches():
+    """ Return batches of IDs of tasks that should be polled now.
+        Tasks are not returned again until CLAIM_TIMEOUT expires or they are polled.
+    """
+    conf = get_polling_settings()
+    now = timezone.now()
+    ids_by_key = defaultdict(list)
+    due_tasks = models.PolledTask.objects.filter(next_poll__lte=now).order_by('pk')
+    for pk, batch_key in due_tasks.values_list('pk', 'batch_key'):
+        ids_by_key[batch_key].append(pk)
+    if not ids_by_key:
+        return []
+
+    claimed_ids = sum(ids_by_key.values(), [])
+    models.PolledTask.objects.filter(pk__in=claimed_ids).update(
+        next_poll=now + datetime.timedelta(seconds=conf['CLAIM_TIMEOUT']))
+
+    size = conf['BATCH_SIZE']
+    return [ids[index:index + size] for ids in ids_by_key.values() for index in range(0, len(ids), size)]
+
+
+def poll_batch(polled_task_ids):
+    # batch key -> backend, instances of the same service settings share backend
+    backends = {}
+    for polled_task in models.PolledTask.objects.filter(pk__in=polled_task_ids).order_by('pk'):
+        poll(polled_task, backends)
+
+
+def poll(polled_task, backends=None):
+    task = current_app.tasks[polled_task.task_name]
+    arguments = polled_task.arguments
+    try:
+        instance = utils.deserialize_instance(polled_task.serialized_instance)
+        if backends is None:
+            backend = task.get_backend(instance)
+        else:
+            if polled_task.batch_key not in backends:
+                backends[polled_task.batch_key] = task.get_backend(instance)
+            backend = backends[polled_task.batch_key]
+        is_completed = task.poll(instance, *arguments.get('args', []), backend=backend, **arguments.get('kwargs', {}))
+    except Exception as e:
+        fail(polled_task, e, traceback.format_exc())
+        return
+
+    now = timezone.now()
+    if is_completed:
+        complete(polled_task, instance)
+    elif now >= polled_task.deadline:
+        message = 'Polling of %s (PK: %s) is timed out.' % (instance.__class__.__name__, instance.pk)
+        fail(polled_task, RuntimeStateException(message), '')
+    else:
+        polled_task.attempts += 1
+        polled_task.next_poll = now + datetime.timedelta(seconds=get_delay(polled_task.attempts))
+        polled_task.save(update_fields=['attempts', 'next_poll'])
+
+
+def _release(polled_task):
+    """ Delete polled task, return False if it is already released by another poller. """
+    deleted, _ = models.PolledTask.objects.filter(pk=polled_task.pk).delete()
+    return bool(deleted)
+
+
+def complete(polled_task, instance):
+    """ Store task result and continue executor chain in the same way as Celery worker does. """
+    if not _release(polled_task):
+        return
+    app = current_app
+    request = polled_task.request
+    task_id = polled_task.task_id
+    root_id = request.get('root_id') or task_id
+    result = utils.serialize_instance(instance)
+    app.backend.mark_as_done(task_id, result)
+
+    chain = list(request.get('chain') or [])
+    if chain:
+        next_signature = signature(chain.pop(), app=app)
+        next_signature.apply_async((result,), chain=chain, parent_id=task_id, root_id=root_id)
+    for callback in request.get('callbacks') or []:
+        signature(callback, app=app).apply_async((result,), parent_id=task_id, root_id=root_id)
+
+
+def fail(polled_task, exc, exc_traceback):
+    """ Store task failure and call error callbacks of executor. """
+    if not _release(polled_task):
+        return
+    logger.info('Polling of task %s has failed: %s', polled_task.task_id, exc)
+    request = polled_task.request
+    context = Context(
+        id=polled_task.task_id,
+        root_id=request.get('root_id'),
+        parent_id=request.get('parent_id'),
+        errbacks=request.get('errbacks'),
+    )
+    current_app.backend.mark_as_failure(polled_task.task_id, exc, traceback=exc_traceback, request=context)
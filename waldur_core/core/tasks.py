@@ -6,7 +6,7 @@ import logging
 from uuid import uuid4
 
 import six
-from celery import group
+from celery import group, states
 from celery.backends.base import Backend
 from celery.execute import send_task as send_celery_task
 from celery.task import Task as CeleryTask
@@ -15,9 +15,10 @@ from celery.worker.request import Request
 from django.core.cache import cache
 from django.db import IntegrityError, models as django_models
 from django.db.models import ObjectDoesNotExist
+from django.utils.encoding import force_bytes
 from django_fsm import TransitionNotAllowed
 
-from waldur_core.core import models, utils
+from waldur_core.core import models, polling, utils
 from waldur_core.core.exceptions import RuntimeStateException
 
 logger = logging.getLogger(__name__)
@@ -338,36 +339,96 @@ class BackgroundTask(CeleryTask):
            should log themselves explicitly and make sure that they will not
            spam error messages.
 
-        Implement "is_equal" method to define what tasks are equal and should
-        be executed simultaneously.
+        Uncompleted tasks are registered in cache by lease: it is acquired when task is
+        scheduled, renewed when task starts and released when task is completed. If worker
+        dies, lease expires in LEASE_TIMEOUT seconds. Long running tasks should call
+        "renew_lease" method to keep the lease.
+
+        Implement "get_identity" method to define what tasks are equal and should not
+        be executed simultaneously. Retried task keeps its lease, because it is
+        published with the same task id.
     """
     is_background = True
+    LEASE_TIMEOUT = 30 * 60
+
+    def get_identity(self, *args, **kwargs):
+        """ Return JSON serializable identity of operation, tasks with the same name and identity are equal.
+            By default tasks are equal if their input parameters are equal.
+        """
+        return {'args': args, 'kwargs': kwargs}
 
     def is_equal(self, other_task, *args, **kwargs):
         """ Return True if task do the same operation as other_task.
 
             Note! Other task is represented as serialized celery task - dictionary.
         """
-        raise NotImplementedError('BackgroundTask should implement "is_equal" method to avoid queue overload.')
+        if other_task.get('name') != self.name:
+            return False
+        other_key = self._get_lease_key(other_task.get('args'), other_task.get('kwargs'))
+        return other_key == self._get_lease_key(args, kwargs)
+
+    def _get_lease_key(self, args, kwargs):
+        identity = self.get_identity(*(args or ()), **(kwargs or {}))
+        hash_input = json.dumps({'name': self.name, 'identity': identity}, sort_keys=True)
+        # md5 is used for internal caching, not need to care about security
+        return 'waldur_core.core.tasks.lease.%s' % hashlib.md5(force_bytes(hash_input)).hexdigest()  # nosec
 
     def is_previous_task_processing(self, *args, **kwargs):
         """ Return True if exist task that is equal to current and is uncompleted """
-        app = self._get_app()
-        inspect = app.control.inspect()
-        active = inspect.active() or {}
-        scheduled = inspect.scheduled() or {}
-        reserved = inspect.reserved() or {}
-        uncompleted = sum(list(active.values()) + list(scheduled.values()) + reserved.values(), [])
-        return any(self.is_equal(task, *args, **kwargs) for task in uncompleted)
+        return cache.get(self._get_lease_key(args, kwargs)) is not None
+
+    def renew_lease(self, *args, **kwargs):
+        """ Prolong lease of running task, by default arguments of current task request are used. """
+        if not self.request.id:
+            return
+        if not args and not kwargs:
+            args, kwargs = self.request.args, self.request.kwargs
+        cache.set(self._get_lease_key(args, kwargs), self.request.id, self.LEASE_TIMEOUT)
 
     def apply_async(self, args=None, kwargs=None, **options):
         """ Do not run background task if previous task is uncompleted """
-        if self.is_previous_task_processing(*args, **kwargs):
+        task_id = options.pop('task_id', None) or str(uuid4())
+        key = self._get_lease_key(args, kwargs)
+        # Lease is already acquired with the same task id if task is retried.
+        if not cache.add(key, task_id, self.LEASE_TIMEOUT) and cache.get(key) != task_id:
             message = 'Background task %s was not scheduled, because its predecessor is not completed yet.' % self.name
             logger.info(message)
             # It is expected by Celery that apply_async return AsyncResult, otherwise celerybeat dies
-            return self.AsyncResult(options.get('task_id') or str(uuid4()))
-        return super(BackgroundTask, self).apply_async(args=args, kwargs=kwargs, **options)
+            return self.AsyncResult(task_id)
+        try:
+            return super(BackgroundTask, self).apply_async(args=args, kwargs=kwargs, task_id=task_id, **options)
+        except Exception:
+            cache.delete(key)
+            raise
+
+    def __call__(self, *args, **kwargs):
+        self.renew_lease(*args, **kwargs)
+        return super(BackgroundTask, self).__call__(*args, **kwargs)
+
+    def after_return(self, status, retval, task_id, args, kwargs, einfo):
+        key = self._get_lease_key(args, kwargs)
+        if status != states.RETRY and cache.get(key) == task_id:
+            cache.delete(key)
+        return super(BackgroundTask, self).after_return(status, retval, task_id, args, kwargs, einfo)
+
+
+class PollInstancesTask(BackgroundTask):
+    """ Schedule polling of instances registered by poll tasks, one task polls batch of instances. """
+    name = 'waldur_core.core.PollInstancesTask'
+
+    def get_identity(self):
+        return None
+
+    def run(self):
+        for batch in polling.claim_batches():
+            PollBatchTask().apply_async(args=(batch,), kwargs={})
+
+
+class PollBatchTask(BackgroundTask):
+    name = 'waldur_core.core.PollBatchTask'
+
+    def run(self, polled_task_ids):
+        polling.poll_batch(polled_task_ids)
 
 
 class PenalizedBackgroundTask(BackgroundTask):
@@ -463,6 +524,11 @@ Request.__str__ = log_celery_task
 
 
 class PollRuntimeStateTask(Task):
+    """ Wait until instance runtime state becomes success_state.
+
+        If instance has not reached expected state, it is polled by poller from
+        waldur_core.core.polling, otherwise task is retried.
+    """
     max_retries = 300
     default_retry_delay = 5
 
@@ -473,20 +539,34 @@ class PollRuntimeStateTask(Task):
     def get_backend(self, instance):
         return instance.get_backend()
 
-    def execute(self, instance, backend_pull_method, success_state, erred_state):
-        backend = self.get_backend(instance)
+    def poll(self, instance, backend_pull_method, success_state, erred_state, backend=None):
+        """ Return True if instance runtime state is success_state, raise exception if it is erred_state.
+            Backend is passed by poller if it is shared by several polled instances.
+        """
+        backend = backend or self.get_backend(instance)
         getattr(backend, backend_pull_method)(instance)
         instance.refresh_from_db()
-        if instance.runtime_state not in (success_state, erred_state):
-            self.retry()
-        elif instance.runtime_state == erred_state:
+        if instance.runtime_state == erred_state:
             raise RuntimeStateException(
                 '%s (PK: %s) runtime state become erred: %s' % (
                     instance.__class__.__name__, instance.pk, erred_state))
+        return instance.runtime_state == success_state
+
+    def execute(self, instance, backend_pull_method, success_state, erred_state):
+        if not self.poll(instance, backend_pull_method, success_state, erred_state):
+            if polling.is_supported(self):
+                polling.suspend(self, instance, timeout=self.max_retries * self.default_retry_delay)
+            else:
+                self.retry()
         return instance
 
 
 class PollBackendCheckTask(Task):
+    """ Wait until backend check method returns True.
+
+        If check is not passed, instance is polled by poller from
+        waldur_core.core.polling, otherwise task is retried.
+    """
     max_retries = 60
     default_retry_delay = 5
 
@@ -497,9 +577,15 @@ class PollBackendCheckTask(Task):
     def get_backend(self, instance):
         return instance.get_backend()
 
-    def execute(self, instance, backend_check_method):
+    def poll(self, instance, backend_check_method, backend=None):
         # backend_check_method should return True if object does not exist at backend
-        backend = self.get_backend(instance)
-        if not getattr(backend, backend_check_method)(instance):
-            self.retry()
+        backend = backend or self.get_backend(instance)
+        return getattr(backend, backend_check_method)(instance)
+
+    def execute(self, instance, backend_check_method):
+        if not self.poll(instance, backend_check_method):
+            if polling.is_supported(self):
+                polling.suspend(self, instance, timeout=self.max_retries * self.default_retry_delay)
+            else:
+                self.retry()
         return instance
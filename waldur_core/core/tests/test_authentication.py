@@ -7,6 +7,8 @@ from freezegun import freeze_time
 from rest_framework import test, status
 from rest_framework.authtoken.models import Token
 
+from waldur_core.core import token_activity
+
 from . import helpers
 
 
@@ -48,7 +50,7 @@ class TokenAuthenticationTest(test.APITransactionTestCase):
             self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
             self.assertEqual(response.data['detail'], 'Token has expired.')
 
-    def test_token_creation_time_is_updated_on_every_request(self):
+    def test_token_creation_time_is_updated_on_flush_of_token_activity(self):
         response = self.client.post(self.auth_url, data={'username': self.username, 'password': self.password})
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         token = response.data['token']
@@ -56,9 +58,51 @@ class TokenAuthenticationTest(test.APITransactionTestCase):
 
         self.client.credentials(HTTP_AUTHORIZATION='Token ' + token)
         self.client.get(self.test_url)
+        token_activity.flush()
         created2 = Token.objects.values_list('created', flat=True).get(key=token)
         self.assertTrue(created1 < created2)
 
+    def test_token_does_not_expire_if_it_is_used_before_flush_of_token_activity(self):
+        user = get_user_model().objects.get(username=self.username)
+        response = self.client.post(self.auth_url, data={'username': self.username, 'password': self.password})
+        token = response.data['token']
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token)
+
+        lifetime = timezone.timedelta(seconds=user.token_lifetime)
+        with freeze_time(timezone.now() + lifetime / 2):
+            response = self.client.get(self.test_url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        with freeze_time(timezone.now() + lifetime):
+            response = self.client.get(self.test_url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_cached_token_is_invalidated_on_user_update(self):
+        response = self.client.post(self.auth_url, data={'username': self.username, 'password': self.password})
+        token = response.data['token']
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token)
+        response = self.client.get(self.test_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        user = get_user_model().objects.get(username=self.username)
+        user.is_active = False
+        user.save()
+
+        response = self.client.get(self.test_url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deleted_token_is_not_accepted(self):
+        response = self.client.post(self.auth_url, data={'username': self.username, 'password': self.password})
+        token = response.data['token']
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token)
+        response = self.client.get(self.test_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        Token.objects.filter(key=token).delete()
+
+        response = self.client.get(self.test_url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
     def test_account_is_blocked_after_five_failed_attempts(self):
         for _ in range(5):
             response = self.client.post(self.auth_url, data={'username': self.username, 'password': 'WRONG'})
@@ -82,6 +126,22 @@ class TokenAuthenticationTest(test.APITransactionTestCase):
             token2 = response.data['token']
             self.assertNotEqual(token1, token2)
 
+    def test_token_used_before_flush_of_token_activity_is_not_recreated_on_authentication(self):
+        user = get_user_model().objects.get(username=self.username)
+        response = self.client.post(self.auth_url, data={'username': self.username, 'password': self.password})
+        token1 = response.data['token']
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token1)
+
+        lifetime = timezone.timedelta(seconds=user.token_lifetime)
+        with freeze_time(timezone.now() + lifetime / 2):
+            response = self.client.get(self.test_url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        with freeze_time(timezone.now() + lifetime):
+            self.client.credentials()
+            response = self.client.post(self.auth_url, data={'username': self.username, 'password': self.password})
+            self.assertEqual(response.data['token'], token1)
+
     def test_not_expired_token_creation_time_is_updated_on_authentication(self):
         response = self.client.post(self.auth_url, data={'username': self.username, 'password': self.password})
         self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -0,0 +1,136 @@
+import datetime
+
+from django.test import TestCase
+from django.utils import timezone
+from six.moves import mock
+
+from waldur_core.core import models, polling, tasks, utils
+from waldur_core.structure.tests import factories as structure_factories
+
+
+class PollingTest(TestCase):
+
+    def setUp(self):
+        self.task = tasks.PollRuntimeStateTask()
+        self.instance = structure_factories.TestNewInstanceFactory()
+        self.serialized_instance = utils.serialize_instance(self.instance)
+
+        app_patcher = mock.patch('waldur_core.core.polling.current_app')
+        self.mock_app = app_patcher.start()
+        self.mock_app.tasks = {self.task.name: self.task}
+        self.addCleanup(app_patcher.stop)
+
+        signature_patcher = mock.patch('waldur_core.core.polling.signature')
+        self.mock_signature = signature_patcher.start()
+        self.addCleanup(signature_patcher.stop)
+
+    def create_polled_task(self, **kwargs):
+        defaults = dict(
+            task_name=self.task.name,
+            task_id='task_id',
+            serialized_instance=self.serialized_instance,
+            arguments={'args': [], 'kwargs': {
+                'backend_pull_method': 'pull_instance_runtime_state',
+                'success_state': 'online',
+                'erred_state': 'error',
+            }},
+            request={'chain': [{'task': 'next_task'}], 'callbacks': None, 'errbacks': [{'task': 'errback'}]},
+            batch_key='settings:1',
+            next_poll=timezone.now(),
+            deadline=timezone.now() + datetime.timedelta(minutes=5),
+        )
+        defaults.update(kwargs)
+        return models.PolledTask.objects.create(**defaults)
+
+    def test_task_chain_is_suspended(self):
+        self.task.push_request(id='task_id', chain=[{'task': 'next_task'}], errbacks=[{'task': 'errback'}])
+        self.task.args = ()
+        self.task.kwargs = {'success_state': 'online'}
+        try:
+            polling.suspend(self.task, self.instance, timeout=60)
+            self.assertIsNone(self.task.request.chain)
+        finally:
+            self.task.pop_request()
+
+        polled_task = models.PolledTask.objects.get()
+        self.assertEqual(polled_task.request['chain'], [{'task': 'next_task'}])
+        self.assertEqual(polled_task.arguments['kwargs'], {'success_state': 'online'})
+
+    @mock.patch.object(tasks.PollRuntimeStateTask, 'retry')
+    @mock.patch.object(tasks.PollRuntimeStateTask, 'poll', return_value=False)
+    def test_task_of_group_is_retried_instead_of_suspension(self, mock_poll, mock_retry):
+        # Chord body is called when task of chord header returns, so chain could not be suspended.
+        self.task.push_request(id='task_id', chain=[{'task': 'next_task'}], chord={'task': 'next_wave'})
+        try:
+            self.task.execute(self.instance, 'pull_instance_runtime_state', 'online', 'error')
+            self.assertEqual(self.task.request.chain, [{'task': 'next_task'}])
+        finally:
+            self.task.pop_request()
+
+        self.assertTrue(mock_retry.called)
+        self.assertFalse(models.PolledTask.objects.exists())
+
+    @mock.patch.object(tasks.PollRuntimeStateTask, 'poll', return_value=True)
+    def test_chain_is_continued_when_instance_is_ready(self, mock_poll):
+        self.create_polled_task()
+
+        polling.poll_batch(models.PolledTask.objects.values_list('pk', flat=True))
+
+        self.assertFalse(models.PolledTask.objects.exists())
+        self.mock_app.backend.mark_as_done.assert_called_once_with('task_id', self.serialized_instance)
+        self.mock_signature.assert_called_once_with({'task': 'next_task'}, app=self.mock_app)
+        self.assertTrue(self.mock_signature.return_value.apply_async.called)
+
+    @mock.patch.object(tasks.PollRuntimeStateTask, 'poll', return_value=False)
+    def test_polling_is_delayed_with_backoff_if_instance_is_not_ready(self, mock_poll):
+        polled_task = self.create_polled_task(attempts=3)
+
+        polling.poll(polled_task)
+
+        polled_task.refresh_from_db()
+        self.assertEqual(polled_task.attempts, 4)
+        self.assertGreater(polled_task.next_poll, timezone.now() + datetime.timedelta(seconds=polling.get_delay(3)))
+        self.assertFalse(self.mock_signature.called)
+
+    @mock.patch.object(tasks.PollRuntimeStateTask, 'poll', return_value=False)
+    def test_error_callbacks_are_called_when_deadline_is_reached(self, mock_poll):
+        polled_task = self.create_polled_task(deadline=timezone.now() - datetime.timedelta(seconds=1))
+
+        polling.poll(polled_task)
+
+        self.assertFalse(models.PolledTask.objects.exists())
+        self.assertTrue(self.mock_app.backend.mark_as_failure.called)
+        context = self.mock_app.backend.mark_as_failure.call_args[1]['request']
+        self.assertEqual(context.errbacks, [{'task': 'errback'}])
+
+    @mock.patch.object(tasks.PollRuntimeStateTask, 'poll', side_effect=tasks.RuntimeStateException('erred'))
+    def test_error_callbacks_are_called_when_instance_is_erred(self, mock_poll):
+        polled_task = self.create_polled_task()
+
+        polling.poll(polled_task)
+
+        self.assertFalse(models.PolledTask.objects.exists())
+        self.assertTrue(self.mock_app.backend.mark_as_failure.called)
+
+    @mock.patch.object(tasks.PollRuntimeStateTask, 'get_backend')
+    def test_backend_is_shared_by_instances_of_the_same_service_settings(self, mock_get_backend):
+        self.create_polled_task()
+        self.create_polled_task()
+        self.create_polled_task(batch_key='settings:2')
+
+        polling.poll_batch(models.PolledTask.objects.values_list('pk', flat=True))
+
+        self.assertEqual(mock_get_backend.call_count, 2)
+        self.assertEqual(mock_get_backend.return_value.pull_instance_runtime_state.call_count, 3)
+
+    @mock.patch('waldur_core.core.polling.get_polling_settings')
+    def test_due_tasks_are_claimed_in_batches_grouped_by_settings(self, mock_settings):
+        mock_settings.return_value = dict(polling.DEFAULT_POLLING_SETTINGS, BATCH_SIZE=2)
+        first = [self.create_polled_task(batch_key='settings:1') for _ in range(3)]
+        second = self.create_polled_task(batch_key='settings:2')
+        self.create_polled_task(next_poll=timezone.now() + datetime.timedelta(minutes=1))
+
+        batches = polling.claim_batches()
+
+        self.assertEqual(sorted(batches), sorted([[first[0].pk, first[1].pk], [first[2].pk], [second.pk]]))
+        self.assertEqual(polling.claim_batches(), [])
@@ -1,8 +1,12 @@
 import mock
 from celery.app.task import Context
 from celery.backends.base import Backend
+from celery.task import Task as CeleryTask
+from django.core.cache import cache
 from django.test import testcases
 
+from waldur_core.core import tasks
+
 
 class ExecutorTest(testcases.TestCase):
     def setUp(self):
@@ -25,3 +29,70 @@ class ExecutorTest(testcases.TestCase):
     def test_use_old_signature_in_task_error(self, mock_group):
         self.backend._call_task_errbacks(self.request, Exception('test'), '')
         self.assertEqual(mock_group.call_count, 1)
+
+
+class DummyBackgroundTask(tasks.BackgroundTask):
+    name = 'waldur_core.core.tests.dummy_background_task'
+
+    def run(self, value):
+        return value
+
+
+@mock.patch.object(CeleryTask, 'apply_async')
+class BackgroundTaskTest(testcases.TestCase):
+    def setUp(self):
+        cache.clear()
+        self.task = DummyBackgroundTask()
+
+    def test_equal_task_is_not_scheduled_if_previous_one_is_not_completed(self, mock_apply_async):
+        self.task.apply_async(args=('value',))
+        self.task.apply_async(args=('value',))
+
+        self.assertEqual(mock_apply_async.call_count, 1)
+
+    def test_tasks_with_different_identity_are_scheduled(self, mock_apply_async):
+        self.task.apply_async(args=('first',))
+        self.task.apply_async(args=('second',))
+
+        self.assertEqual(mock_apply_async.call_count, 2)
+
+    def test_task_is_scheduled_again_when_lease_is_released(self, mock_apply_async):
+        self.task.apply_async(args=('value',), task_id='task_id')
+        self.task.after_return('SUCCESS', None, 'task_id', ('value',), {}, None)
+        self.task.apply_async(args=('value',))
+
+        self.assertEqual(mock_apply_async.call_count, 2)
+
+    def test_lease_is_not_released_by_other_task(self, mock_apply_async):
+        self.task.apply_async(args=('value',), task_id='task_id')
+        self.task.after_return('SUCCESS', None, 'other_task_id', ('value',), {}, None)
+
+        self.assertTrue(self.task.is_previous_task_processing('value'))
+
+    def test_lease_is_released_if_task_is_not_published(self, mock_apply_async):
+        mock_apply_async.side_effect = IOError
+
+        with self.assertRaises(IOError):
+            self.task.apply_async(args=('value',))
+
+        self.assertFalse(self.task.is_previous_task_processing('value'))
+
+    def test_workers_are_not_inspected(self, mock_apply_async):
+        with mock.patch.object(DummyBackgroundTask, '_get_app') as mock_get_app:
+            self.task.apply_async(args=('value',))
+
+        self.assertFalse(mock_get_app.return_value.control.inspect.called)
+
+    def test_retried_task_is_published_again(self, mock_apply_async):
+        self.task.apply_async(args=('value',), task_id='task_id')
+        self.task.after_return('RETRY', None, 'task_id', ('value',), {}, None)
+        self.task.apply_async(args=('value',), task_id='task_id')
+
+        self.assertEqual(mock_apply_async.call_count, 2)
+        self.assertTrue(self.task.is_previous_task_processing('value'))
+
+    def test_is_equal_compares_identity_of_serialized_task(self, mock_apply_async):
+        other_task = {'name': DummyBackgroundTask.name, 'args': ['value'], 'kwargs': {}}
+
+        self.assertTrue(self.task.is_equal(other_task, 'value'))
+        self.assertFalse(self.task.is_equal(other_task, 'other_value'))
@@ -0,0 +1,187 @@
+""" Write-behind tracking of authentication token activity.
+
+Token expiry is sliding: token expires if it has not been used for token lifetime of the user.
+Instead of updating token in database on each request, time of last usage is stored in cache and
+keys of used tokens are buffered in process. Buffer is flushed to "created" field of tokens
+at most once per FLUSH_INTERVAL seconds in batches of BATCH_SIZE tokens.
+Expiry check uses the latest of the cached time and the stored time.
+
+Key, user ID and creation time of token are cached for LOOKUP_TIMEOUT seconds, user is loaded
+by primary key on each lookup, so changes of user are taken into account right away.
+Cached token is invalidated when token is changed or deleted, for example on logout.
+
+Configuration example:
+    WALDUR_CORE['TOKEN_ACTIVITY'] = {
+        'ENABLED': True,
+        'FLUSH_INTERVAL': 60,
+        'BATCH_SIZE': 500,
+        'ACTIVITY_TIMEOUT': 24 * 60 * 60,
+        'LOOKUP_TIMEOUT': 5 * 60,
+    }
+"""
+from __future__ import unicode_literals
+
+import hashlib
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import models as django_models
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+from rest_framework.authtoken.models import Token
+
+DEFAULT_TOKEN_ACTIVITY_SETTINGS = {
+    'ENABLED': True,
+    'FLUSH_INTERVAL': 60,
+    'BATCH_SIZE': 500,
+    'ACTIVITY_TIMEOUT': 24 * 60 * 60,
+    'LOOKUP_TIMEOUT': 5 * 60,
+}
+
+
+def get_token_activity_settings():
+    return dict(DEFAULT_TOKEN_ACTIVITY_SETTINGS, **settings.WALDUR_CORE.get('TOKEN_ACTIVITY', {}))
+
+
+def _get_cache_key(prefix, token_key):
+    # Token is not used as cache key as is in order to avoid exposing it.
+    # md5 is used for internal caching, not need to care about security
+    return 'token_activity:%s:%s' % (prefix, hashlib.md5(force_bytes(token_key)).hexdigest())  # nosec
+
+
+def get_lookup_cache_key(token_key):
+    return _get_cache_key('lookup', token_key)
+
+
+def get_activity_cache_key(token_key):
+    return _get_cache_key('activity', token_key)
+
+
+def get_token(key):
+    """ Return token with user by key, raise Token.DoesNotExist if it is not found. """
+    conf = get_token_activity_settings()
+    if not conf['ENABLED']:
+        return Token.objects.select_related('user').get(key=key)
+
+    cache_key = get_lookup_cache_key(key)
+    values = cache.get(cache_key)
+    if values is None:
+        token = Token.objects.select_related('user').get(key=key)
+        # Only primitive values are cached, user model instance is not picklable and contains password hash.
+        values = {'key': token.key, 'user_id': token.user_id, 'created': token.created}
+        cache.set(cache_key, values, conf['LOOKUP_TIMEOUT'])
+        return token
+
+    User = get_user_model()
+    try:
+        user = User.objects.get(pk=values['user_id'])
+    except User.DoesNotExist:
+        cache.delete(cache_key)
+        raise Token.DoesNotExist
+    return Token(key=values['key'], user=user, created=values['created'])
+
+
+def get_last_activity(token):
+    """ Return time of last usage of token. """
+    last_activity = token.created
+    if get_token_activity_settings()['ENABLED']:
+        cached_activity = cache.get(get_activity_cache_key(token.key))
+        if cached_activity and cached_activity > last_activity:
+            last_activity = cached_activity
+    return last_activity
+
+
+def is_expired(token):
+    lifetime = token.user.token_lifetime
+    if not lifetime:
+        return False
+    return get_last_activity(token) < timezone.now() - timezone.timedelta(seconds=lifetime)
+
+
+class ActivityBuffer(object):
+    """ Thread safe buffer of keys of used tokens. """
+
+    def __init__(self, flush_interval=60):
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._keys = set()
+        self._flushed = time.time()
+
+    def add(self, key):
+        """ Add key to buffer, return True if buffer should be flushed. """
+        with self._lock:
+            self._keys.add(key)
+            return time.time() - self._flushed >= self.flush_interval
+
+    def pop_all(self):
+        with self._lock:
+            keys = self._keys
+            self._keys = set()
+            self._flushed = time.time()
+            return keys
+
+    def __len__(self):
+        with self._lock:
+            return len(self._keys)
+
+
+_buffer = {}
+
+
+def get_buffer():
+    """ Return activity buffer of current process, it is recreated after fork. """
+    pid = os.getpid()
+    if _buffer.get('pid') != pid:
+        _buffer['buffer'] = ActivityBuffer(flush_interval=get_token_activity_settings()['FLUSH_INTERVAL'])
+        _buffer['pid'] = pid
+    return _buffer['buffer']
+
+
+def touch(token):
+    """ Register usage of token, stored time of token usage is updated by the next flush. """
+    conf = get_token_activity_settings()
+    now = timezone.now()
+    if not conf['ENABLED']:
+        token.created = now
+        token.save(update_fields=['created'])
+        return
+
+    cache.set(get_activity_cache_key(token.key), now, conf['ACTIVITY_TIMEOUT'])
+    if get_buffer().add(token.key):
+        flush()
+
+
+def flush():
+    """ Store cached time of usage of buffered tokens, return number of updated tokens. """
+    keys = list(get_buffer().pop_all())
+    batch_size = get_token_activity_settings()['BATCH_SIZE']
+    updated = 0
+    for index in range(0, len(keys), batch_size):
+        updated += _flush_batch(keys[index:index + batch_size])
+    return updated
+
+
+def _flush_batch(keys):
+    cache_keys = {get_activity_cache_key(key): key for key in keys}
+    activities = {cache_keys[cache_key]: value for cache_key, value in cache.get_many(cache_keys.keys()).items()}
+    if not activities:
+        return 0
+
+    # Time of usage is stored in one query and only if it is newer than stored time.
+    whens = [django_models.When(key=key, created__lt=value, then=django_models.Value(value))
+             for key, value in activities.items()]
+    return Token.objects.filter(key__in=activities.keys()).update(
+        created=django_models.Case(*whens, default=django_models.F('created'),
+                                   output_field=django_models.DateTimeField()))
+
+
+def invalidate(token_key, activity=False):
+    """ Remove cached token, time of token usage is removed if activity is True. """
+    cache_keys = [get_lookup_cache_key(token_key)]
+    if activity:
+        cache_keys.append(get_activity_cache_key(token_key))
+    cache.delete_many(cache_keys)
@@ -206,3 +206,9 @@ def camel_case_to_underscore(name):
 
 def silent_call(name, *args, **options):
     call_command(name, stdout=open(os.devnull, 'w'), *args, **options)
+
+
+def chunked(items, size):
+    """ Split list of items into lists of given size. """
+    items = list(items)
+    return [items[i:i + size] for i in range(0, len(items), size)]
@@ -21,7 +21,7 @@ from rest_framework.views import exception_handler as rf_exception_handler
 from six.moves.urllib.parse import urlencode
 
 from waldur_core import __version__
-from waldur_core.core import permissions, WaldurExtension
+from waldur_core.core import permissions, token_activity, WaldurExtension
 from waldur_core.core.exceptions import IncorrectStateException
 from waldur_core.core.serializers import AuthTokenSerializer
 from waldur_core.logging.loggers import event_logger
@@ -55,13 +55,11 @@ class RefreshTokenMixin(object):
     def refresh_token(self, user):
         token, created = Token.objects.get_or_create(user=user)
 
-        if user.token_lifetime:
-            lifetime = timezone.timedelta(seconds=user.token_lifetime)
-
-            if token.created < timezone.now() - lifetime:
-                token.delete()
-                token = Token.objects.create(user=user)
-                created = True
+        # Time of last usage of token could be not flushed to database yet.
+        if token_activity.is_expired(token):
+            token.delete()
+            token = Token.objects.create(user=user)
+            created = True
 
         if not created:
             token.created = timezone.now()
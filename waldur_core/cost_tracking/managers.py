@@ -1,18 +1,15 @@
 import datetime
 
-from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import ObjectDoesNotExist
 from django.db import models as django_models
-from django.db.models import Q
 from django.utils import timezone
 
 from waldur_core.core import utils as core_utils
 from waldur_core.core.managers import GenericKeyMixin
-from waldur_core.structure.managers import filter_queryset_for_user
+from waldur_core.structure.managers import filter_scope_queryset_for_user
 from waldur_core.structure.models import Service
 
 
-# TODO: This mixin duplicates quota filter manager - they need to be moved to core (NC-686)
 class UserFilterMixin(object):
 
     def filtered_for_user(self, user, queryset=None):
@@ -22,13 +19,7 @@ class UserFilterMixin(object):
         if user.is_staff or user.is_support:
             return queryset
 
-        query = Q()
-        for model in self.get_available_models():
-            user_object_ids = filter_queryset_for_user(model.objects.all(), user).values_list('id', flat=True)
-            content_type_id = ContentType.objects.get_for_model(model).id
-            query |= Q(object_id__in=list(user_object_ids), content_type_id=content_type_id)
-
-        return queryset.filter(query)
+        return filter_scope_queryset_for_user(queryset, user, self.get_available_models())
 
     def get_available_models(self):
         """ Return list of models that are acceptable """
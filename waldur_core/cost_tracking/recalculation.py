@@ -0,0 +1,202 @@
+from __future__ import unicode_literals
+
+from collections import defaultdict
+import logging
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Case, F, FloatField, Value, When
+from django.utils import timezone
+
+from waldur_core.core.utils import chunked
+from waldur_core.cost_tracking import CostTrackingRegister, models
+from waldur_core.structure import models as structure_models
+
+logger = logging.getLogger(__name__)
+
+
+class PriceEstimateRecalculator(object):
+    """ Recalculates consumed price of current month estimates of all resources and their ancestors in bulk.
+
+    Price lists are loaded once per resource content type and service, price estimates and consumption
+    details of resources are loaded with one query per resource model. Resources prices are rolled up
+    to ancestors estimates in one pass over estimates parents graph and saved with chunked UPDATE queries.
+    If recalculate_total is True total price of resources is recalculated too and its change
+    is added to totals of ancestors estimates.
+
+    Missing estimates of resources are created one by one, as it happens only for new resources
+    and at the beginning of month.
+
+    Usage example:
+        PriceEstimateRecalculator(recalculate_total=True).run()
+    """
+    UPDATE_CHUNK_SIZE = 500
+
+    def __init__(self, recalculate_total=False):
+        self.recalculate_total = recalculate_total
+        self.now = timezone.now()
+        # resource content type id -> {(item type, key): minute rate}
+        self._default_rates = defaultdict(dict)
+        # (resource content type id, service content type id, service id) -> {(item type, key): minute rate}
+        self._service_rates = defaultdict(dict)
+        # (resource content type id, service content type id, service id) -> merged minute rates
+        self._rates = {}
+        # estimate id -> list of parents estimates ids
+        self._parents = defaultdict(list)
+        # estimate id -> set of ancestors estimates ids
+        self._ancestors = {}
+
+    def run(self):
+        created_ids = set()
+        for model in CostTrackingRegister.registered_resources:
+            created_ids.update(self.create_missing_resources_estimates(model))
+        for model in self.get_ancestors_models():
+            self.create_missing_ancestors_estimates(model)
+
+        self.load_price_lists()
+        self.load_parents()
+
+        # estimate id -> consumed price
+        consumed = {}
+        # estimate id -> change of total price
+        totals_deltas = defaultdict(lambda: 0)
+        for model in structure_models.ResourceMixin.get_all_models():
+            if model in CostTrackingRegister.registered_resources:
+                for estimate, service_key in self.get_resources_estimates(model):
+                    rates = self.get_rates(estimate.content_type_id, service_key)
+                    details = estimate.consumption_details
+                    consumed[estimate.pk] = self.get_price(rates, details.consumed_until_now)
+                    if self.recalculate_total or estimate.pk in created_ids:
+                        delta = self.get_price(rates, details.consumed_in_month) - estimate.total
+                        if delta:
+                            totals_deltas[estimate.pk] += delta
+                            for ancestor_id in self.get_ancestors(estimate.pk):
+                                totals_deltas[ancestor_id] += delta
+            else:
+                # Estimates of resources that are not registered are not recalculated but they are rolled up.
+                consumed.update(self.get_current_estimates(model).values_list('pk', 'consumed'))
+
+        ancestors_consumed = {pk: 0 for model in self.get_ancestors_models()
+                              for pk in self.get_current_estimates(model).values_list('pk', flat=True)}
+        for estimate_id, value in consumed.items():
+            for ancestor_id in self.get_ancestors(estimate_id):
+                if ancestor_id in ancestors_consumed:
+                    ancestors_consumed[ancestor_id] += value
+
+        consumed.update(ancestors_consumed)
+        with transaction.atomic():
+            self.set_values('consumed', consumed)
+            self.add_totals(totals_deltas)
+
+    def get_ancestors_models(self):
+        return [m for m in models.PriceEstimate.get_estimated_models()
+                if not issubclass(m, structure_models.ResourceMixin)]
+
+    def get_current_estimates(self, model):
+        """ Return current month estimates of existing objects of model. """
+        content_type = ContentType.objects.get_for_model(model)
+        return models.PriceEstimate.objects.filter_current().filter(
+            content_type=content_type, object_id__in=model.objects.values('pk'))
+
+    def create_missing_resources_estimates(self, model):
+        content_type = ContentType.objects.get_for_model(model)
+        existing = models.PriceEstimate.objects.filter_current().filter(content_type=content_type)
+        created_ids = []
+        for resource in model.objects.exclude(pk__in=existing.values('object_id')):
+            price_estimate, created = models.PriceEstimate.objects.get_or_create_current(scope=resource)
+            if created:
+                models.ConsumptionDetails.objects.create(price_estimate=price_estimate)
+                price_estimate.create_ancestors()
+                created_ids.append(price_estimate.pk)
+        return created_ids
+
+    def create_missing_ancestors_estimates(self, model):
+        content_type = ContentType.objects.get_for_model(model)
+        existing = models.PriceEstimate.objects.filter_current().filter(content_type=content_type)
+        models.PriceEstimate.objects.bulk_create([
+            models.PriceEstimate(content_type=content_type, object_id=pk, month=self.now.month, year=self.now.year)
+            for pk in model.objects.exclude(pk__in=existing.values('object_id')).values_list('pk', flat=True)
+        ])
+
+    def get_resources_estimates(self, model):
+        """ Return list of (estimate, service key) pairs for estimates of resources that have consumption details. """
+        spl_model = model._meta.get_field('service_project_link').related_model
+        service_content_type = ContentType.objects.get_for_model(spl_model._meta.get_field('service').related_model)
+        services_ids = dict(model.objects.values_list('pk', 'service_project_link__service_id'))
+
+        estimates = self.get_current_estimates(model).select_related('consumption_details')
+        result = []
+        for estimate in estimates:
+            try:
+                estimate.consumption_details
+            except models.ConsumptionDetails.DoesNotExist:
+                logger.warning('Price estimate %s does not have consumption details, it is not recalculated.',
+                               estimate.pk)
+                continue
+            result.append((estimate, (service_content_type.id, services_ids[estimate.object_id])))
+        return result
+
+    def load_price_lists(self):
+        resources_content_types = ContentType.objects.get_for_models(
+            *CostTrackingRegister.registered_resources).values()
+        default_items = models.DefaultPriceListItem.objects.filter(resource_content_type__in=resources_content_types)
+        for content_type_id, item_type, key, value in default_items.values_list(
+                'resource_content_type_id', 'item_type', 'key', 'value'):
+            self._default_rates[content_type_id][(item_type, key)] = float(value) / 60
+
+        service_items = models.PriceListItem.objects.filter(
+            default_price_list_item__resource_content_type__in=resources_content_types)
+        for row in service_items.values_list(
+                'default_price_list_item__resource_content_type_id', 'content_type_id', 'object_id',
+                'default_price_list_item__item_type', 'default_price_list_item__key', 'value'):
+            content_type_id, service_content_type_id, service_id, item_type, key, value = row
+            self._service_rates[(content_type_id, service_content_type_id, service_id)][(item_type, key)] = \
+                float(value) / 60
+
+    def get_rates(self, content_type_id, service_key):
+        """ Return minute rates of consumables: service price list items override default ones. """
+        key = (content_type_id,) + service_key
+        if key not in self._service_rates:
+            return self._default_rates[content_type_id]
+        if key not in self._rates:
+            self._rates[key] = self._default_rates[content_type_id].copy()
+            self._rates[key].update(self._service_rates[key])
+        return self._rates[key]
+
+    def get_price(self, rates, consumed):
+        total = 0
+        for consumable_item, usage in consumed.items():
+            try:
+                total += rates[(consumable_item.item_type, consumable_item.key)] * usage
+            except KeyError:
+                logger.error('Price list item for consumable "%s" does not exist.' % consumable_item)
+        return total
+
+    def load_parents(self):
+        through = models.PriceEstimate.parents.through
+        for child_id, parent_id in through.objects.filter(
+                from_priceestimate__month=self.now.month, from_priceestimate__year=self.now.year).values_list(
+                'from_priceestimate_id', 'to_priceestimate_id'):
+            self._parents[child_id].append(parent_id)
+
+    def get_ancestors(self, estimate_id):
+        """ Return ids of all unique ancestors of estimate. """
+        if estimate_id not in self._ancestors:
+            ancestors = set()
+            for parent_id in self._parents.get(estimate_id, ()):
+                ancestors.add(parent_id)
+                ancestors.update(self.get_ancestors(parent_id))
+            self._ancestors[estimate_id] = ancestors
+        return self._ancestors[estimate_id]
+
+    def set_values(self, field, values):
+        """ Save values of field with one UPDATE query per chunk of estimates. """
+        for ids in chunked(sorted(values), self.UPDATE_CHUNK_SIZE):
+            value = Case(*[When(pk=pk, then=Value(values[pk])) for pk in ids], output_field=FloatField())
+            models.PriceEstimate.objects.filter(pk__in=ids).update(**{field: value})
+
+    def add_totals(self, deltas):
+        changed_ids = [pk for pk, delta in deltas.items() if delta]
+        for ids in chunked(sorted(changed_ids), self.UPDATE_CHUNK_SIZE):
+            delta = Case(*[When(pk=pk, then=Value(deltas[pk])) for pk in ids], output_field=FloatField())
+            models.PriceEstimate.objects.filter(pk__in=ids).update(total=F('total') + delta)
@@ -1,7 +1,9 @@
 import datetime
 
 from django.contrib.contenttypes.models import ContentType
+from django.db import connection
 from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 from freezegun import freeze_time
 
 from waldur_core.cost_tracking import models, CostTrackingRegister, tasks
@@ -76,3 +78,46 @@ class RecalculateEstimateTest(TransactionTestCase):
             message = 'Price estimate "consumed" is calculated wrongly for "%s". Real value: %s, expected: %s.' % (
                 price_estimate.scope, price_estimate.consumed, expected_consumed)
             self.assertAlmostEqual(price_estimate.consumed, expected_consumed, msg=message)
+
+    def test_service_price_list_item_overrides_default_one(self):
+        factories.PriceListItemFactory(
+            service=self.service, default_price_list_item=self.price_list_item, value=3)
+
+        calculation_time = datetime.datetime(2016, 8, 8, 15, 0)
+        with freeze_time(calculation_time):
+            tasks.recalculate_estimate()
+            price_estimate = models.PriceEstimate.objects.get_current(scope=self.resource)
+
+        working_minutes = (calculation_time - self.start_time).total_seconds() / 60
+        expected = working_minutes * 3.0 / 60 * self.resource.disk
+        self.assertAlmostEqual(price_estimate.consumed, expected)
+
+    def test_total_of_resource_and_ancestors_is_recalculated_if_price_is_changed(self):
+        self.price_list_item.value = 4
+        self.price_list_item.save()
+
+        with freeze_time(datetime.datetime(2016, 8, 8, 15, 0)):
+            tasks.recalculate_estimate(recalculate_total=True)
+            price_estimates = [models.PriceEstimate.objects.get_current(scope=scope) for scope in
+                               (self.resource, self.service, self.spl, self.project, self.customer)]
+
+        month_end = datetime.datetime(2016, 8, 31, 23, 59, 59)
+        working_minutes = int((month_end - self.start_time).total_seconds() / 60)
+        expected_total = working_minutes * 4.0 / 60 * self.resource.disk
+        for price_estimate in price_estimates:
+            self.assertAlmostEqual(price_estimate.total, expected_total)
+
+    def test_queries_count_does_not_depend_on_resources_count(self):
+        def get_queries_count():
+            with freeze_time(datetime.datetime(2016, 8, 8, 15, 0)):
+                # estimates of new resources are created on first run
+                tasks.recalculate_estimate()
+                with CaptureQueriesContext(connection) as context:
+                    tasks.recalculate_estimate()
+            return len(context.captured_queries)
+
+        queries_count = get_queries_count()
+        with freeze_time(self.start_time):
+            structure_factories.TestNewInstanceFactory.create_batch(3, disk=1024, service_project_link=self.spl)
+
+        self.assertEqual(get_queries_count(), queries_count)
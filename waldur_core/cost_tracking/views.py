@@ -22,6 +22,7 @@ class PriceEstimateViewSet(core_views.ReadOnlyActionsViewSet):
         filters.PriceEstimateScopeFilterBackend,
         ScopeTypeFilterBackend,
     )
+    pagination_approximate_count = True
 
     def get_serializer_context(self):
         context = super(PriceEstimateViewSet, self).get_serializer_context()
@@ -17,3 +17,18 @@ class EventsConfig(AppConfig):
                 sender=model,
                 dispatch_uid='waldur_core.logging.handlers.remove_{}_{}_related_alerts'.format(model.__name__, index),
             )
+
+        for index, model in enumerate(utils.get_permission_loggable_models()):
+            signals.post_save.connect(
+                handlers.invalidate_permitted_objects_uuids_on_scope_creation,
+                sender=model,
+                dispatch_uid='waldur_core.logging.handlers.'
+                             'invalidate_permitted_objects_uuids_on_{}_{}_creation'.format(model.__name__, index),
+            )
+
+            signals.pre_delete.connect(
+                handlers.invalidate_permitted_objects_uuids_on_scope_deletion,
+                sender=model,
+                dispatch_uid='waldur_core.logging.handlers.'
+                             'invalidate_permitted_objects_uuids_on_{}_{}_deletion'.format(model.__name__, index),
+            )
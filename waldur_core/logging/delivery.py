@@ -0,0 +1,195 @@
+""" Pooled delivery of HTTP hooks.
+
+Requests of hooks are sent concurrently by a pool of threads. Connections are kept alive
+in a session per destination host, number of concurrent requests to one host is limited.
+Requests failed because of connection error, timeout or server error are retried with
+exponential backoff.
+
+Configuration example:
+    WALDUR_CORE['WEBHOOK_DELIVERY'] = {
+        'MAX_WORKERS': 10,
+        'MAX_CONNECTIONS_PER_HOST': 4,
+        'TIMEOUT': 10,
+        'RETRIES': 3,
+        'BACKOFF': 0.5,
+        'BATCH_EVENTS': False,
+    }
+"""
+from __future__ import unicode_literals
+
+from collections import namedtuple
+import logging
+import threading
+import time
+
+from django.conf import settings
+import requests
+from requests.adapters import HTTPAdapter
+from six.moves import queue
+from six.moves.urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+Delivery = namedtuple('Delivery', ('url', 'kwargs'))
+
+DEFAULT_DELIVERY_SETTINGS = {
+    'MAX_WORKERS': 10,
+    'MAX_CONNECTIONS_PER_HOST': 4,
+    'TIMEOUT': 10,
+    'RETRIES': 3,
+    'BACKOFF': 0.5,
+    'BATCH_EVENTS': False,
+}
+
+
+def get_delivery_settings():
+    return dict(DEFAULT_DELIVERY_SETTINGS, **settings.WALDUR_CORE.get('WEBHOOK_DELIVERY', {}))
+
+
+class DeliveryMetrics(object):
+    """ Thread safe counters of delivery engine. """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.delivered = 0
+            self.failed = 0
+            self.retried = 0
+            self.total_latency = 0.0
+            self.max_latency = 0.0
+            self.queue_depth = 0
+            self.max_queue_depth = 0
+
+    def record_delivery(self, latency):
+        with self._lock:
+            self.delivered += 1
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+
+    def record_failure(self):
+        with self._lock:
+            self.failed += 1
+
+    def record_retry(self):
+        with self._lock:
+            self.retried += 1
+
+    def set_queue_depth(self, depth):
+        with self._lock:
+            self.queue_depth = depth
+            self.max_queue_depth = max(self.max_queue_depth, depth)
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'delivered': self.delivered,
+                'failed': self.failed,
+                'retried': self.retried,
+                'average_latency': self.total_latency / self.delivered if self.delivered else 0.0,
+                'max_latency': self.max_latency,
+                'queue_depth': self.queue_depth,
+                'max_queue_depth': self.max_queue_depth,
+            }
+
+
+class DeliveryEngine(object):
+    RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+    def __init__(self, max_workers=10, max_connections_per_host=4, timeout=10, retries=3, backoff=0.5):
+        self.max_workers = max_workers
+        self.max_connections_per_host = max_connections_per_host
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.metrics = DeliveryMetrics()
+        self._lock = threading.Lock()
+        # host -> (session, semaphore)
+        self._hosts = {}
+
+    def get_host(self, host):
+        """ Return session and concurrency limiting semaphore of destination host. """
+        with self._lock:
+            if host not in self._hosts:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_connections_per_host)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._hosts[host] = (session, threading.BoundedSemaphore(self.max_connections_per_host))
+            return self._hosts[host]
+
+    def send(self, deliveries):
+        """ Send requests concurrently and wait until all of them are finished. Return count of failed requests. """
+        pending = queue.Queue()
+        for delivery in deliveries:
+            pending.put(delivery)
+        if pending.empty():
+            return 0
+
+        failures = []
+
+        def worker():
+            while True:
+                try:
+                    delivery = pending.get_nowait()
+                except queue.Empty:
+                    return
+                self.metrics.set_queue_depth(pending.qsize())
+                if not self.deliver(delivery):
+                    failures.append(delivery)
+
+        workers_count = min(self.max_workers, pending.qsize())
+        if workers_count == 1:
+            worker()
+        else:
+            threads = [threading.Thread(target=worker) for _ in range(workers_count)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        return len(failures)
+
+    def deliver(self, delivery):
+        """ Send one request with retries. Return True if request has succeeded. """
+        session, semaphore = self.get_host(urlparse(delivery.url).netloc)
+        error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self.metrics.record_retry()
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+            started = time.time()
+            try:
+                with semaphore:
+                    response = session.post(delivery.url, timeout=self.timeout, **delivery.kwargs)
+            except requests.RequestException as e:
+                error = e
+                continue
+            if response.ok:
+                self.metrics.record_delivery(time.time() - started)
+                return True
+            error = 'HTTP status %s' % response.status_code
+            if response.status_code not in self.RETRY_STATUS_CODES:
+                break
+
+        logger.warning('Unable to deliver hook request to %s: %s', delivery.url, error)
+        self.metrics.record_failure()
+        return False
+
+
+_engine = {}
+
+
+def get_engine():
+    """ Return delivery engine of current process, it is created lazily to avoid sharing connections after fork. """
+    if 'engine' not in _engine:
+        conf = get_delivery_settings()
+        _engine['engine'] = DeliveryEngine(
+            max_workers=conf['MAX_WORKERS'],
+            max_connections_per_host=conf['MAX_CONNECTIONS_PER_HOST'],
+            timeout=conf['TIMEOUT'],
+            retries=conf['RETRIES'],
+            backoff=conf['BACKOFF'],
+        )
+    return _engine['engine']
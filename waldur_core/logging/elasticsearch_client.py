@@ -1,8 +1,10 @@
 from __future__ import unicode_literals
 
 import logging
+import threading
 
 from django.conf import settings
+from django.utils.module_loading import import_string
 from elasticsearch import Elasticsearch
 import six
 
@@ -10,6 +12,17 @@ from waldur_core.core.utils import datetime_to_timestamp
 
 logger = logging.getLogger(__name__)
 
+# Elasticsearch clients are shared by all requests of process, so connections are reused.
+# Client is thread safe, its transport keeps pool of connections to each node.
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def clear_clients():
+    """ Drop shared clients, for example if Elasticsearch settings were changed. """
+    with _clients_lock:
+        _clients.clear()
+
 
 class ElasticsearchError(Exception):
     pass
@@ -33,12 +46,23 @@ class EmptyQueryset(object):
     def __getitem__(self, key):
         return []
 
+    def get_page_after(self, search_after, size):
+        return {'events': [], 'total': 0, 'next': None}
+
+
+def get_event_store():
+    """ Return client of event store that is defined by EVENT_STORE setting, Elasticsearch is used by default. """
+    path = settings.WALDUR_CORE.get('EVENT_STORE')
+    if not path:
+        return ElasticsearchClient()
+    return import_string(path)()
+
 
 class ElasticsearchResultList(object):
     """ List of results acceptable by django pagination """
 
     def __init__(self):
-        self.client = ElasticsearchClient()
+        self.client = get_event_store()
 
     def filter(self, should_terms=None, must_terms=None, must_not_terms=None, search_text='', start=None, end=None):
         setattr(self, 'total', None)
@@ -71,9 +95,22 @@ class ElasticsearchResultList(object):
 
     def __len__(self):
         if not hasattr(self, 'total') or self.total is None:
-            self.total = self._get_events(0, 1)['total']
+            self.total = self.count()
         return self.total
 
+    def get_page_after(self, search_after, size):
+        """ Return page of events that follow event with given sort values, total count of events
+            and sort values of the last event if next page exists. Deep pages are fetched
+            with search_after instead of from_ and size, so they are not limited by result window.
+        """
+        result = self.client.get_events_after(
+            search_after=search_after,
+            size=size,
+            sort=getattr(self, 'sort', '-@timestamp'),
+        )
+        self.total = result['total']
+        return result
+
     def __getitem__(self, key):
         if isinstance(key, slice):
             if key.step is not None and key.step != 1:
@@ -256,6 +293,22 @@ class ElasticsearchClient(object):
             'total': search_results['hits']['total'],
         }
 
+    def get_events_after(self, sort='-@timestamp', index='_all', search_after=None, size=10):
+        """ Get events that follow event with given sort values. Events are sorted by _uid
+            additionally, so events with the same sort field value are not skipped.
+        """
+        order = 'desc' if sort.startswith('-') else 'asc'
+        body = dict(self.body, sort=[{sort.lstrip('-'): order}, {'_uid': order}])
+        if search_after:
+            body['search_after'] = search_after
+        search_results = self.client.search(index=index, body=body, size=size)
+        hits = search_results['hits']['hits']
+        return {
+            'events': [r['_source'] for r in hits],
+            'total': search_results['hits']['total'],
+            'next': hits[-1]['sort'] if hits and len(hits) == size else None,
+        }
+
     def get_count(self, index='_all'):
         count_results = self.client.count(index=index, body=self.body)
         return count_results['count']
@@ -299,6 +352,13 @@ class ElasticsearchClient(object):
 
     def _get_client(self):
         elasticsearch_settings = self._get_elastisearch_settings()
+        key = tuple(sorted((name, six.text_type(value)) for name, value in elasticsearch_settings.items()))
+        with _clients_lock:
+            if key not in _clients:
+                _clients[key] = self._create_client(elasticsearch_settings)
+            return _clients[key]
+
+    def _create_client(self, elasticsearch_settings):
         if elasticsearch_settings.get('username') and elasticsearch_settings.get('password'):
             path = '%(protocol)s://%(username)s:%(password)s@%(host)s:%(port)s' % elasticsearch_settings
         else:
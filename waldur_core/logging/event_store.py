@@ -0,0 +1,137 @@
+""" Database event store, an alternative to Elasticsearch for small and medium installations.
+
+Events are written by DatabaseEventHandler log handler to append-only Event table, scalar fields
+of event context are copied to EventTerm table, so events are filtered by terms using index.
+Store is enabled by EVENT_STORE setting:
+
+    WALDUR_CORE['EVENT_STORE'] = 'waldur_core.logging.event_store.DatabaseEventStore'
+"""
+from __future__ import unicode_literals
+
+from django.db.models import Case, IntegerField, Q, Sum, Value, When
+from django.utils.dateparse import parse_datetime
+import six
+
+from waldur_core.core.utils import datetime_to_timestamp
+from waldur_core.logging import models
+from waldur_core.logging.elasticsearch_client import ElasticsearchClient
+
+
+class DatabaseEventStore(object):
+    """ Event store with the same interface as ElasticsearchClient. """
+
+    FTS_FIELDS = ElasticsearchClient.SearchBody.FTS_FIELDS
+    SORT_FIELDS = {
+        '@timestamp': 'timestamp',
+        'event_type': 'event_type',
+        'levelname': 'levelname',
+        'message': 'message',
+    }
+
+    def __init__(self):
+        self.queryset = models.Event.objects.all()
+
+    def prepare_search_body(self, should_terms=None, must_terms=None, must_not_terms=None, search_text='',
+                            start=None, end=None):
+        """ Prepare events queryset, parameters have the same meaning as in ElasticsearchClient. """
+        queryset = models.Event.objects.all()
+        if should_terms:
+            queryset = queryset.filter(self._get_terms_filter(should_terms, lambda a, b: a | b))
+        if must_terms:
+            queryset = queryset.filter(self._get_terms_filter(must_terms, lambda a, b: a & b))
+        if must_not_terms:
+            queryset = queryset.exclude(self._get_terms_filter(must_not_terms, lambda a, b: a | b))
+        if search_text:
+            queryset = queryset.filter(
+                Q(message__icontains=search_text) |
+                Q(uuid__in=models.EventTerm.objects.filter(
+                    name__in=self.FTS_FIELDS, value__icontains=search_text).values('event_id'))
+            )
+        if start is not None:
+            queryset = queryset.filter(timestamp__gte=start)
+        if end is not None:
+            queryset = queryset.filter(timestamp__lt=end)
+        self.queryset = queryset
+
+    def _get_terms_filter(self, terms, combine):
+        conditions = []
+        for key, values in terms.items():
+            # Terms of keyword subfields, for example customer_uuid.keyword, are stored by field name.
+            name = key.split('.', 1)[0]
+            values = [six.text_type(value) for value in values]
+            if name == 'event_type':
+                conditions.append(Q(event_type__in=values))
+            else:
+                conditions.append(Q(uuid__in=models.EventTerm.objects.filter(
+                    name=name, value__in=values).values('event_id')))
+        result = conditions[0]
+        for condition in conditions[1:]:
+            result = combine(result, condition)
+        return result
+
+    def _get_ordering(self, sort):
+        is_descending = sort.startswith('-')
+        field = self.SORT_FIELDS.get(sort.lstrip('-'), 'timestamp')
+        return field, is_descending
+
+    def get_events(self, sort='-@timestamp', from_=0, size=10):
+        field, is_descending = self._get_ordering(sort)
+        prefix = '-' if is_descending else ''
+        events = self.queryset.order_by(prefix + field, prefix + 'pk')[from_:from_ + size]
+        return {
+            'events': [event.context for event in events],
+            'total': self.queryset.count(),
+        }
+
+    def get_events_after(self, sort='-@timestamp', search_after=None, size=10):
+        """ Get events that follow event with given sort field value and primary key. """
+        field, is_descending = self._get_ordering(sort)
+        prefix = '-' if is_descending else ''
+        queryset = self.queryset.order_by(prefix + field, prefix + 'pk')
+        if search_after:
+            value, pk = search_after
+            if field == 'timestamp':
+                value = parse_datetime(value)
+            lookup = 'lt' if is_descending else 'gt'
+            queryset = queryset.filter(
+                Q(**{field + '__' + lookup: value}) | Q(**{field: value, 'pk__' + lookup: pk}))
+        events = list(queryset[:size])
+        next_position = None
+        if events and len(events) == size:
+            last = events[-1]
+            value = getattr(last, field)
+            next_position = [value.isoformat() if field == 'timestamp' else value, last.pk]
+        return {
+            'events': [event.context for event in events],
+            'total': self.queryset.count(),
+            'next': next_position,
+        }
+
+    def get_count(self):
+        return self.queryset.count()
+
+    def get_aggregated_by_timestamp_count(self, ranges):
+        """ Count events in each timestamp range with one query. """
+        aggregates = {}
+        for index, timestamp_range in enumerate(ranges):
+            conditions = {}
+            if 'start' in timestamp_range:
+                conditions['timestamp__gte'] = timestamp_range['start']
+            if 'end' in timestamp_range:
+                conditions['timestamp__lt'] = timestamp_range['end']
+            aggregates['range_%s' % index] = Sum(Case(
+                When(then=Value(1), **conditions) if conditions else When(pk__isnull=False, then=Value(1)),
+                default=Value(0),
+                output_field=IntegerField(),
+            ))
+        counts = self.queryset.aggregate(**aggregates) if aggregates else {}
+
+        formatted_results = []
+        for index, timestamp_range in enumerate(ranges):
+            formatted = {'count': counts['range_%s' % index] or 0}
+            if 'start' in timestamp_range:
+                formatted['start'] = datetime_to_timestamp(timestamp_range['start'])
+            if 'end' in timestamp_range:
+                formatted['end'] = datetime_to_timestamp(timestamp_range['end'])
+            formatted_results.append(formatted)
+        return formatted_results
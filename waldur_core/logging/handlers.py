@@ -1,6 +1,6 @@
 from django.contrib.contenttypes import models as ct_models
 
-from waldur_core.logging import models
+from waldur_core.logging import models, utils
 
 
 def remove_related_alerts(sender, instance, **kwargs):
@@ -8,3 +8,13 @@ def remove_related_alerts(sender, instance, **kwargs):
     for alert in models.Alert.objects.filter(
             object_id=instance.id, content_type=content_type, closed__isnull=True).iterator():
         alert.close()
+
+
+def invalidate_permitted_objects_uuids_on_scope_creation(sender, instance, created=False, **kwargs):
+    if created:
+        utils.invalidate_scope_permitted_objects_uuids(instance)
+
+
+def invalidate_permitted_objects_uuids_on_scope_deletion(sender, instance, **kwargs):
+    # Permitted users are found before deletion, because their roles could be deleted together with scope.
+    utils.invalidate_scope_permitted_objects_uuids(instance)
@@ -5,6 +5,11 @@ import json
 import logging
 
 from celery import current_app
+from django.db import transaction
+from django.utils import timezone
+import six
+
+from waldur_core.logging import pipeline
 
 
 class EventFormatter(logging.Formatter):
@@ -25,9 +30,12 @@ class EventFormatter(logging.Formatter):
             return 'critical'
 
     def format(self, record):
+        return json.dumps(self.get_document(record))
+
+    def get_document(self, record):
         message = {
             # basic
-            '@timestamp': self.format_timestamp(record.created),
+            '@timestamp': self.format_timestamp(get_record_timestamp(record)),
             '@version': 1,
             'message': record.getMessage(),
 
@@ -44,7 +52,7 @@ class EventFormatter(logging.Formatter):
         if hasattr(record, 'event_context'):
             message.update(record.event_context)
 
-        return json.dumps(message)
+        return message
 
 
 class EventLoggerAdapter(logging.LoggerAdapter, object):
@@ -88,7 +96,19 @@ class RequireNotBackgroundTask(logging.Filter):
         return not is_background
 
 
-class TCPEventHandler(logging.handlers.SocketHandler, object):
+class BatchHandlerMixin(object):
+    """ Handler that processes records of events pipeline batch together. """
+
+    def emit(self, record):
+        if not pipeline.add_to_batch(self, record):
+            self.emit_batch([record])
+
+    def emit_batch(self, records):
+        raise NotImplementedError
+
+
+class TCPEventHandler(BatchHandlerMixin, logging.handlers.SocketHandler, object):
+    """ Send records to log server, records of batch are sent with one write. """
 
     def __init__(self, host='localhost', port=5959):
         super(TCPEventHandler, self).__init__(host, int(port))
@@ -97,22 +117,98 @@ class TCPEventHandler(logging.handlers.SocketHandler, object):
     def makePickle(self, record):
         return self.formatter.format(record) + b'\n'
 
+    def emit_batch(self, records):
+        try:
+            self.send(b''.join(self.makePickle(record) for record in records))
+        except (KeyboardInterrupt, SystemExit):
+            raise
+        except Exception:
+            self.handleError(records[0])
 
-class HookHandler(logging.Handler):
-    def emit(self, record):
+
+class DatabaseEventHandler(BatchHandlerMixin, logging.Handler):
+    """ Store records in database event store, records of batch are inserted with one query per table. """
+
+    def __init__(self):
+        super(DatabaseEventHandler, self).__init__()
+        self.formatter = EventFormatter()
+
+    def emit_batch(self, records):
+        # XXX: This import provides circular dependencies between models and log modules.
+        from waldur_core.logging import models
+
+        events = []
+        terms = []
+        for record in records:
+            if not hasattr(record, 'event_type'):
+                continue
+            document = self.formatter.get_document(record)
+            event = models.Event(
+                timestamp=datetime.datetime.fromtimestamp(get_record_timestamp(record), tz=timezone.utc),
+                event_type=record.event_type,
+                levelname=record.levelname,
+                message=document['message'],
+                context=document,
+            )
+            events.append(event)
+            terms.extend(models.EventTerm(event_id=event.uuid, name=name, value=value)
+                         for name, value in get_event_terms(getattr(record, 'event_context', {})))
+        if not events:
+            return
+        try:
+            with transaction.atomic():
+                models.Event.objects.bulk_create(events)
+                models.EventTerm.objects.bulk_create(terms)
+        except (KeyboardInterrupt, SystemExit):
+            raise
+        except Exception:
+            self.handleError(records[0])
+
+
+class HookHandler(BatchHandlerMixin, logging.Handler):
+    """ Process events by hooks in background, records of batch are processed by one task. """
+
+    def emit_batch(self, records):
         # Check that record contains event
-        if hasattr(record, 'event_type') and hasattr(record, 'event_context'):
-
-            # Convert record to plain dictionary
-            event = {
-                'timestamp': record.created,
-                'levelname': record.levelname,
-                'message': record.getMessage(),
-                'type': record.event_type,
-                'context': record.event_context
-            }
-            # XXX: This import provides circular dependencies between core and
-            #      logging applications.
-            from waldur_core.core.tasks import send_task
-            # Perform hook processing in background thread
-            send_task('logging', 'process_event')(event)
+        events = [self.get_event(record) for record in records
+                  if hasattr(record, 'event_type') and hasattr(record, 'event_context')]
+        if not events:
+            return
+
+        # XXX: This import provides circular dependencies between core and
+        #      logging applications.
+        from waldur_core.core.tasks import send_task
+        # Perform hook processing in background thread
+        if len(events) == 1:
+            send_task('logging', 'process_event')(events[0])
+        else:
+            send_task('logging', 'process_events_batch')(events)
+
+    def get_event(self, record):
+        # Convert record to plain dictionary
+        return {
+            'timestamp': get_record_timestamp(record),
+            'levelname': record.levelname,
+            'message': record.getMessage(),
+            'type': record.event_type,
+            'context': record.event_context
+        }
+
+
+def get_event_terms(context):
+    """ Return (name, value) pairs of scalar context values, items of list values are returned separately. """
+    from waldur_core.logging import models
+
+    for name, values in context.items():
+        if not isinstance(values, (list, tuple)):
+            values = [values]
+        for value in values:
+            if isinstance(value, (six.string_types, six.integer_types, float)):
+                value = six.text_type(value)
+                if len(value) <= models.EventTerm.MAX_VALUE_LENGTH:
+                    yield name, value
+
+
+def get_record_timestamp(record):
+    """ Records of buffered events are created on emission, event timestamp keeps original time. """
+    return getattr(record, 'event_timestamp', record.created)
@@ -12,10 +12,11 @@ import uuid
 
 from django.apps import apps
 from django.contrib.contenttypes import models as ct_models
+from django.core.cache import cache
 from django.db import transaction, IntegrityError
 import six
 
-from waldur_core.logging import models
+from waldur_core.logging import models, pipeline
 from waldur_core.logging.log import EventLoggerAdapter
 from waldur_core.logging.middleware import get_event_context
 
@@ -198,8 +199,7 @@ class EventLogger(BaseLogger):
         context = self.compile_context(**event_context)
         msg = self.compile_message(message_template, context)
 
-        log = getattr(self.logger, level)
-        log(msg, extra={'event_type': event_type, 'event_context': context})
+        pipeline.add_event(self.logger, level, msg, extra={'event_type': event_type, 'event_context': context})
 
 
 class AlertLogger(BaseLogger):
@@ -364,6 +364,13 @@ class LoggableMixin(object):
     def get_permitted_objects_uuids(cls, user):
         return {}
 
+    def get_permitted_users(self):
+        """
+        Return queryset of users who are permitted to see object events, except staff and support users.
+        None means that object could be permitted to any user.
+        """
+        return None
+
 
 class BaseLoggerRegistry(object):
 
@@ -404,12 +411,33 @@ class EventLoggerRegistry(BaseLoggerRegistry):
     def get_loggers(self):
         return [l for l in self.__dict__.values() if isinstance(l, EventLogger)]
 
+    PERMITTED_OBJECTS_UUIDS_CACHE_TIMEOUT = 60 * 60
+
     def get_permitted_objects_uuids(self, user):
-        from waldur_core.logging.utils import get_loggable_models
+        """
+        Return dictionary event context field -> sorted list of UUIDs hex of objects permitted to user.
+        Fields without permitted objects are omitted. Result is cached until user role is granted or revoked
+        or object of loggable model is created or deleted.
+        """
+        from waldur_core.logging import utils
+
+        global_version, user_versions = utils.get_permissions_versions([user.pk])
+        key = 'logging:permitted_objects_uuids:%s:%s:%s:%s:%s' % (
+            user.pk, int(user.is_staff), int(user.is_support), global_version, user_versions[user.pk])
+        permitted_objects_uuids = cache.get(key)
+        if permitted_objects_uuids is None:
+            permitted_objects_uuids = self._get_permitted_objects_uuids(user)
+            cache.set(key, permitted_objects_uuids, self.PERMITTED_OBJECTS_UUIDS_CACHE_TIMEOUT)
+        return permitted_objects_uuids
+
+    def _get_permitted_objects_uuids(self, user):
+        from waldur_core.logging.utils import get_permission_loggable_models
         permitted_objects_uuids = {}
-        for model in get_loggable_models():
+        for model in get_permission_loggable_models():
             for field, uuids in model.get_permitted_objects_uuids(user).items():
-                permitted_objects_uuids[field] = [uuid_obj.hex for uuid_obj in uuids]
+                uuids = sorted({uuid_obj.hex for uuid_obj in uuids})
+                if uuids:
+                    permitted_objects_uuids[field] = uuids
         return permitted_objects_uuids
 
 
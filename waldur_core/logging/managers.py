@@ -1,9 +1,7 @@
 from django.contrib.contenttypes import models as ct_models
 from django.db import models
-from django.db.models import Q
 
 
-# XXX: This manager are very similar with quotas manager
 class AlertManager(models.Manager):
 
     def filtered_for_user(self, user, queryset=None):
@@ -13,15 +11,9 @@ class AlertManager(models.Manager):
             queryset = self.get_queryset()
         # XXX: This circular dependency will be removed then filter_queryset_for_user
         # will be moved to model manager method
-        from waldur_core.structure.managers import filter_queryset_for_user
+        from waldur_core.structure.managers import filter_scope_queryset_for_user
 
-        query = Q()
-        for model in utils.get_loggable_models():
-            user_object_ids = filter_queryset_for_user(model.objects.all(), user).values_list('id', flat=True)
-            content_type_id = ct_models.ContentType.objects.get_for_model(model).id
-            query |= Q(object_id__in=user_object_ids, content_type_id=content_type_id)
-
-        return queryset.filter(query)
+        return filter_scope_queryset_for_user(queryset, user, utils.get_loggable_models())
 
     def for_objects(self, qs):
         kwargs = dict(
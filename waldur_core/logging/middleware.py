@@ -4,6 +4,8 @@ import threading
 
 from django.utils.deprecation import MiddlewareMixin
 
+from waldur_core.logging import pipeline
+
 _locals = threading.local()
 
 
@@ -49,3 +51,14 @@ class CaptureEventContextMiddleware(MiddlewareMixin):
     def process_response(self, request, response):
         reset_event_context()
         return response
+
+
+class EventsPipelineMiddleware(MiddlewareMixin):
+    """ Emit events of request in batches. """
+
+    def process_request(self, request):
+        pipeline.start()
+
+    def process_response(self, request, response):
+        pipeline.finish()
+        return response
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+import waldur_core.core.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logging', '0002_immutable_default_json'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Event',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('uuid', waldur_core.core.fields.UUIDField()),
+                ('timestamp', models.DateTimeField(db_index=True)),
+                ('event_type', models.CharField(max_length=100)),
+                ('levelname', models.CharField(max_length=20)),
+                ('message', models.TextField()),
+                ('context', waldur_core.core.fields.JSONField(blank=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='EventTerm',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('value', models.CharField(max_length=255)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='terms', to='logging.Event', to_field='uuid')),
+            ],
+        ),
+        migrations.AlterIndexTogether(
+            name='eventterm',
+            index_together=set([('name', 'value')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='event',
+            index_together=set([('event_type', 'timestamp')]),
+        ),
+    ]
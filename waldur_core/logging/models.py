@@ -14,11 +14,10 @@ from django.template.loader import render_to_string
 from django.utils import timezone
 from django.utils.lru_cache import lru_cache
 from model_utils.models import TimeStampedModel
-import requests
 
 from waldur_core.core.fields import JSONField, UUIDField
 from waldur_core.core.utils import timestamp_to_datetime
-from waldur_core.logging import managers
+from waldur_core.logging import delivery, managers
 
 logger = logging.getLogger(__name__)
 
@@ -169,16 +168,25 @@ class WebHook(BaseHook):
         default=ContentTypeChoices.JSON
     )
 
-    def process(self, event):
-        logger.debug('Submitting web hook to URL %s, payload: %s', self.destination_url, event)
+    def get_deliveries(self, events):
+        """ Return HTTP requests for events. JSON encoded events are sent with one request if batching is enabled. """
+        verify = settings.VERIFY_WEBHOOK_REQUESTS
+        logger.debug('Submitting web hook to URL %s, payload: %s', self.destination_url, events)
 
         # encode event as JSON
         if self.content_type == WebHook.ContentTypeChoices.JSON:
-            requests.post(self.destination_url, json=event, verify=settings.VERIFY_WEBHOOK_REQUESTS)
+            if delivery.get_delivery_settings()['BATCH_EVENTS']:
+                return [delivery.Delivery(self.destination_url, dict(json=events, verify=verify))]
+            return [delivery.Delivery(self.destination_url, dict(json=event, verify=verify)) for event in events]
 
         # encode event as form
         elif self.content_type == WebHook.ContentTypeChoices.FORM:
-            requests.post(self.destination_url, data=event, verify=settings.VERIFY_WEBHOOK_REQUESTS)
+            return [delivery.Delivery(self.destination_url, dict(data=event, verify=verify)) for event in events]
+
+        return []
+
+    def process(self, event):
+        delivery.get_engine().send(self.get_deliveries([event]))
 
 
 class PushHook(BaseHook):
@@ -197,8 +205,8 @@ class PushHook(BaseHook):
     device_model = models.CharField(max_length=255, null=True, blank=True)
     token = models.CharField(max_length=255, null=True, unique=True)
 
-    def process(self, event):
-        """ Send events as push notification via Google Cloud Messaging.
+    def get_deliveries(self, events):
+        """ Return requests that send events as push notifications via Google Cloud Messaging.
             Expected settings as follows:
 
                 # https://developers.google.com/mobile/add
@@ -217,13 +225,17 @@ class PushHook(BaseHook):
         keys = conf.get(dict(self.Type.CHOICES)[self.type])
 
         if not keys or not self.token:
-            return
+            return []
 
         endpoint = 'https://gcm-http.googleapis.com/gcm/send'
         headers = {
             'Content-Type': 'application/json',
             'Authorization': 'key=%s' % keys['server_key'],
         }
+        return [delivery.Delivery(endpoint, dict(json=self.get_payload(event, conf), headers=headers))
+                for event in events]
+
+    def get_payload(self, event, conf):
         payload = {
             'to': self.token,
             'notification': {
@@ -237,8 +249,11 @@ class PushHook(BaseHook):
         }
         if self.type == self.Type.IOS:
             payload['content-available'] = '1'
-        logger.debug('Submitting GCM push notification with headers %s, payload: %s' % (headers, payload))
-        requests.post(endpoint, json=payload, headers=headers)
+        logger.debug('Submitting GCM push notification, payload: %s' % payload)
+        return payload
+
+    def process(self, event):
+        delivery.get_engine().send(self.get_deliveries([event]))
 
 
 class EmailHook(BaseHook):
@@ -260,3 +275,29 @@ class EmailHook(BaseHook):
 
 class SystemNotification(EventTypesMixin, models.Model):
     hook_content_type = models.OneToOneField(ct_models.ContentType, related_name='+')
+
+
+class Event(UuidMixin):
+    """ Event stored by database event store. Context contains event document as it is sent to log server. """
+
+    class Meta:
+        index_together = (('event_type', 'timestamp'),)
+
+    timestamp = models.DateTimeField(db_index=True)
+    event_type = models.CharField(max_length=100)
+    levelname = models.CharField(max_length=20)
+    message = models.TextField()
+    context = JSONField(blank=True)
+
+
+class EventTerm(models.Model):
+    """ Scalar value of event context field, for example customer_uuid, that is used to filter events. """
+
+    class Meta:
+        index_together = (('name', 'value'),)
+
+    MAX_VALUE_LENGTH = 255
+
+    event = models.ForeignKey(Event, to_field='uuid', related_name='terms', on_delete=models.CASCADE)
+    name = models.CharField(max_length=100)
+    value = models.CharField(max_length=MAX_VALUE_LENGTH)
@@ -0,0 +1,85 @@
+from __future__ import unicode_literals
+
+import base64
+import json
+
+from django.core.paginator import EmptyPage, Page
+from django.utils.encoding import force_bytes, force_text
+from django.utils.translation import ugettext_lazy as _
+from rest_framework.exceptions import NotFound
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from waldur_core.core.pagination import ApproximateCountPaginator, LinkHeaderPagination
+
+
+class ElasticsearchPaginator(ApproximateCountPaginator):
+    """ Paginator that gets events of page and their total count with one search request. """
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        events = self.object_list[bottom:bottom + self.per_page]
+        total = getattr(self.object_list, 'total', None)
+        if total is not None:
+            self.count = total
+        if number > 1 and number > self.num_pages:
+            raise EmptyPage(_('That page contains no results'))
+        return Page(events, number, self)
+
+
+class SearchAfterPagination(object):
+    """ Cursor pagination of events by sort values of the last event of previous page. """
+    invalid_cursor_message = _('Invalid cursor')
+
+    def __init__(self, page_size, cursor_query_param, page_query_param):
+        self.page_size = page_size
+        self.cursor_query_param = cursor_query_param
+        self.page_query_param = page_query_param
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = remove_query_param(request.build_absolute_uri(), self.page_query_param)
+        search_after = self.decode_cursor(request.query_params[self.cursor_query_param])
+        result = queryset.get_page_after(search_after, self.page_size)
+        self.total = result['total']
+        self.next_position = result['next']
+        return result['events']
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    def get_previous_link(self):
+        return None
+
+    def encode_cursor(self, position):
+        return force_text(base64.urlsafe_b64encode(force_bytes(json.dumps(position))))
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None
+        try:
+            position = json.loads(force_text(base64.urlsafe_b64decode(force_bytes(cursor))))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list):
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+
+class EventPagination(LinkHeaderPagination):
+    """ Events are paginated by page number with one search request per page.
+        If request contains cursor query parameter, events are paginated using search_after.
+    """
+    django_paginator_class = ElasticsearchPaginator
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param not in request.query_params:
+            return super(EventPagination, self).paginate_queryset(queryset, request, view)
+
+        self.request = request
+        page_size = self.get_page_size(request)
+        self.keyset_pagination = SearchAfterPagination(page_size, self.cursor_query_param, self.page_query_param)
+        events = self.keyset_pagination.paginate_queryset(queryset, request, view)
+        self.count = self.keyset_pagination.total
+        return events
@@ -0,0 +1,126 @@
+""" Buffered emission of events.
+
+Events are emitted only after transaction commit, so events of rolled back changes are not emitted.
+Inside pipeline block committed events are collected and emitted in batches when block is finished,
+when buffer is full or when the oldest buffered event waits for too long. Log handlers inherited from
+BatchHandlerMixin receive records of batch together, for example HookHandler sends one task per batch
+instead of one task per event. Pipeline block is enabled for API requests and background tasks.
+
+Usage example:
+    with events_pipeline():
+        for user in users:
+            event_logger.user.info(...)
+"""
+from __future__ import unicode_literals
+
+from collections import namedtuple, OrderedDict
+import contextlib
+import threading
+import time
+
+from django.db import transaction
+
+from waldur_core.core.utils import chunked
+
+_locals = threading.local()
+
+Event = namedtuple('Event', ('logger', 'level', 'message', 'extra'))
+
+# Maximum count of records passed to log handler together.
+MAX_BATCH_SIZE = 100
+
+
+class EventsBuffer(object):
+    MAX_QUEUE_SIZE = 1000
+    MAX_LATENCY = 5  # seconds
+
+    def __init__(self):
+        self.events = []
+
+    def add(self, event):
+        self.events.append(event)
+        if len(self.events) >= self.MAX_QUEUE_SIZE or \
+                time.time() - self.events[0].extra['event_timestamp'] >= self.MAX_LATENCY:
+            self.flush()
+
+    def flush(self):
+        events, self.events = self.events, []
+        emit_events(events)
+
+
+def get_buffer():
+    return getattr(_locals, 'buffer', None)
+
+
+def start():
+    """ Start pipeline block. Nested blocks use buffer of outer block. """
+    if get_buffer() is None:
+        _locals.buffer = EventsBuffer()
+        _locals.depth = 0
+    _locals.depth += 1
+
+
+def finish():
+    """ Finish pipeline block and emit collected events if it is the outermost one. """
+    buffer = get_buffer()
+    if buffer is None:
+        return
+    _locals.depth -= 1
+    if _locals.depth > 0:
+        return
+    del _locals.buffer
+    buffer.flush()
+
+
+def reset():
+    """ Emit events of unfinished block and drop it, for example if previous background task was killed. """
+    if get_buffer() is not None:
+        _locals.depth = 1
+        finish()
+
+
+@contextlib.contextmanager
+def events_pipeline():
+    start()
+    try:
+        yield
+    finally:
+        finish()
+
+
+def add_event(logger, level, message, extra):
+    """ Emit event after transaction commit, event is buffered if pipeline block is active. """
+    extra = dict(extra, event_timestamp=time.time())
+    event = Event(logger, level, message, extra)
+
+    def add():
+        buffer = get_buffer()
+        if buffer is None:
+            emit_events([event])
+        else:
+            buffer.add(event)
+
+    transaction.on_commit(add)
+
+
+def emit_events(events):
+    for batch in chunked(events, MAX_BATCH_SIZE):
+        # handler -> list of records
+        _locals.batches = OrderedDict()
+        try:
+            for event in batch:
+                getattr(event.logger, event.level)(event.message, extra=event.extra)
+            batches = _locals.batches
+        finally:
+            del _locals.batches
+        for handler, records in batches.items():
+            handler.emit_batch(records)
+
+
+def add_to_batch(handler, record):
+    """ Collect record for handler if batch of events is emitted. Return False if record is not collected. """
+    batches = getattr(_locals, 'batches', None)
+    if batches is None:
+        return False
+    batches.setdefault(handler, []).append(record)
+    return True
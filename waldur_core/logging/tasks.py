@@ -1,30 +1,91 @@
+from collections import defaultdict, OrderedDict
 import logging
 
 from celery import shared_task
 from django.conf import settings
+from django.contrib.auth import get_user_model
 from django.utils import timezone
+import six
 
+from waldur_core.logging import delivery, utils
 from waldur_core.logging.loggers import alert_logger, event_logger
 from waldur_core.logging.models import BaseHook, Alert, AlertThresholdMixin
 
 logger = logging.getLogger(__name__)
 
 
+class HooksIndex(object):
+    """ Reverse index: (event context field, object UUID hex) -> ids of users permitted to see object. """
+
+    def __init__(self, users):
+        self.users_ids = defaultdict(set)
+        for user in users:
+            for field, uuids in event_logger.get_permitted_objects_uuids(user).items():
+                for uuid in uuids:
+                    self.users_ids[(field, uuid)].add(user.pk)
+
+    def get_users_ids(self, event):
+        """ Return ids of users permitted to see event. """
+        users_ids = set()
+        for field, value in event['context'].items():
+            if isinstance(value, six.string_types):
+                users_ids.update(self.users_ids.get((field, value), ()))
+        return users_ids
+
+
+# Index is kept in memory of worker process until permissions of hooks users are changed.
+_hooks_index = {}
+
+
+def get_hooks_index(users):
+    global_version, user_versions = utils.get_permissions_versions([user.pk for user in users])
+    key = (global_version, frozenset((user.pk, user.is_staff, user.is_support, user_versions[user.pk])
+                                     for user in users))
+    if _hooks_index.get('key') != key:
+        _hooks_index['index'] = HooksIndex(users)
+        _hooks_index['key'] = key
+    return _hooks_index['index']
+
+
 @shared_task(name='waldur_core.logging.process_event')
 def process_event(event):
-    for hook in BaseHook.get_active_hooks():
-        if check_event(event, hook):
-            hook.process(event)
-
-
-def check_event(event, hook):
-    # Check that event matches with hook
-    if event['type'] not in hook.all_event_types:
-        return False
-    for key, uuids in event_logger.get_permitted_objects_uuids(hook.user).items():
-        if key in event['context'] and event['context'][key] in uuids:
-            return True
-    return False
+    process_events([event])
+
+
+@shared_task(name='waldur_core.logging.process_events_batch')
+def process_events_batch(events):
+    process_events(events)
+
+
+def process_events(events):
+    hooks = BaseHook.get_active_hooks()
+    if not hooks:
+        return
+    users = list(get_user_model().objects.filter(id__in={hook.user_id for hook in hooks}))
+    index = get_hooks_index(users)
+    hooks_event_types = {hook: hook.all_event_types for hook in hooks}
+    hooks_events = OrderedDict((hook, []) for hook in hooks)
+    for event in events:
+        permitted_users_ids = index.get_users_ids(event)
+        for hook in hooks:
+            if hook.user_id in permitted_users_ids and event['type'] in hooks_event_types[hook]:
+                hooks_events[hook].append(event)
+
+    # HTTP requests of all hooks are sent together by delivery engine, other hooks process events one by one.
+    deliveries = []
+    for hook, hook_events in hooks_events.items():
+        if not hook_events:
+            continue
+        if hasattr(hook, 'get_deliveries'):
+            deliveries.extend(hook.get_deliveries(hook_events))
+        else:
+            for event in hook_events:
+                hook.process(event)
+    if deliveries:
+        engine = delivery.get_engine()
+        failed = engine.send(deliveries)
+        logger.debug('%s of %s hook requests have failed, delivery metrics: %s',
+                     failed, len(deliveries), engine.metrics.as_dict())
 
 
 @shared_task(name='waldur_core.logging.close_alerts_without_scope')
@@ -2,6 +2,7 @@ from datetime import timedelta
 
 from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
 from django.db import IntegrityError
 from django.utils import timezone
 from rest_framework import test, status
@@ -135,6 +136,49 @@ class AlertsListTest(test.APITransactionTestCase):
         self.assertNotIn(alert2.uuid.hex, [a['uuid'] for a in response.data])
 
 
+class AlertsPaginationTest(test.APITransactionTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.customer = structure_factories.CustomerFactory()
+        self.owner = structure_factories.UserFactory()
+        self.customer.add_user(self.owner, structure_models.CustomerRole.OWNER)
+        self.alerts = [factories.AlertFactory(scope=self.customer, alert_type='type_%s' % index) for index in range(5)]
+        for index, alert in enumerate(self.alerts):
+            models.Alert.objects.filter(pk=alert.pk).update(created=timezone.now() - timedelta(minutes=index))
+        self.client.force_authenticate(self.owner)
+
+    def get_links(self, response):
+        links = {}
+        for link in response['Link'].split(', '):
+            url, rel = link.split('; ')
+            links[rel[5:-1]] = url[1:-1]
+        return links
+
+    def test_alerts_are_paginated_by_cursor(self):
+        response = self.client.get(factories.AlertFactory.get_list_url(), {'cursor': '', 'page_size': 2})
+        uuids = [alert['uuid'] for alert in response.data]
+        links = self.get_links(response)
+        while 'next' in links:
+            response = self.client.get(links['next'])
+            uuids.extend(alert['uuid'] for alert in response.data)
+            links = self.get_links(response)
+
+        self.assertEqual(uuids, [alert.uuid.hex for alert in self.alerts])
+        self.assertNotIn('last', links)
+        self.assertEqual(response['X-Result-Count'], '5')
+
+    def test_count_is_cached(self):
+        url = factories.AlertFactory.get_list_url()
+        self.client.get(url)
+        factories.AlertFactory(scope=self.customer, alert_type='type_5')
+
+        response = self.client.get(url)
+
+        self.assertEqual(response['X-Result-Count'], '5')
+        self.assertEqual(len(response.data), 6)
+
+
 class AlertsCreateUpdateDeleteTest(test.APITransactionTestCase):
 
     def setUp(self):
@@ -0,0 +1,108 @@
+import threading
+import time
+
+from django.test import TestCase
+import requests
+from six.moves import mock
+
+from waldur_core.core.tests.helpers import override_waldur_core_settings
+from waldur_core.logging import delivery, models
+from waldur_core.structure.tests import factories as structure_factories
+
+
+def make_response(status_code):
+    response = requests.Response()
+    response.status_code = status_code
+    return response
+
+
+@mock.patch('requests.Session.post')
+class DeliveryEngineTest(TestCase):
+
+    def setUp(self):
+        self.engine = delivery.DeliveryEngine(max_workers=4, max_connections_per_host=2, retries=2, backoff=0)
+        self.delivery = delivery.Delivery('http://example.com/', {'json': {'type': 'test'}})
+
+    def test_request_is_sent_with_timeout(self, mocked_post):
+        mocked_post.return_value = make_response(200)
+
+        failed = self.engine.send([self.delivery])
+
+        self.assertEqual(failed, 0)
+        mocked_post.assert_called_once_with('http://example.com/', json={'type': 'test'}, timeout=self.engine.timeout)
+        self.assertEqual(self.engine.metrics.as_dict()['delivered'], 1)
+
+    def test_request_is_retried_on_server_error(self, mocked_post):
+        mocked_post.side_effect = [make_response(503), make_response(200)]
+
+        failed = self.engine.send([self.delivery])
+
+        self.assertEqual(failed, 0)
+        self.assertEqual(mocked_post.call_count, 2)
+        self.assertEqual(self.engine.metrics.as_dict()['retried'], 1)
+
+    def test_request_is_retried_on_connection_error(self, mocked_post):
+        mocked_post.side_effect = requests.ConnectionError()
+
+        failed = self.engine.send([self.delivery])
+
+        self.assertEqual(failed, 1)
+        self.assertEqual(mocked_post.call_count, self.engine.retries + 1)
+        self.assertEqual(self.engine.metrics.as_dict()['failed'], 1)
+
+    def test_request_is_not_retried_on_client_error(self, mocked_post):
+        mocked_post.return_value = make_response(404)
+
+        failed = self.engine.send([self.delivery])
+
+        self.assertEqual(failed, 1)
+        self.assertEqual(mocked_post.call_count, 1)
+
+    def test_concurrent_requests_to_one_host_are_limited(self, mocked_post):
+        lock = threading.Lock()
+        state = {'active': 0, 'max_active': 0}
+
+        def post(*args, **kwargs):
+            with lock:
+                state['active'] += 1
+                state['max_active'] = max(state['max_active'], state['active'])
+            time.sleep(0.01)
+            with lock:
+                state['active'] -= 1
+            return make_response(200)
+
+        mocked_post.side_effect = post
+
+        failed = self.engine.send([self.delivery] * 8)
+
+        self.assertEqual(failed, 0)
+        self.assertEqual(mocked_post.call_count, 8)
+        self.assertEqual(state['max_active'], self.engine.max_connections_per_host)
+
+
+class WebHookDeliveriesTest(TestCase):
+
+    def setUp(self):
+        self.hook = models.WebHook.objects.create(
+            user=structure_factories.UserFactory(), destination_url='http://example.com/')
+        self.events = [{'type': 'first'}, {'type': 'second'}]
+
+    def test_request_is_created_for_each_event(self):
+        deliveries = self.hook.get_deliveries(self.events)
+
+        self.assertEqual([d.kwargs['json'] for d in deliveries], self.events)
+
+    @override_waldur_core_settings(WEBHOOK_DELIVERY={'BATCH_EVENTS': True})
+    def test_json_events_are_sent_with_one_request_if_batching_is_enabled(self):
+        deliveries = self.hook.get_deliveries(self.events)
+
+        self.assertEqual(len(deliveries), 1)
+        self.assertEqual(deliveries[0].kwargs['json'], self.events)
+
+    @override_waldur_core_settings(WEBHOOK_DELIVERY={'BATCH_EVENTS': True})
+    def test_form_events_are_not_batched(self):
+        self.hook.content_type = models.WebHook.ContentTypeChoices.FORM
+
+        deliveries = self.hook.get_deliveries(self.events)
+
+        self.assertEqual([d.kwargs['data'] for d in deliveries], self.events)
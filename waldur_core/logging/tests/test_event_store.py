@@ -0,0 +1,116 @@
+import datetime
+import logging
+
+from django.test import TestCase
+from django.utils import timezone
+
+from waldur_core.logging import models
+from waldur_core.logging.event_store import DatabaseEventStore
+from waldur_core.logging.log import DatabaseEventHandler
+
+
+class DatabaseEventStoreTest(TestCase):
+
+    def setUp(self):
+        self.handler = DatabaseEventHandler()
+        self.store = DatabaseEventStore()
+
+    def emit(self, event_type='resource_creation_succeeded', message='Resource has been created.',
+             timestamp=None, **context):
+        record = logging.makeLogRecord({
+            'name': 'waldur_core.test',
+            'levelname': 'INFO',
+            'levelno': logging.INFO,
+            'msg': message,
+            'event_type': event_type,
+            'event_context': context,
+        })
+        if timestamp is not None:
+            record.event_timestamp = (timestamp - datetime.datetime(1970, 1, 1, tzinfo=timezone.utc)).total_seconds()
+        self.handler.emit_batch([record])
+
+    def test_handler_stores_event_document_and_terms(self):
+        self.emit(customer_uuid='abc', project_uuid=['p1', 'p2'])
+
+        event = models.Event.objects.get()
+        self.assertEqual(event.event_type, 'resource_creation_succeeded')
+        self.assertEqual(event.context['customer_uuid'], 'abc')
+        self.assertEqual(event.context['message'], 'Resource has been created.')
+        self.assertEqual(
+            sorted(event.terms.values_list('name', 'value')),
+            [('customer_uuid', 'abc'), ('project_uuid', 'p1'), ('project_uuid', 'p2')])
+
+    def test_events_are_filtered_by_terms(self):
+        self.emit(customer_uuid='abc')
+        self.emit(customer_uuid='def')
+        self.emit(event_type='user_creation_succeeded', customer_uuid='abc')
+
+        self.store.prepare_search_body(
+            must_terms={'customer_uuid.keyword': ['abc'], 'event_type': ['resource_creation_succeeded']})
+
+        self.assertEqual(self.store.get_count(), 1)
+
+    def test_should_terms_match_any_term(self):
+        self.emit(customer_uuid='abc')
+        self.emit(project_uuid='p1')
+        self.emit(user_uuid='u1')
+
+        self.store.prepare_search_body(should_terms={'customer_uuid': ['abc'], 'project_uuid': ['p1']})
+
+        self.assertEqual(self.store.get_count(), 2)
+
+    def test_must_not_terms_exclude_events(self):
+        self.emit(customer_uuid='abc')
+        self.emit(customer_uuid='def')
+
+        self.store.prepare_search_body(must_not_terms={'customer_uuid': ['abc']})
+
+        events = self.store.get_events()['events']
+        self.assertEqual([event['customer_uuid'] for event in events], ['def'])
+
+    def test_events_are_searched_by_message_and_fts_fields(self):
+        self.emit(message='Virtual machine has been created.')
+        self.emit(project_name='Big machine')
+        self.emit(message='Other event.')
+
+        self.store.prepare_search_body(search_text='machine')
+
+        self.assertEqual(self.store.get_count(), 2)
+
+    def test_events_are_sorted_by_timestamp(self):
+        now = timezone.now()
+        self.emit(message='Old', timestamp=now - datetime.timedelta(hours=1))
+        self.emit(message='New', timestamp=now)
+
+        result = self.store.get_events(sort='-@timestamp', from_=0, size=1)
+
+        self.assertEqual(result['total'], 2)
+        self.assertEqual([event['message'] for event in result['events']], ['New'])
+
+    def test_events_are_paginated_by_search_after(self):
+        now = timezone.now()
+        for index in range(5):
+            self.emit(message='Event %s' % index, timestamp=now - datetime.timedelta(minutes=index))
+
+        first_page = self.store.get_events_after(size=2)
+        second_page = self.store.get_events_after(search_after=first_page['next'], size=2)
+        last_page = self.store.get_events_after(search_after=second_page['next'], size=2)
+
+        messages = [event['message'] for page in (first_page, second_page, last_page) for event in page['events']]
+        self.assertEqual(messages, ['Event %s' % index for index in range(5)])
+        self.assertIsNone(last_page['next'])
+
+    def test_events_are_counted_by_timestamp_ranges_with_one_query(self):
+        now = timezone.now()
+        self.emit(timestamp=now - datetime.timedelta(hours=3))
+        self.emit(timestamp=now - datetime.timedelta(minutes=30))
+        self.emit(timestamp=now - datetime.timedelta(minutes=10))
+        ranges = [
+            {'start': now - datetime.timedelta(hours=1), 'end': now},
+            {'end': now - datetime.timedelta(hours=1)},
+        ]
+
+        with self.assertNumQueries(1):
+            result = self.store.get_aggregated_by_timestamp_count(ranges)
+
+        self.assertEqual([item['count'] for item in result], [2, 1])
@@ -10,7 +10,7 @@ from waldur_core.structure import models as structure_models
 from waldur_core.structure.tests import factories as structure_factories
 
 from . import factories
-from .. import utils
+from .. import elasticsearch_client, utils
 from ..loggers import EventLogger, event_logger
 
 
@@ -29,6 +29,7 @@ def override_elasticsearch_settings(**kwargs):
 @override_elasticsearch_settings()
 class BaseEventsApiTest(test.APITransactionTestCase):
     def setUp(self):
+        elasticsearch_client.clear_clients()
         self.es_patcher = mock.patch('waldur_core.logging.elasticsearch_client.Elasticsearch')
         self.mocked_es = self.es_patcher.start()
         self.mocked_es().search.return_value = {'hits': {'total': 0, 'hits': []}}
@@ -225,3 +226,58 @@ class ScopeTest(BaseEventsApiTest):
         self.client.force_authenticate(user=owner)
         self._get_events_by_scope(structure_factories.CustomerFactory.get_url(customer))
         self.assertEqual(self.must_terms, {'customer_uuid.keyword': [customer.uuid.hex]})
+
+
+class EventPaginationTest(BaseEventsApiTest):
+
+    def setUp(self):
+        super(EventPaginationTest, self).setUp()
+        self.client.force_authenticate(user=structure_factories.UserFactory(is_staff=True))
+        self.url = factories.EventFactory.get_list_url()
+
+    def set_hits(self, total, sort_values):
+        hits = [{'_source': {'message': 'event'}, 'sort': sort} for sort in sort_values]
+        self.mocked_es().search.return_value = {'hits': {'total': total, 'hits': hits}}
+
+    def test_page_and_total_are_fetched_with_one_request(self):
+        self.set_hits(25, [[i] for i in range(10)])
+
+        response = self.client.get(self.url, {'page': 2})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['X-Result-Count'], '25')
+        self.assertEqual(self.mocked_es().search.call_count, 1)
+        self.assertEqual(self.mocked_es().search.call_args[-1]['from_'], 10)
+        self.assertFalse(self.mocked_es().count.called)
+
+    def test_client_is_reused_between_requests(self):
+        calls_count = self.mocked_es.call_count
+
+        self.client.get(self.url)
+        self.client.get(self.url)
+
+        self.assertEqual(self.mocked_es.call_count, calls_count + 1)
+
+    def test_next_page_is_fetched_using_search_after(self):
+        self.set_hits(25, [[1000 + i, 'event#%s' % i] for i in range(10)])
+
+        response = self.client.get(self.url, {'cursor': ''})
+        next_link = [link for link in response['Link'].split(', ') if link.endswith('rel="next"')][0]
+        self.client.get(next_link[1:next_link.index('>')])
+
+        body = self.mocked_es().search.call_args[-1]['body']
+        self.assertEqual(body['search_after'], [1009, 'event#9'])
+        self.assertEqual(body['sort'], [{'@timestamp': 'desc'}, {'_uid': 'desc'}])
+        self.assertEqual(response['X-Result-Count'], '25')
+
+    def test_next_link_is_not_provided_for_the_last_page(self):
+        self.set_hits(5, [[i] for i in range(5)])
+
+        response = self.client.get(self.url, {'cursor': ''})
+
+        self.assertNotIn('rel="next"', response['Link'])
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(self.url, {'cursor': 'invalid'})
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
@@ -8,7 +8,7 @@ from six.moves import mock
 
 from waldur_core.logging import models as logging_models
 from waldur_core.logging.log import HookHandler
-from waldur_core.logging.tasks import process_event
+from waldur_core.logging.tasks import process_event, process_events_batch
 from waldur_core.structure import models as structure_models
 from waldur_core.structure.log import event_logger
 from waldur_core.structure.tests import factories as structure_factories
@@ -79,7 +79,7 @@ class TestHookService(test.APITransactionTestCase):
         # Verify that destination address of message is correct
         self.assertEqual(mail.outbox[0].to, [email_hook.email])
 
-    @mock.patch('requests.post')
+    @mock.patch('requests.Session.post')
     def test_webhook_makes_post_request_against_destination_url(self, requests_post):
 
         # Create web hook for customer owner
@@ -92,7 +92,17 @@ class TestHookService(test.APITransactionTestCase):
 
         # Event is captured and POST request is triggered because event_type and user_uuid match
         requests_post.assert_called_once_with(
-            self.web_hook.destination_url, json=mock.ANY, verify=settings.VERIFY_WEBHOOK_REQUESTS)
+            self.web_hook.destination_url, json=mock.ANY, verify=settings.VERIFY_WEBHOOK_REQUESTS, timeout=mock.ANY)
+
+    @mock.patch('waldur_core.logging.delivery.DeliveryEngine.send')
+    def test_webhook_requests_of_events_batch_are_sent_together(self, mocked_send):
+        logging_models.WebHook.objects.create(user=self.owner, destination_url='http://example.com/',
+                                              event_types=[self.event_type])
+
+        process_events_batch([self.event, self.event])
+
+        mocked_send.assert_called_once_with(mock.ANY)
+        self.assertEqual(len(mocked_send.call_args[0][0]), 2)
 
     def test_email_hook_processor_can_be_called_twice(self):
         # Create email hook for customer owner
@@ -103,3 +113,24 @@ class TestHookService(test.APITransactionTestCase):
         # If event is not mutated, exception is not raised, see also SENTRY-1396
         email_hook.process(self.event)
         email_hook.process(self.event)
+
+    def test_hooks_index_is_reused_for_next_events(self):
+        logging_models.EmailHook.objects.create(user=self.owner, email=self.owner.email,
+                                                event_types=[self.event_type])
+        process_event(self.event)
+
+        with mock.patch('waldur_core.logging.tasks.HooksIndex') as mocked_index:
+            process_event(self.event)
+
+        self.assertFalse(mocked_index.called)
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_hooks_index_is_rebuilt_when_role_of_hook_user_is_granted(self):
+        process_event(self.event)
+        self.assertEqual(len(mail.outbox), 0)
+
+        self.customer.add_user(self.other_user, structure_models.CustomerRole.OWNER)
+        process_event(self.event)
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, [self.other_hook.email])
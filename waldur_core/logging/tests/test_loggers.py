@@ -0,0 +1,87 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from waldur_core.logging.loggers import event_logger
+from waldur_core.structure import models as structure_models
+from waldur_core.structure.tests import factories as structure_factories, fixtures as structure_fixtures
+
+
+class PermittedObjectsUuidsTest(TestCase):
+
+    def setUp(self):
+        self.fixture = structure_fixtures.ProjectFixture()
+        self.project = self.fixture.project
+        self.owner = self.fixture.owner
+
+    def test_uuids_are_returned_as_sorted_hex_lists(self):
+        other_project = structure_factories.ProjectFactory(customer=self.fixture.customer)
+
+        permitted = event_logger.get_permitted_objects_uuids(self.owner)
+
+        self.assertEqual(permitted['customer_uuid'], [self.fixture.customer.uuid.hex])
+        self.assertEqual(permitted['project_uuid'], sorted([self.project.uuid.hex, other_project.uuid.hex]))
+        self.assertEqual(permitted['user_uuid'], [self.owner.uuid.hex])
+
+    def test_fields_without_permitted_objects_are_omitted(self):
+        user = structure_factories.UserFactory()
+
+        self.assertEqual(event_logger.get_permitted_objects_uuids(user), {'user_uuid': [user.uuid.hex]})
+
+    def test_permitted_uuids_are_cached(self):
+        event_logger.get_permitted_objects_uuids(self.owner)
+
+        with CaptureQueriesContext(connection) as context:
+            event_logger.get_permitted_objects_uuids(self.owner)
+
+        self.assertEqual(len(context.captured_queries), 0)
+
+    def test_cache_is_invalidated_when_role_is_granted(self):
+        user = structure_factories.UserFactory()
+        event_logger.get_permitted_objects_uuids(user)
+
+        self.project.add_user(user, structure_models.ProjectRole.ADMINISTRATOR)
+
+        permitted = event_logger.get_permitted_objects_uuids(user)
+        self.assertEqual(permitted['project_uuid'], [self.project.uuid.hex])
+
+    def test_cache_is_invalidated_when_role_is_revoked(self):
+        admin = self.fixture.admin
+        event_logger.get_permitted_objects_uuids(admin)
+
+        self.project.remove_user(admin)
+
+        self.assertNotIn('project_uuid', event_logger.get_permitted_objects_uuids(admin))
+
+    def test_cache_is_invalidated_when_scope_is_created(self):
+        event_logger.get_permitted_objects_uuids(self.owner)
+
+        new_project = structure_factories.ProjectFactory(customer=self.fixture.customer)
+
+        permitted = event_logger.get_permitted_objects_uuids(self.owner)
+        self.assertIn(new_project.uuid.hex, permitted['project_uuid'])
+
+    def test_cache_is_invalidated_when_scope_is_deleted(self):
+        event_logger.get_permitted_objects_uuids(self.owner)
+
+        self.project.delete()
+
+        self.assertNotIn('project_uuid', event_logger.get_permitted_objects_uuids(self.owner))
+
+    def test_cache_of_users_of_other_customer_is_not_invalidated_when_scope_is_created(self):
+        other_fixture = structure_fixtures.ProjectFixture()
+        event_logger.get_permitted_objects_uuids(other_fixture.owner)
+
+        structure_factories.ProjectFactory(customer=self.fixture.customer)
+
+        with CaptureQueriesContext(connection) as context:
+            event_logger.get_permitted_objects_uuids(other_fixture.owner)
+        self.assertEqual(len(context.captured_queries), 0)
+
+    def test_cache_of_staff_is_invalidated_when_scope_is_created(self):
+        staff = self.fixture.staff
+        event_logger.get_permitted_objects_uuids(staff)
+
+        new_project = structure_factories.ProjectFactory()
+
+        self.assertIn(new_project.uuid.hex, event_logger.get_permitted_objects_uuids(staff)['project_uuid'])
@@ -0,0 +1,115 @@
+import logging
+
+from django.db import transaction
+from django.test import TransactionTestCase
+from six.moves import mock
+
+from waldur_core.logging import pipeline
+from waldur_core.logging.log import BatchHandlerMixin, HookHandler
+
+
+class RecordingHandler(BatchHandlerMixin, logging.Handler):
+    def __init__(self):
+        super(RecordingHandler, self).__init__()
+        self.batches = []
+
+    def emit_batch(self, records):
+        self.batches.append([record.getMessage() for record in records])
+
+
+class EventsPipelineTest(TransactionTestCase):
+
+    def setUp(self):
+        self.logger = logging.getLogger('waldur_core.logging.tests.pipeline')
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        self.handler = RecordingHandler()
+        self.logger.addHandler(self.handler)
+
+    def tearDown(self):
+        self.logger.removeHandler(self.handler)
+        pipeline.reset()
+
+    def add_event(self, message):
+        pipeline.add_event(self.logger, 'info', message, extra={'event_type': 'test', 'event_context': {}})
+
+    def test_event_is_emitted_right_away_outside_of_pipeline_block(self):
+        self.add_event('first')
+
+        self.assertEqual(self.handler.batches, [['first']])
+
+    def test_events_are_emitted_in_one_batch_when_pipeline_block_is_finished(self):
+        with pipeline.events_pipeline():
+            self.add_event('first')
+            self.add_event('second')
+            self.assertEqual(self.handler.batches, [])
+
+        self.assertEqual(self.handler.batches, [['first', 'second']])
+
+    def test_nested_block_does_not_emit_events(self):
+        with pipeline.events_pipeline():
+            with pipeline.events_pipeline():
+                self.add_event('first')
+            self.assertEqual(self.handler.batches, [])
+
+        self.assertEqual(self.handler.batches, [['first']])
+
+    def test_events_are_emitted_after_transaction_commit(self):
+        with transaction.atomic():
+            self.add_event('first')
+            self.assertEqual(self.handler.batches, [])
+
+        self.assertEqual(self.handler.batches, [['first']])
+
+    def test_events_of_rolled_back_transaction_are_not_emitted(self):
+        with pipeline.events_pipeline():
+            try:
+                with transaction.atomic():
+                    self.add_event('first')
+                    raise ValueError()
+            except ValueError:
+                pass
+            self.add_event('second')
+
+        self.assertEqual(self.handler.batches, [['second']])
+
+    @mock.patch('waldur_core.logging.pipeline.EventsBuffer.MAX_QUEUE_SIZE', 2)
+    def test_buffer_is_flushed_when_it_is_full(self):
+        with pipeline.events_pipeline():
+            for message in ('first', 'second', 'third'):
+                self.add_event(message)
+            self.assertEqual(self.handler.batches, [['first', 'second']])
+
+        self.assertEqual(self.handler.batches, [['first', 'second'], ['third']])
+
+    @mock.patch('waldur_core.logging.pipeline.time')
+    def test_buffer_is_flushed_when_oldest_event_waits_too_long(self, mocked_time):
+        mocked_time.time.return_value = 100
+        with pipeline.events_pipeline():
+            self.add_event('first')
+            mocked_time.time.return_value = 100 + pipeline.EventsBuffer.MAX_LATENCY
+            self.add_event('second')
+            self.assertEqual(self.handler.batches, [['first', 'second']])
+
+    @mock.patch('waldur_core.logging.pipeline.MAX_BATCH_SIZE', 2)
+    def test_handler_receives_batches_of_limited_size(self):
+        with pipeline.events_pipeline():
+            for message in ('first', 'second', 'third'):
+                self.add_event(message)
+
+        self.assertEqual(self.handler.batches, [['first', 'second'], ['third']])
+
+    @mock.patch('waldur_core.core.tasks.send_task')
+    def test_hook_handler_processes_batch_with_one_task(self, mocked_send_task):
+        handler = HookHandler()
+        self.logger.addHandler(handler)
+        try:
+            with pipeline.events_pipeline():
+                self.add_event('first')
+                self.add_event('second')
+        finally:
+            self.logger.removeHandler(handler)
+
+        mocked_send_task.assert_called_once_with('logging', 'process_events_batch')
+        events = mocked_send_task.return_value.call_args[0][0]
+        self.assertEqual([event['message'] for event in events], ['first', 'second'])
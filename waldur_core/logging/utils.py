@@ -1,15 +1,72 @@
+import uuid
+
 from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
 
 from waldur_core.logging.loggers import LoggableMixin
 
+PERMISSIONS_VERSION_KEY = 'logging:permissions_version'
+USER_PERMISSIONS_VERSION_KEY = 'logging:permissions_version:user:%s'
+
 
 def get_loggable_models():
     return [model for model in apps.get_models() if issubclass(model, LoggableMixin)]
 
 
+def get_permission_loggable_models():
+    """ Return loggable models that restrict access to their events. """
+    return [model for model in get_loggable_models()
+            if model.get_permitted_objects_uuids.__func__ is not LoggableMixin.get_permitted_objects_uuids.__func__]
+
+
 def get_scope_types_mapping():
     return {str(m._meta): m for m in get_loggable_models()}
 
 
 def get_reverse_scope_types_mapping():
     return {m: str(m._meta) for m in get_loggable_models()}
+
+
+def get_permissions_versions(user_ids):
+    """
+    Return global version and dictionary user id -> user version of objects permitted to users.
+    Versions are random tokens, so cached values of evicted version could not be reused.
+    """
+    keys = [PERMISSIONS_VERSION_KEY] + [USER_PERMISSIONS_VERSION_KEY % user_id for user_id in user_ids]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, uuid.uuid4().hex, None)
+            versions[key] = cache.get(key)
+    return (versions[PERMISSIONS_VERSION_KEY],
+            {user_id: versions[USER_PERMISSIONS_VERSION_KEY % user_id] for user_id in user_ids})
+
+
+def _renew_permissions_versions(keys):
+    def renew():
+        cache.set_many({key: uuid.uuid4().hex for key in keys}, None)
+
+    renew()
+    # Permitted objects could be cached again by other process before transaction is committed.
+    transaction.on_commit(renew)
+
+
+def invalidate_permitted_objects_uuids(user=None):
+    """ Invalidate cached objects permitted to user or to all users if user is not specified. """
+    key = PERMISSIONS_VERSION_KEY if user is None else USER_PERMISSIONS_VERSION_KEY % user.pk
+    _renew_permissions_versions([key])
+
+
+def invalidate_scope_permitted_objects_uuids(scope):
+    """ Invalidate cached objects permitted to users who could see events of created or deleted scope. """
+    users = scope.get_permitted_users()
+    if users is None:
+        invalidate_permitted_objects_uuids()
+        return
+    # Staff and support users are permitted to see all objects.
+    users_ids = set(get_user_model().objects.filter(Q(is_staff=True) | Q(is_support=True) | Q(pk__in=users))
+                    .values_list('pk', flat=True))
+    _renew_permissions_versions([USER_PERMISSIONS_VERSION_KEY % user_id for user_id in users_ids])
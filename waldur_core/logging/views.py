@@ -9,6 +9,7 @@ from rest_framework import response, viewsets, permissions, status, decorators,
 from waldur_core.core import serializers as core_serializers, filters as core_filters, permissions as core_permissions
 from waldur_core.core.managers import SummaryQuerySet
 from waldur_core.logging import elasticsearch_client, models, serializers, filters, utils
+from waldur_core.logging.pagination import EventPagination
 from waldur_core.logging.loggers import get_event_groups, get_alert_groups, event_logger
 
 
@@ -16,6 +17,7 @@ class EventViewSet(mixins.CreateModelMixin, viewsets.GenericViewSet):
     permission_classes = (permissions.IsAuthenticated, core_permissions.IsAdminOrReadOnly)
     filter_backends = (filters.EventFilterBackend,)
     serializer_class = serializers.EventSerializer
+    pagination_class = EventPagination
 
     def get_queryset(self):
         return elasticsearch_client.ElasticsearchResultList()
@@ -28,6 +30,9 @@ class EventViewSet(mixins.CreateModelMixin, viewsets.GenericViewSet):
         Sorting is supported in ascending and descending order by specifying a field to an **?o=** parameter. By default
         events are sorted by @timestamp in descending order.
 
+        Deep pages should be fetched using cursor pagination: pass empty **?cursor=** parameter to get the first
+        page and follow next links from the Link header.
+
         Run POST against */api/events/* to create an event. Only users with staff privileges can create events.
         New event will be emitted with `custom_notification` event type.
         Request should contain following fields:
@@ -154,6 +159,8 @@ class AlertViewSet(mixins.CreateModelMixin,
         filters.AlertScopeFilterBackend,
     )
     filter_class = filters.AlertFilter
+    pagination_ordering = ('-created',)
+    pagination_approximate_count = True
 
     def get_queryset(self):
         return models.Alert.objects.filtered_for_user(self.request.user).order_by('-created')
@@ -1,12 +1,32 @@
+from collections import defaultdict
 from functools import reduce
 
+from django.contrib.contenttypes.models import ContentType
 from django.db import models
-from django.db.models import Sum
+from django.db.models import Count, Sum
 import six
 
 from . import exceptions
 
 
+def get_lookup_path(model, path_to_scope):
+    """ Convert dotted path from model to scope into queryset lookup.
+
+    Custom customer and project fields of structure querysets are resolved
+    through model Permissions paths, so lookup could be used in values() too.
+    """
+    lookup = path_to_scope.replace('.', '__')
+    base_field, _, extra = lookup.partition('__')
+    if base_field in [f.name for f in model._meta.get_fields()]:
+        return lookup
+    permissions_path = getattr(getattr(model, 'Permissions', None), '%s_path' % base_field, None)
+    if permissions_path is None:
+        return lookup
+    if permissions_path == 'self':
+        return extra or 'pk'
+    return permissions_path + '__' + extra if extra else permissions_path
+
+
 class QuotaLimitField(models.IntegerField):
     """ Django virtual model field.
         Could be used to manage quotas transparently as model fields.
@@ -41,7 +61,7 @@ class QuotaLimitField(models.IntegerField):
             if instance is None:
                 raise AttributeError("Can only be accessed via instance")
             try:
-                return instance.quotas.get(name=quota_field).limit
+                return instance.get_quota(quota_field).limit
             except instance.quotas.model.DoesNotExist:
                 return quota_field.default_limit
 
@@ -117,7 +137,10 @@ class QuotaField(object):
             'usage': self.default_usage(scope) if six.callable(self.default_usage) else self.default_usage,
         }
 
-        return scope.quotas.get_or_create(name=self.name, defaults=defaults)
+        quota, created = scope.quotas.get_or_create(name=self.name, defaults=defaults)
+        if created:
+            scope.clear_quotas_cache()
+        return quota, created
 
     def get_aggregator_quotas(self, quota):
         """ Fetch ancestors quotas that have the same name and are registered as aggregator quotas. """
@@ -126,7 +149,7 @@ class QuotaField(object):
         for ancestor in ancestors:
             for ancestor_quota_field in ancestor.get_quotas_fields(field_class=AggregatorQuotaField):
                 if ancestor_quota_field.get_child_quota_name() == quota.name:
-                    aggregator_quotas.append(ancestor.quotas.get(name=ancestor_quota_field))
+                    aggregator_quotas.append(ancestor.get_quota(ancestor_quota_field))
         return aggregator_quotas
 
     def __str__(self):
@@ -193,6 +216,25 @@ class CounterQuotaField(QuotaField):
         current_usage = self.get_current_usage(self.target_models, scope)
         scope.set_quota_usage(self.name, current_usage)
 
+    def get_current_usages(self, scopes):
+        """ Return dictionary {scope pk: current usage} for all given scopes.
+
+        Usage is computed with one grouped query per target model.
+        If custom get_current_usage function is defined it is called for each scope separately.
+        """
+        if self._raw_get_current_usage is not None:
+            return {scope.pk: self._raw_get_current_usage(self.target_models, scope) for scope in scopes}
+        usages = defaultdict(lambda: 0)
+        for model in self.target_models:
+            lookup_path = get_lookup_path(model, self.path_to_scope)
+            queryset = model.objects.filter(**{lookup_path + '__in': scopes})
+            for scope_id, usage in self._get_grouped_usages(queryset, lookup_path):
+                usages[scope_id] += usage or 0
+        return usages
+
+    def _get_grouped_usages(self, queryset, lookup_path):
+        return queryset.values_list(lookup_path).annotate(usage=Count('pk')).order_by()
+
     def add_usage(self, target_instance, delta, fail_silently=False):
         scope = self._get_scope(target_instance)
         delta *= self.get_delta(target_instance)
@@ -233,6 +275,9 @@ class TotalQuotaField(CounterQuotaField):
                 total_usage += subtotal
         return total_usage
 
+    def _get_grouped_usages(self, queryset, lookup_path):
+        return queryset.values_list(lookup_path).annotate(usage=Sum(self.target_field)).order_by()
+
     def get_delta(self, target_instance):
         return getattr(target_instance, self.target_field)
 
@@ -247,42 +292,80 @@ class AggregatorQuotaField(QuotaField):
             nc_resource_count = quotas_fields.UsageAggregatorQuotaField(
                 get_children=lambda customer: customer.projects.all(),
             )
+
+        Optional child_models (list or function that return list of children models) and
+        path_to_scope (path from child model to scope) allow to fetch children of all scopes
+        with one query per child model on bulk recalculation:
+            nc_resource_count = quotas_fields.UsageAggregatorQuotaField(
+                get_children=lambda customer: customer.projects.all(),
+                child_models=lambda: [Project],
+                path_to_scope='customer',
+            )
     """
     aggregation_field = NotImplemented
 
-    def __init__(self, get_children, child_quota_name=None, **kwargs):
+    def __init__(self, get_children, child_quota_name=None, child_models=None, path_to_scope=None, **kwargs):
         self.get_children = get_children
         self._child_quota_name = child_quota_name
+        self._raw_child_models = child_models
+        self.path_to_scope = path_to_scope
         super(AggregatorQuotaField, self).__init__(**kwargs)
 
     def get_child_quota_name(self):
         return self._child_quota_name if self._child_quota_name is not None else self.name
 
+    @property
+    def child_models(self):
+        """ Return list of children models or None if they are not defined. """
+        if not hasattr(self, '_child_models'):
+            self._child_models = (self._raw_child_models() if six.callable(self._raw_child_models)
+                                  else self._raw_child_models)
+        return self._child_models
+
+    def get_children_map(self, scopes):
+        """ Return dictionary {scope pk: [(child content type id, child pk), ...]} for all given scopes.
+
+        If child_models and path_to_scope are defined children are fetched with one query per child model,
+        otherwise get_children is called for each scope separately.
+        """
+        children_map = defaultdict(list)
+        if self.child_models is not None and self.path_to_scope is not None:
+            for model in self.child_models:
+                content_type_id = ContentType.objects.get_for_model(model).id
+                lookup_path = get_lookup_path(model, self.path_to_scope)
+                children = model.objects.filter(**{lookup_path + '__in': scopes})
+                for child_id, scope_id in children.values_list('pk', lookup_path):
+                    children_map[scope_id].append((content_type_id, child_id))
+        else:
+            for scope in scopes:
+                for child in self.get_children(scope):
+                    content_type_id = ContentType.objects.get_for_model(child).id
+                    children_map[scope.pk].append((content_type_id, child.pk))
+        return children_map
+
     def recalculate_usage(self, scope):
         children = self.get_children(scope)
         current_usage = 0
         for child in children:
-            child_quota = child.quotas.get(name=self.get_child_quota_name())
+            child_quota = child.get_quota(self.get_child_quota_name())
             current_usage += getattr(child_quota, self.aggregation_field)
         scope.set_quota_usage(self.name, current_usage)
 
     def post_child_quota_save(self, scope, child_quota, created=False):
-        quota = scope.quotas.get(name=self.name)
+        quota = scope.get_quota(self.name)
         current_value = getattr(child_quota, self.aggregation_field)
         if created:
             diff = current_value
         else:
             diff = current_value - child_quota.tracker.previous(self.aggregation_field)
         if diff:
-            quota.usage += diff
-            quota.save()
+            quota.add_usage(diff)
 
     def pre_child_quota_delete(self, scope, child_quota):
-        quota = scope.quotas.get(name=self.name)
+        quota = scope.get_quota(self.name)
         diff = getattr(child_quota, self.aggregation_field)
         if diff:
-            quota.usage -= diff
-            quota.save()
+            quota.add_usage(-diff)
 
 
 class UsageAggregatorQuotaField(AggregatorQuotaField):
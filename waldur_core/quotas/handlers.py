@@ -1,7 +1,6 @@
-from django.db import transaction
 from django.db.models import signals
 
-from waldur_core.quotas import models, utils, fields
+from waldur_core.quotas import models, utils, fields, history, propagation
 from waldur_core.quotas.exceptions import CreationConditionFailedQuotaError
 
 
@@ -14,20 +13,12 @@ def create_global_quotas(**kwargs):
 
 def increase_global_quota(sender, instance=None, created=False, **kwargs):
     if created and hasattr(sender, 'GLOBAL_COUNT_QUOTA_NAME'):
-        with transaction.atomic():
-            global_quota = models.Quota.objects.select_for_update().get(
-                name=getattr(sender, 'GLOBAL_COUNT_QUOTA_NAME'))
-            global_quota.usage += 1
-            global_quota.save()
+        models.GlobalQuotaShard.add_usage(getattr(sender, 'GLOBAL_COUNT_QUOTA_NAME'), 1)
 
 
 def decrease_global_quota(sender, **kwargs):
     if hasattr(sender, 'GLOBAL_COUNT_QUOTA_NAME'):
-        with transaction.atomic():
-            global_quota = models.Quota.objects.select_for_update().get(
-                name=getattr(sender, 'GLOBAL_COUNT_QUOTA_NAME'))
-            global_quota.usage -= 1
-            global_quota.save()
+        models.GlobalQuotaShard.add_usage(getattr(sender, 'GLOBAL_COUNT_QUOTA_NAME'), -1)
 
 
 # new quotas
@@ -67,9 +58,29 @@ def handle_aggregated_quotas(sender, instance, **kwargs):
     if isinstance(quota_field, fields.UsageAggregatorQuotaField) or quota_field is None:
         return
     signal = kwargs['signal']
+    buffer = propagation.get_buffer()
+    if buffer is not None:
+        if signal == signals.post_save and kwargs.get('created'):
+            buffer.add_child_quota_change(quota, usage_delta=quota.usage, limit_delta=quota.limit)
+        elif signal == signals.post_save:
+            buffer.add_child_quota_change(quota,
+                                          usage_delta=quota.usage - quota.tracker.previous('usage'),
+                                          limit_delta=quota.limit - quota.tracker.previous('limit'))
+        elif signal == signals.pre_delete:
+            buffer.add_child_quota_change(quota, usage_delta=-quota.usage, limit_delta=-quota.limit)
+        return
     for aggregator_quota in quota_field.get_aggregator_quotas(quota):
         field = aggregator_quota.get_field()
         if signal == signals.post_save:
             field.post_child_quota_save(aggregator_quota.scope, child_quota=quota, created=kwargs.get('created'))
         elif signal == signals.pre_delete:
             field.pre_child_quota_delete(aggregator_quota.scope, child_quota=quota)
+
+
+def record_quota_sample(sender, instance, created=False, raw=False, **kwargs):
+    """ Append quota history sample if quota usage or limit has changed """
+    quota = instance
+    if raw:
+        return
+    if created or quota.tracker.has_changed('usage') or quota.tracker.has_changed('limit'):
+        history.record_samples({quota.pk: (quota.usage, quota.limit)})
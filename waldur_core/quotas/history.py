@@ -0,0 +1,154 @@
+""" Compact time series of quotas usages and limits.
+
+Each change of quota usage or limit appends a sample to QuotaSample table, the last sample
+of each hour, day and month is kept in QuotaRollup table. State of quotas at any points
+is found with four range queries: samples of incomplete hour before point, hourly rollups of
+incomplete day, daily rollups of incomplete month and monthly rollups before it.
+
+Usage example:
+    states = get_states([quota.id], [timezone.now() - timedelta(days=1), timezone.now()])
+    usage, limit = states[quota.id][0]
+"""
+from __future__ import unicode_literals
+
+import bisect
+from collections import defaultdict
+
+from django.db import transaction, IntegrityError
+from django.db.models import Case, FloatField, Q, Value, When
+from django.utils import timezone
+
+from waldur_core.core.utils import chunked
+
+PERIODS = ('hour', 'day', 'month')
+CHUNK_SIZE = 500
+
+
+def get_period_start(period, timestamp):
+    if period == 'hour':
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    elif period == 'day':
+        return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    elif period == 'month':
+        return timestamp.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    raise ValueError('Unknown period %s.' % period)
+
+
+def record_samples(values, timestamp=None):
+    """ Append samples of quotas and update their rollups. Values is dictionary quota id -> (usage, limit). """
+    from waldur_core.quotas import models
+
+    if not values:
+        return
+    timestamp = timestamp or timezone.now()
+    models.QuotaSample.objects.bulk_create([
+        models.QuotaSample(quota_id=quota_id, timestamp=timestamp, usage=usage, limit=limit)
+        for quota_id, (usage, limit) in values.items()
+    ])
+    for ids in chunked(sorted(values), CHUNK_SIZE):
+        _update_rollups({quota_id: values[quota_id] for quota_id in ids}, timestamp)
+
+
+def record_current_samples(quotas_ids):
+    """ Append samples with current usages and limits of quotas, for example after update via queryset. """
+    from waldur_core.quotas import models
+
+    values = {}
+    for ids in chunked(sorted(quotas_ids), CHUNK_SIZE):
+        for quota_id, usage, limit in models.Quota.objects.filter(pk__in=ids).values_list('pk', 'usage', 'limit'):
+            values[quota_id] = (usage, limit)
+    record_samples(values)
+
+
+def _update_rollups(values, timestamp):
+    from waldur_core.quotas import models
+
+    buckets = Q()
+    for period in PERIODS:
+        buckets |= Q(period=period, start=get_period_start(period, timestamp))
+    rollups = models.QuotaRollup.objects.filter(buckets, quota_id__in=values.keys())
+
+    def update():
+        return rollups.update(
+            usage=Case(*[When(quota_id=quota_id, then=Value(usage)) for quota_id, (usage, _) in values.items()],
+                       output_field=FloatField()),
+            limit=Case(*[When(quota_id=quota_id, then=Value(limit)) for quota_id, (_, limit) in values.items()],
+                       output_field=FloatField()),
+        )
+
+    if update() == len(values) * len(PERIODS):
+        return
+    existing = set(rollups.values_list('quota_id', 'period'))
+    missing = [models.QuotaRollup(quota_id=quota_id, period=period, start=get_period_start(period, timestamp),
+                                  usage=usage, limit=limit)
+               for quota_id, (usage, limit) in values.items() for period in PERIODS
+               if (quota_id, period) not in existing]
+    try:
+        with transaction.atomic():
+            models.QuotaRollup.objects.bulk_create(missing)
+    except IntegrityError:
+        # rollups were created by concurrent request
+        update()
+
+
+def get_states(quotas_ids, points):
+    """ Return dictionary quota id -> list of (usage, limit) of quota at each point.
+        Item of list is None if there were no samples of quota before point.
+    """
+    from waldur_core.quotas import models
+
+    result = {quota_id: [None] * len(points) for quota_id in quotas_ids}
+    if not quotas_ids or not points:
+        return result
+
+    bounds = [{'point': point, 'hour': get_period_start('hour', point), 'day': get_period_start('day', point),
+               'month': get_period_start('month', point)} for point in points]
+
+    samples_ranges = Q()
+    hour_ranges = Q()
+    day_ranges = Q()
+    for b in bounds:
+        samples_ranges |= Q(timestamp__gte=b['hour'], timestamp__lte=b['point'])
+        hour_ranges |= Q(start__gte=b['day'], start__lt=b['hour'])
+        day_ranges |= Q(start__gte=b['month'], start__lt=b['day'])
+
+    samples = models.QuotaSample.objects.filter(samples_ranges, quota_id__in=quotas_ids)
+    rollups = models.QuotaRollup.objects.filter(quota_id__in=quotas_ids)
+    series = {
+        'sample': _group_series(samples.order_by('timestamp', 'pk').values_list(
+            'quota_id', 'timestamp', 'usage', 'limit')),
+        'hour': _group_series(rollups.filter(hour_ranges, period='hour').order_by('start').values_list(
+            'quota_id', 'start', 'usage', 'limit')),
+        'day': _group_series(rollups.filter(day_ranges, period='day').order_by('start').values_list(
+            'quota_id', 'start', 'usage', 'limit')),
+        'month': _group_series(rollups.filter(
+            period='month', start__lt=max(b['month'] for b in bounds)).order_by('start').values_list(
+            'quota_id', 'start', 'usage', 'limit')),
+    }
+
+    # Series are checked from the most detailed one, each of them covers time before previous one.
+    lookups = (
+        ('sample', bisect.bisect_right, 'point', 'hour'),
+        ('hour', bisect.bisect_left, 'hour', 'day'),
+        ('day', bisect.bisect_left, 'day', 'month'),
+        ('month', bisect.bisect_left, 'month', None),
+    )
+    for quota_id in quotas_ids:
+        for index, b in enumerate(bounds):
+            for name, search, end, start in lookups:
+                times, states = series[name].get(quota_id, ((), ()))
+                position = search(times, b[end]) - 1
+                if position >= 0 and (start is None or times[position] >= b[start]):
+                    result[quota_id][index] = states[position]
+                    break
+    return result
+
+
+def _group_series(rows):
+    """ Group ordered rows (quota id, time, usage, limit) to dictionary quota id -> (times, states). """
+    series = defaultdict(lambda: ([], []))
+    for quota_id, time, usage, limit in rows:
+        times, states = series[quota_id]
+        times.append(time)
+        states.append((usage, limit))
+    return series
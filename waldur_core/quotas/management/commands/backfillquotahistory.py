@@ -0,0 +1,67 @@
+from __future__ import unicode_literals
+
+import itertools
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Min
+from reversion.models import Version
+
+from waldur_core.quotas import history, models
+
+
+class Command(BaseCommand):
+    help = ('Fill quotas history samples and rollups from django-reversion versions. '
+            'Only versions created before the first existing sample of quota are copied, '
+            'so command can be executed several times.')
+
+    BATCH_SIZE = 1000
+
+    def handle(self, *args, **options):
+        quotas_ids = set(models.Quota.objects.values_list('pk', flat=True))
+        first_samples = dict(models.QuotaSample.objects.values('quota_id')
+                             .annotate(first=Min('timestamp')).values_list('quota_id', 'first'))
+        versions = (Version.objects.get_for_model(models.Quota)
+                    .select_related('revision')
+                    .order_by('object_id', 'revision__date_created', 'pk'))
+
+        samples = []
+        rollups = []
+        samples_count = 0
+        for quota_id, quota_versions in itertools.groupby(versions.iterator(), lambda v: int(v.object_id)):
+            if quota_id not in quotas_ids:
+                continue
+            quota_samples = []
+            for version in quota_versions:
+                timestamp = version.revision.date_created
+                if quota_id in first_samples and timestamp >= first_samples[quota_id]:
+                    break
+                fields = version.field_dict
+                quota_samples.append(models.QuotaSample(
+                    quota_id=quota_id, timestamp=timestamp, usage=fields['usage'], limit=fields['limit']))
+            samples.extend(quota_samples)
+            rollups.extend(self.get_rollups(quota_id, quota_samples))
+            if len(samples) >= self.BATCH_SIZE:
+                samples_count += self.save(samples, rollups)
+                samples, rollups = [], []
+        samples_count += self.save(samples, rollups)
+        self.stdout.write('%s quotas history samples have been created.' % samples_count)
+
+    def get_rollups(self, quota_id, samples):
+        """ Return rollups for the last sample of each period that do not exist yet. """
+        if not samples:
+            return []
+        last_samples = {}
+        for sample in samples:
+            for period in history.PERIODS:
+                last_samples[(period, history.get_period_start(period, sample.timestamp))] = sample
+        existing = set(models.QuotaRollup.objects.filter(quota_id=quota_id).values_list('period', 'start'))
+        return [models.QuotaRollup(quota_id=quota_id, period=period, start=start,
+                                   usage=sample.usage, limit=sample.limit)
+                for (period, start), sample in last_samples.items() if (period, start) not in existing]
+
+    def save(self, samples, rollups):
+        with transaction.atomic():
+            models.QuotaSample.objects.bulk_create(samples)
+            models.QuotaRollup.objects.bulk_create(rollups)
+        return len(samples)
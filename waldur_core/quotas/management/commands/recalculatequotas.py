@@ -1,77 +1,106 @@
 from __future__ import unicode_literals
 
-from django.core.management.base import BaseCommand
+from django.apps import apps
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
 
-from waldur_core.quotas import models, fields, exceptions
+from waldur_core.quotas import models, exceptions
+from waldur_core.quotas.recalculation import QuotaRecalculator
 from waldur_core.quotas.utils import get_models_with_quotas
 
 
 class Command(BaseCommand):
-    """ Recalculate all quotas """
+    help = 'Recalculate all quotas'
 
-    def handle(self, *args, **options):
+    def add_arguments(self, parser):
+        parser.add_argument('--model', dest='model_labels', action='append', metavar='APP_LABEL.MODEL_NAME',
+                            help='Recalculate quotas of given model only. Could be specified several times.')
+        parser.add_argument('--quota', dest='quota_names', action='append', metavar='QUOTA_NAME',
+                            help='Recalculate quotas with given name only. Could be specified several times.')
+        parser.add_argument('--dry-run', dest='dry_run', action='store_true',
+                            help='Print usages that would be changed without saving them.')
+
+    def handle(self, model_labels=None, quota_names=None, dry_run=False, **options):
         # TODO: implement other quotas recalculation
         # TODO: implement global stale quotas deletion
-        self.delete_stale_quotas()
-        self.init_missing_quotas()
-        self.recalculate_global_quotas()
-        self.recalculate_counter_quotas()
-        self.recalculate_aggregator_quotas()
-        self.stdout.write('XXX: Second time to make sure that aggregators of aggregators where calculated properly.')
-        self.recalculate_aggregator_quotas()
-        self.recalculate_customers_user_count()
+        quota_models = self.get_models(model_labels)
+        if not dry_run:
+            self.delete_stale_quotas(quota_models)
+            self.init_missing_quotas(quota_models)
+            self.recalculate_global_quotas(quota_models)
+        self.recalculate_quotas(quota_models, quota_names, dry_run)
+        if not dry_run:
+            self.recalculate_customers_user_count(quota_models, quota_names)
+
+    def get_models(self, model_labels):
+        quota_models = get_models_with_quotas()
+        if not model_labels:
+            return quota_models
+        selected_models = []
+        for label in model_labels:
+            try:
+                model = apps.get_model(label)
+            except (LookupError, ValueError):
+                raise CommandError('Model "%s" does not exist.' % label)
+            if model not in quota_models:
+                raise CommandError('Model "%s" does not have quotas.' % label)
+            selected_models.append(model)
+        return selected_models
 
-    def delete_stale_quotas(self):
+    def delete_stale_quotas(self, quota_models):
         self.stdout.write('Deleting stale quotas')
-        for model in get_models_with_quotas():
-            for obj in model.objects.all():
-                quotas_names = model.get_quotas_names()
-                obj.quotas.exclude(name__in=quotas_names).delete()
+        for model in quota_models:
+            content_type = ContentType.objects.get_for_model(model)
+            models.Quota.objects.filter(content_type=content_type)\
+                                .exclude(name__in=model.get_quotas_names())\
+                                .delete()
         self.stdout.write('...done')
 
-    def init_missing_quotas(self):
+    def init_missing_quotas(self, quota_models):
         self.stdout.write('Initializing missing quotas')
-        for model in get_models_with_quotas():
+        for model in quota_models:
+            content_type = ContentType.objects.get_for_model(model)
+            existing_quotas = set(models.Quota.objects.filter(content_type=content_type)
+                                                      .values_list('object_id', 'name'))
             for obj in model.objects.all():
                 for field in obj.get_quotas_fields():
+                    if (obj.pk, field.name) in existing_quotas:
+                        continue
                     try:
                         field.get_or_create_quota(scope=obj)
                     except exceptions.CreationConditionFailedQuotaError:
                         pass
         self.stdout.write('...done')
 
-    def recalculate_global_quotas(self):
+    def recalculate_global_quotas(self, quota_models):
         self.stdout.write('Recalculating global quotas')
-        for model in get_models_with_quotas():
+        for model in quota_models:
             if hasattr(model, 'GLOBAL_COUNT_QUOTA_NAME'):
                 with transaction.atomic():
                     quota, _ = models.Quota.objects.get_or_create(name=model.GLOBAL_COUNT_QUOTA_NAME)
                     quota.usage = model.objects.count()
                     quota.save()
+                    models.GlobalQuotaShard.set_usage(quota.name, quota.usage)
         self.stdout.write('...done')
 
-    def recalculate_counter_quotas(self):
-        self.stdout.write('Recalculating counter quotas')
-        for model in get_models_with_quotas():
-            for counter_field in model.get_quotas_fields(field_class=fields.CounterQuotaField):
-                for instance in model.objects.all():
-                    counter_field.recalculate(scope=instance)
-        self.stdout.write('...done')
-
-    def recalculate_aggregator_quotas(self):
-        # TODO: recalculate child quotas first
-        self.stdout.write('Recalculating aggregator quotas')
-        for model in get_models_with_quotas():
-            for aggregator_field in model.get_quotas_fields(field_class=fields.AggregatorQuotaField):
-                for instance in model.objects.all():
-                    aggregator_field.recalculate(scope=instance)
-        self.stdout.write('...done')
+    def recalculate_quotas(self, quota_models, quota_names, dry_run):
+        self.stdout.write('Recalculating counter and aggregator quotas')
+        changes = QuotaRecalculator(models=quota_models, quota_names=quota_names, dry_run=dry_run).run()
+        if dry_run:
+            for change in changes:
+                self.stdout.write('%s #%s %s: %s -> %s' % (
+                    change.model._meta.label, change.object_id, change.name, change.old_usage, change.new_usage))
+            self.stdout.write('%s quotas would be changed' % len(changes))
+        else:
+            self.stdout.write('...done, %s quotas changed' % len(changes))
 
     # XXX: With current permissions structure it easier to handle customer quota separately.
-    def recalculate_customers_user_count(self):
-        self.stdout.write('Recalculating customers user count')
+    def recalculate_customers_user_count(self, quota_models, quota_names):
         from waldur_core.structure.models import Customer
+        if Customer not in quota_models or (quota_names and Customer.Quotas.nc_user_count.name not in quota_names):
+            return
+        self.stdout.write('Recalculating customers user count')
         for customer in Customer.objects.all():
             usage = len(set(customer.get_users()))
             customer.set_quota_usage(Customer.Quotas.nc_user_count, usage)
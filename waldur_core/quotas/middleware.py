@@ -0,0 +1,16 @@
+from __future__ import unicode_literals
+
+from django.utils.deprecation import MiddlewareMixin
+
+from waldur_core.quotas import propagation
+
+
+class DeferredQuotaPropagationMiddleware(MiddlewareMixin):
+    """ Apply changes of aggregator quotas once per request. """
+
+    def process_request(self, request):
+        propagation.start()
+
+    def process_response(self, request, response):
+        propagation.finish()
+        return response
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def init_global_quota_shards(apps, schema_editor):
+    Quota = apps.get_model('quotas', 'Quota')
+    GlobalQuotaShard = apps.get_model('quotas', 'GlobalQuotaShard')
+    for quota in Quota.objects.filter(content_type__isnull=True):
+        GlobalQuotaShard.objects.create(name=quota.name, shard=0, usage=quota.usage)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quotas', '0004_quota_threshold'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GlobalQuotaShard',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=150)),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('usage', models.FloatField(default=0)),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='globalquotashard',
+            unique_together=set([('name', 'shard')]),
+        ),
+        migrations.RunPython(init_global_quota_shards, reverse_code=migrations.RunPython.noop),
+    ]
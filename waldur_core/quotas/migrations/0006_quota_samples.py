@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quotas', '0005_globalquotashard'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuotaRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day'), ('month', 'Month')], max_length=5)),
+                ('start', models.DateTimeField()),
+                ('usage', models.FloatField()),
+                ('limit', models.FloatField()),
+                ('quota', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='quotas.Quota')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='QuotaSample',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField()),
+                ('usage', models.FloatField()),
+                ('limit', models.FloatField()),
+                ('quota', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='samples', to='quotas.Quota')),
+            ],
+        ),
+        migrations.AlterIndexTogether(
+            name='quotasample',
+            index_together=set([('quota', 'timestamp')]),
+        ),
+        migrations.AlterUniqueTogether(
+            name='quotarollup',
+            unique_together=set([('quota', 'period', 'start')]),
+        ),
+    ]
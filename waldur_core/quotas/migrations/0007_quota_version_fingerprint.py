@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quotas', '0006_quota_samples'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quota',
+            name='version_fingerprint',
+            field=models.CharField(blank=True, editable=False, max_length=32),
+        ),
+    ]
@@ -5,11 +5,12 @@ import functools
 from functools import reduce
 import inspect
 import logging
+import random
 
 from django.contrib.contenttypes import fields as ct_fields
 from django.contrib.contenttypes import models as ct_models
-from django.db import models
-from django.db.models import Sum
+from django.db import models, transaction, IntegrityError
+from django.db.models import Case, Count, F, Q, Sum, When
 from django.utils.encoding import python_2_unicode_compatible
 from django.utils.translation import ugettext_lazy as _
 from model_utils import FieldTracker
@@ -40,6 +41,7 @@ class Quota(UuidMixin, AlertThresholdMixin, LoggableMixin, ReversionMixin, model
     limit = models.FloatField(default=-1)
     usage = models.FloatField(default=0)
     name = models.CharField(max_length=150, db_index=True)
+    version_fingerprint = models.CharField(max_length=32, blank=True, editable=False)
 
     content_type = models.ForeignKey(ct_models.ContentType, null=True)
     object_id = models.PositiveIntegerField(null=True)
@@ -51,6 +53,17 @@ class Quota(UuidMixin, AlertThresholdMixin, LoggableMixin, ReversionMixin, model
     def __str__(self):
         return '%s quota for %s' % (self.name, self.scope)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # Usage of global quota is changed in shards, so actual usage is a sum of shards usages.
+        if 'usage' in field_names and 'content_type_id' in field_names and 'name' in field_names:
+            values = list(values)
+            if values[field_names.index('content_type_id')] is None:
+                usage = GlobalQuotaShard.get_shards_usage(values[field_names.index('name')])
+                if usage is not None:
+                    values[field_names.index('usage')] = usage
+        return super(Quota, cls).from_db(db, field_names, values)
+
     def is_exceeded(self, delta=None, threshold=None):
         """
         Check is quota exceeded
@@ -88,6 +101,136 @@ class Quota(UuidMixin, AlertThresholdMixin, LoggableMixin, ReversionMixin, model
     def is_over_threshold(self):
         return self.usage >= self.threshold
 
+    def add_usage(self, usage_delta, validate=False):
+        """
+        Atomically add delta to quota usage using UPDATE ... SET usage = usage + delta query,
+        so concurrent usage changes are not lost and quota row is not locked in advance.
+
+        If validate is True usage is increased only if it does not exceed limit,
+        otherwise quota is not changed and False is returned.
+        Usage can not become negative, it is set to zero instead.
+        Quota post_save signal is sent and version is created as on regular save.
+        """
+        queryset = Quota.objects.filter(pk=self.pk)
+        with transaction.atomic():
+            if usage_delta < 0:
+                if not queryset.filter(usage__gte=-usage_delta).update(usage=F('usage') + usage_delta):
+                    self._reset_negative_usage(usage_delta)
+                    return True
+            else:
+                if validate:
+                    queryset = queryset.filter(Q(limit=-1) | Q(limit__gte=F('usage') + usage_delta))
+                if not queryset.update(usage=F('usage') + usage_delta):
+                    self._refresh_usage_and_limit()
+                    return False
+            usage, limit = Quota.objects.values_list('usage', 'limit').get(pk=self.pk)
+            self._save_usage(usage, limit, previous_usage=usage - usage_delta)
+        return True
+
+    def _reset_negative_usage(self, usage_delta):
+        usage, limit = Quota.objects.select_for_update().values_list('usage', 'limit').get(pk=self.pk)
+        logger.error('%(quota)s "%(name)s" quota usage should not be negative. '
+                     'Current usage: %(usage)s, delta: %(usage_delta)s',
+                     dict(quota=self.scope, name=self.name, usage=usage, usage_delta=usage_delta))
+        self._save_usage(0, limit, previous_usage=usage)
+
+    def _refresh_usage_and_limit(self):
+        self.usage, self.limit = Quota.objects.values_list('usage', 'limit').get(pk=self.pk)
+        self.tracker.set_saved_fields(fields=['usage', 'limit'])
+
+    def _save_usage(self, usage, limit, previous_usage):
+        # Quota row is locked by update, it is saved regularly to send post_save signal
+        # with usage change in tracker and to create quota version.
+        self.usage, self.limit = usage, limit
+        self.tracker.saved_data.update(usage=previous_usage, limit=limit)
+        self.save(update_fields=['usage'])
+
+
+@python_2_unicode_compatible
+class GlobalQuotaShard(models.Model):
+    """
+    Part of global count quota usage.
+
+    Global count quota is changed on each creation or deletion of model instance.
+    In order to avoid lock contention on one quota row usage changes are spread
+    between several shards and global quota usage is a sum of shards usages.
+    """
+    SHARDS_COUNT = 16
+
+    class Meta:
+        unique_together = (('name', 'shard'),)
+
+    name = models.CharField(max_length=150)
+    shard = models.PositiveSmallIntegerField()
+    usage = models.FloatField(default=0)
+
+    def __str__(self):
+        return '%s shard #%s' % (self.name, self.shard)
+
+    @classmethod
+    def add_usage(cls, name, usage_delta):
+        shard = random.randrange(cls.SHARDS_COUNT)
+        queryset = cls.objects.filter(name=name, shard=shard)
+        if queryset.update(usage=F('usage') + usage_delta):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(name=name, shard=shard, usage=usage_delta)
+        except IntegrityError:
+            # shard was created by concurrent request
+            queryset.update(usage=F('usage') + usage_delta)
+
+    @classmethod
+    def get_shards_usage(cls, name):
+        """ Return sum of shards usages or None if quota is not sharded. """
+        return cls.objects.filter(name=name).aggregate(usage=Sum('usage'))['usage']
+
+    @classmethod
+    def get_usage(cls, name):
+        return cls.get_shards_usage(name) or 0
+
+    @classmethod
+    def set_usage(cls, name, usage):
+        with transaction.atomic():
+            cls.objects.filter(name=name).delete()
+            cls.objects.create(name=name, shard=0, usage=usage)
+
+
+class QuotaSample(models.Model):
+    """ Usage and limit of quota since given time. Samples are appended on each quota change. """
+
+    class Meta:
+        index_together = (('quota', 'timestamp'),)
+
+    quota = models.ForeignKey(Quota, related_name='samples', on_delete=models.CASCADE)
+    timestamp = models.DateTimeField()
+    usage = models.FloatField()
+    limit = models.FloatField()
+
+
+@python_2_unicode_compatible
+class QuotaRollup(models.Model):
+    """ Usage and limit of quota at the end of hour, day or month, i.e. the last sample of the period. """
+
+    class Periods(object):
+        HOUR = 'hour'
+        DAY = 'day'
+        MONTH = 'month'
+
+        CHOICES = ((HOUR, 'Hour'), (DAY, 'Day'), (MONTH, 'Month'))
+
+    class Meta:
+        unique_together = (('quota', 'period', 'start'),)
+
+    quota = models.ForeignKey(Quota, related_name='rollups', on_delete=models.CASCADE)
+    period = models.CharField(max_length=5, choices=Periods.CHOICES)
+    start = models.DateTimeField()
+    usage = models.FloatField()
+    limit = models.FloatField()
+
+    def __str__(self):
+        return '%s rollup of quota #%s from %s' % (self.period, self.quota_id, self.start)
+
 
 def _fail_silently(method):
 
@@ -145,34 +288,57 @@ class QuotaModelMixin(models.Model):
 
     quotas = ct_fields.GenericRelation('quotas.Quota', related_query_name='quotas')
 
+    def get_quota(self, quota_name):
+        """
+        Return object quota with given name.
+
+        All object quotas are fetched with one query on first call and cached on the instance,
+        so consequent calls do not hit database. Quotas prefetched with prefetch_related('quotas') are reused.
+        Quotas changed with set_quota_limit, set_quota_usage and add_quota_usage are updated in cache too.
+        """
+        quota_name = six.text_type(quota_name)
+        if self.pk is None:
+            return self.quotas.get(name=quota_name)
+        if getattr(self, '_quotas_cache', None) is None:
+            self._quotas_cache = {quota.name: quota for quota in self.quotas.all()}
+        try:
+            return self._quotas_cache[quota_name]
+        except KeyError:
+            # quota could be created after cache initialization
+            quota = self._quotas_cache[quota_name] = self.quotas.get(name=quota_name)
+            return quota
+
+    def clear_quotas_cache(self):
+        """ Drop quotas cached by get_quota, so they are fetched from database on next call. """
+        self._quotas_cache = None
+        prefetched_objects_cache = getattr(self, '_prefetched_objects_cache', {})
+        prefetched_objects_cache.pop('quotas', None)
+
+    def refresh_from_db(self, *args, **kwargs):
+        self.clear_quotas_cache()
+        super(QuotaModelMixin, self).refresh_from_db(*args, **kwargs)
+
     @_fail_silently
     def set_quota_limit(self, quota_name, limit, fail_silently=False):
-        quota = self.quotas.get(name=quota_name)
+        quota = self.get_quota(quota_name)
         if quota.limit != limit:
             quota.limit = limit
             quota.save(update_fields=['limit'])
 
     @_fail_silently
     def set_quota_usage(self, quota_name, usage, fail_silently=False):
-        quota = self.quotas.get(name=quota_name)
+        quota = self.get_quota(quota_name)
         if quota.usage != usage:
             quota.usage = usage
             quota.save(update_fields=['usage'])
 
     @_fail_silently
     def add_quota_usage(self, quota_name, usage_delta, fail_silently=False, validate=False):
-        quota = self.quotas.get(name=quota_name)
-        if validate and quota.is_exceeded(usage_delta):
+        quota = self.get_quota(quota_name)
+        if not quota.add_usage(usage_delta, validate=validate):
             raise exceptions.QuotaValidationError(
                 _('%(quota)s "%(name)s" quota is over limit. Required: %(usage)s, limit: %(limit)s.') % dict(
                     quota=self, name=quota_name, usage=quota.usage + usage_delta, limit=quota.limit))
-        quota.usage += usage_delta
-        if quota.usage < 0:
-            logger.error('%(quota)s "%(name)s" quota usage should not be negative. '
-                         'Current usage: %(usage)s, delta: %(usage_delta)s',
-                         dict(quota=self, name=quota_name, usage=quota.usage, usage_delta=usage_delta))
-            quota.usage = 0
-        quota.save(update_fields=['usage'])
 
     def get_quota_ancestors(self):
         if isinstance(self, DescendantMixin):
@@ -200,7 +366,7 @@ class QuotaModelMixin(models.Model):
         """
         errors = []
         for name, delta in six.iteritems(quota_deltas):
-            quota = self.quotas.get(name=name)
+            quota = self.get_quota(name)
             if quota.is_exceeded(delta):
                 errors.append('%s quota limit: %s, requires %s (%s)\n' % (
                     quota.name, quota.limit, quota.usage + delta, quota.scope))
@@ -269,9 +435,42 @@ class QuotaModelMixin(models.Model):
 
         return result
 
+    @classmethod
+    def get_sums_of_quotas_by_model(cls, querysets, quota_names=None):
+        """
+        Return dictionary of model to sum of quotas of scopes from queryset of this model,
+        sums have the same format as result of get_sum_of_quotas_as_dict.
+        Quotas of all querysets are aggregated by one query grouped by content type and quota name.
+        All `querysets` have to be querysets of different models.
+        """
+        query = Q()
+        models_by_content_type = {}
+        for qs in querysets:
+            content_type = ct_models.ContentType.objects.get_for_model(qs.model)
+            names = quota_names if quota_names is not None else qs.model.get_quotas_names()
+            query |= Q(content_type=content_type, object_id__in=qs.order_by().values('pk'), name__in=names)
+            models_by_content_type[content_type.id] = qs.model
+
+        result = {model: {} for model in models_by_content_type.values()}
+        if not models_by_content_type:
+            return result
+
+        items = Quota.objects.filter(query)\
+                     .order_by()\
+                     .values('content_type_id', 'name')\
+                     .annotate(usage_sum=Sum('usage'),
+                               limit_sum=Sum('limit'),
+                               unlimited_count=Count(Case(When(limit=-1, then=1), output_field=models.IntegerField())))
+        for item in items:
+            partial = result[models_by_content_type[item['content_type_id']]]
+            partial[item['name'] + '_usage'] = item['usage_sum']
+            partial[item['name']] = -1 if item['unlimited_count'] else item['limit_sum']
+        return result
+
     @classmethod
     def get_sum_of_quotas_for_querysets(cls, querysets, quota_names=None):
-        partial_sums = [qs.model.get_sum_of_quotas_as_dict(qs, quota_names) for qs in querysets]
+        sums_by_model = cls.get_sums_of_quotas_by_model(querysets, quota_names)
+        partial_sums = [sums_by_model[qs.model] for qs in querysets]
         return reduce(cls._sum_dicts, partial_sums, defaultdict(lambda: 0))
 
     @classmethod
@@ -0,0 +1,151 @@
+""" Deferred propagation of child quotas changes to aggregator quotas.
+
+By default each child quota save updates all aggregator quotas of quota scope ancestors right away.
+Inside deferred propagation block changes are collected per aggregator quota and applied when block
+is finished: one UPDATE query per ancestors level instead of save of each aggregator quota
+on each child quota change. Deferred propagation is enabled for API requests and background tasks.
+
+Changes of child quotas are collected when transaction is committed and collected changes are
+applied when transaction of block is committed, so changes of rolled back transactions and savepoints
+are not propagated. Therefore aggregator quotas are updated in separate transaction after child quotas
+are committed: it is not atomic with child quotas changes, but all levels of aggregator quotas are
+updated atomically. If it fails aggregator quotas could be fixed by "recalculatequotas" command.
+Also note that django.test.TestCase never commits transaction, so aggregator quotas are not updated
+there, use TransactionTestCase to check them.
+
+Note that aggregator quotas are updated via queryset, so their signals are not sent and versions
+are not created, history samples are appended in bulk instead. Aggregator quotas usage read inside
+the block does not include collected changes.
+
+Usage example:
+    with deferred_propagation():
+        for resource in resources:
+            resource.set_quota_usage('ram', 1024)
+"""
+from __future__ import unicode_literals
+
+from collections import defaultdict
+import contextlib
+import threading
+
+from django.db import transaction
+from django.db.models import Case, F, FloatField, Value, When
+
+from waldur_core.core.utils import chunked
+from waldur_core.quotas import history
+
+_locals = threading.local()
+
+
+class PropagationBuffer(object):
+    """ Collects usage deltas of aggregator quotas and applies them level by level. """
+    UPDATE_CHUNK_SIZE = 400
+
+    def __init__(self):
+        # aggregator quota id -> usage delta
+        self.deltas = defaultdict(lambda: 0)
+        # aggregator quota id -> (aggregator quota, aggregator quota field)
+        self.aggregators = {}
+        # (content type id, object id, quota name) -> list of (aggregator quota, aggregator quota field)
+        self._aggregators_cache = {}
+
+    def add_child_quota_change(self, quota, usage_delta, limit_delta):
+        """ Collect change of child quota when current transaction is committed. """
+        aggregators = self.get_aggregators(quota)
+        transaction.on_commit(lambda: self._add_deltas(aggregators, usage_delta, limit_delta))
+
+    def _add_deltas(self, aggregators, usage_delta, limit_delta):
+        for aggregator_quota, field in aggregators:
+            delta = usage_delta if field.aggregation_field == 'usage' else limit_delta
+            if delta:
+                self.aggregators[aggregator_quota.pk] = (aggregator_quota, field)
+                self.deltas[aggregator_quota.pk] += delta
+
+    def get_aggregators(self, quota):
+        """ Return aggregator quotas of quota scope ancestors that aggregate given quota. """
+        from waldur_core.quotas import fields, models
+
+        key = (quota.content_type_id, quota.object_id, quota.name)
+        if key not in self._aggregators_cache:
+            aggregators = []
+            for ancestor in quota.scope.get_quota_ancestors():
+                for field in ancestor.get_quotas_fields(field_class=fields.AggregatorQuotaField):
+                    if field.get_child_quota_name() != quota.name:
+                        continue
+                    try:
+                        aggregators.append((ancestor.get_quota(field), field))
+                    except models.Quota.DoesNotExist:
+                        pass
+            self._aggregators_cache[key] = aggregators
+        return self._aggregators_cache[key]
+
+    @transaction.atomic
+    def flush(self):
+        from waldur_core.quotas import fields
+
+        deltas, self.deltas = self.deltas, defaultdict(lambda: 0)
+        while deltas:
+            self._apply(deltas)
+            # Usage change of aggregator quota is a child change for aggregators on upper level.
+            # Usage aggregators are not aggregated to avoid calls duplication, as in regular propagation.
+            for quota_id, delta in deltas.items():
+                aggregator_quota, field = self.aggregators[quota_id]
+                if not isinstance(field, fields.UsageAggregatorQuotaField):
+                    self._add_deltas(self.get_aggregators(aggregator_quota), usage_delta=delta, limit_delta=0)
+            deltas, self.deltas = self.deltas, defaultdict(lambda: 0)
+
+    def _apply(self, deltas):
+        from waldur_core.quotas import models
+
+        changed_ids = [quota_id for quota_id, delta in deltas.items() if delta]
+        for ids in chunked(changed_ids, self.UPDATE_CHUNK_SIZE):
+            usage_delta = Case(*[When(pk=quota_id, then=Value(deltas[quota_id])) for quota_id in ids],
+                               output_field=FloatField())
+            models.Quota.objects.filter(pk__in=ids).update(usage=F('usage') + usage_delta)
+            history.record_current_samples(ids)
+            # keep cached quotas of ancestors up to date
+            for quota_id in ids:
+                aggregator_quota, _ = self.aggregators[quota_id]
+                aggregator_quota.usage += deltas[quota_id]
+                aggregator_quota.tracker.set_saved_fields(fields=['usage'])
+
+
+def get_buffer():
+    return getattr(_locals, 'buffer', None)
+
+
+def start():
+    """ Start deferred propagation block. Nested blocks use buffer of outer block. """
+    if get_buffer() is None:
+        _locals.buffer = PropagationBuffer()
+        _locals.depth = 0
+    _locals.depth += 1
+
+
+def finish():
+    """ Finish deferred propagation block and apply collected changes if it is the outermost one. """
+    buffer = get_buffer()
+    if buffer is None:
+        return
+    _locals.depth -= 1
+    if _locals.depth > 0:
+        return
+    del _locals.buffer
+    # Changes are applied right away outside of transaction, otherwise when it is committed.
+    transaction.on_commit(buffer.flush)
+
+
+def reset():
+    """ Apply changes of unfinished block and drop it, for example if previous background task was killed. """
+    if get_buffer() is not None:
+        _locals.depth = 1
+        finish()
+
+
+@contextlib.contextmanager
+def deferred_propagation():
+    start()
+    try:
+        yield
+    finally:
+        finish()
@@ -0,0 +1,146 @@
+from __future__ import unicode_literals
+
+from collections import defaultdict, namedtuple
+import logging
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+
+from waldur_core.core.utils import chunked
+from waldur_core.quotas import models, fields, history, utils
+
+logger = logging.getLogger(__name__)
+
+
+QuotaChange = namedtuple('QuotaChange', ('model', 'name', 'object_id', 'old_usage', 'new_usage'))
+
+
+class QuotaRecalculator(object):
+    """ Recalculates counter and aggregator quotas usages of all scopes in bulk.
+
+    Usages are computed with grouped queries per quota field instead of queries per scope
+    and changed quotas are updated with one UPDATE per distinct usage value.
+    Counter quotas are recalculated first. Aggregator quotas are recalculated after quotas
+    they aggregate, so aggregators of aggregators get already recalculated values.
+
+    Note that quotas are updated via queryset, so Quota signals are not sent and versions are not created,
+    history samples of changed quotas are appended in bulk instead.
+
+    Usage example:
+        changes = QuotaRecalculator(models=[Project], quota_names=['nc_resource_count'], dry_run=True).run()
+    """
+    UPDATE_CHUNK_SIZE = 500
+
+    def __init__(self, models=None, quota_names=None, dry_run=False):
+        self.models = models if models is not None else utils.get_models_with_quotas()
+        self.quota_names = quota_names
+        self.dry_run = dry_run
+        # (content type id, quota name) -> {object id: [quota id, usage, limit]}
+        self._quotas = {}
+        # quota id -> QuotaChange
+        self._changes = {}
+
+    def run(self):
+        """ Recalculate quotas and return list of changes. Changes are saved only if dry_run is False. """
+        for model, field in self.get_ordered_fields():
+            self.recalculate_field(model, field)
+        if not self.dry_run:
+            self.save()
+        return sorted(self._changes.values(), key=lambda c: (c.model._meta.label, c.name, c.object_id))
+
+    def get_ordered_fields(self):
+        """ Return list of (model, quota field) pairs: counter quotas first, then aggregators in dependency order. """
+        all_models = utils.get_models_with_quotas()
+        counters = [(model, field) for model in all_models
+                    for field in model.get_quotas_fields(field_class=fields.CounterQuotaField)]
+        aggregators = [(model, field) for model in all_models
+                       for field in model.get_quotas_fields(field_class=fields.AggregatorQuotaField)]
+        ordered = counters + self._sort_aggregators(aggregators)
+        return [(model, field) for model, field in ordered if self._is_selected(model, field)]
+
+    def _is_selected(self, model, field):
+        if model not in self.models:
+            return False
+        return self.quota_names is None or field.name in self.quota_names
+
+    def _sort_aggregators(self, aggregators):
+        """ Sort aggregator fields topologically: aggregator goes after aggregators of its children.
+
+        If child models are not defined for aggregator it is considered to depend on aggregators
+        with child quota name in all other models.
+        """
+        dependencies = {}
+        for node in aggregators:
+            model, field = node
+            child_models = field.child_models
+            dependencies[node] = {
+                other for other in aggregators
+                if other[1].name == field.get_child_quota_name() and other != node and
+                (other[0] in child_models if child_models is not None else other[0] != model)
+            }
+
+        ordered = []
+        pending = list(aggregators)
+        while pending:
+            ready = [node for node in pending if not dependencies[node] - set(ordered)]
+            if not ready:
+                logger.warning('Cyclic dependency detected between aggregator quotas: %s. '
+                               'They will be recalculated in declaration order.',
+                               ', '.join('%s.%s' % (model.__name__, field.name) for model, field in pending))
+                ready = pending
+            ordered.extend(ready)
+            pending = [node for node in pending if node not in ready]
+        return ordered
+
+    def recalculate_field(self, model, field):
+        content_type = ContentType.objects.get_for_model(model)
+        quotas = self._get_quotas(content_type.id, field.name)
+        if not quotas:
+            return
+        # Only scopes that are connected to the quota.
+        scopes = model.objects.filter(quotas__name=field.name)
+
+        if isinstance(field, fields.CounterQuotaField):
+            usages = field.get_current_usages(scopes)
+        else:
+            usages = self._get_aggregated_usages(field, scopes)
+
+        for object_id, quota in quotas.items():
+            quota_id, old_usage, _ = quota
+            new_usage = usages.get(object_id, 0)
+            if new_usage != old_usage:
+                self._changes[quota_id] = QuotaChange(model, field.name, object_id, old_usage, new_usage)
+                # keep new value in memory, so aggregators of this quota use it even in dry run mode
+                quota[1] = new_usage
+
+    def _get_aggregated_usages(self, field, scopes):
+        child_quota_name = field.get_child_quota_name()
+        value_index = 1 if field.aggregation_field == 'usage' else 2
+        usages = {}
+        for scope_id, children in field.get_children_map(scopes).items():
+            usage = 0
+            for content_type_id, child_id in children:
+                child_quota = self._get_quotas(content_type_id, child_quota_name).get(child_id)
+                if child_quota is not None:
+                    usage += child_quota[value_index]
+            usages[scope_id] = usage
+        return usages
+
+    def _get_quotas(self, content_type_id, name):
+        key = (content_type_id, name)
+        if key not in self._quotas:
+            rows = models.Quota.objects.filter(content_type_id=content_type_id, name=name)\
+                                       .values_list('object_id', 'id', 'usage', 'limit')
+            self._quotas[key] = {object_id: [quota_id, usage, limit] for object_id, quota_id, usage, limit in rows}
+        return self._quotas[key]
+
+    def save(self):
+        ids_by_usage = defaultdict(list)
+        for quota_id, change in self._changes.items():
+            ids_by_usage[change.new_usage].append(quota_id)
+
+        with transaction.atomic():
+            for usage, ids in ids_by_usage.items():
+                for ids_chunk in chunked(ids, self.UPDATE_CHUNK_SIZE):
+                    models.Quota.objects.filter(id__in=ids_chunk).update(usage=usage)
+            history.record_current_samples(self._changes.keys())
@@ -0,0 +1,19 @@
+from celery import shared_task
+
+from waldur_core.quotas import models, utils
+
+
+@shared_task(name='waldur_core.quotas.sync_global_quotas')
+def sync_global_quotas():
+    """ Store sum of global quota shards in global quota row.
+
+        Regular task. Global quota usage is changed in shards in order to avoid
+        lock contention and it is calculated from shards on read, so quota row
+        is updated periodically only to keep its history.
+    """
+    for name in utils.get_global_quotas_names():
+        quota, _ = models.Quota.objects.get_or_create(name=name)
+        stored_usage = models.Quota.objects.values_list('usage', flat=True).get(pk=quota.pk)
+        if quota.usage != stored_usage:
+            quota.tracker.saved_data['usage'] = stored_usage
+            quota.save(update_fields=['usage'])
@@ -37,9 +37,13 @@ class ParentModel(core_models.UuidMixin, quotas_models.QuotaModelMixin, core_mod
         )
         usage_aggregator_quota = fields.UsageAggregatorQuotaField(
             get_children=lambda scope: scope.children.all(),
+            child_models=lambda: [ChildModel],
+            path_to_scope='parent',
         )
         limit_aggregator_quota = fields.LimitAggregatorQuotaField(
             get_children=lambda scope: scope.children.all(),
+            child_models=lambda: [ChildModel],
+            path_to_scope='parent',
             default_limit=0,
         )
         second_usage_aggregator_quota = fields.UsageAggregatorQuotaField(
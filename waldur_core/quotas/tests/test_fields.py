@@ -1,7 +1,12 @@
+import mock
+from django.db import connection, transaction
 from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 from reversion.models import Version
 
 from waldur_core.core.utils import silent_call
+from waldur_core.quotas import propagation
+from waldur_core.quotas.models import Quota
 
 from . import models as test_models
 
@@ -38,6 +43,57 @@ class TestQuotaField(TransactionTestCase):
         new_latest_version = Version.objects.get_for_object(quota).latest('revision__date_created')
         self.assertEqual(new_latest_version, latest_version)
 
+    def test_duplicate_version_is_detected_without_versions_query(self):
+        scope = test_models.GrandparentModel.objects.create()
+        quota = scope.quotas.get(name=test_models.GrandparentModel.Quotas.regular_quota)
+        quota.usage = 13.0
+        quota.save()
+        versions_count = Version.objects.get_for_object(quota).count()
+
+        quota.usage = 13
+        with CaptureQueriesContext(connection) as context:
+            quota.save()
+
+        self.assertFalse([query for query in context.captured_queries if 'reversion_version' in query['sql']])
+        self.assertEqual(Version.objects.get_for_object(quota).count(), versions_count)
+
+    def test_version_is_created_if_instance_fingerprint_is_stale(self):
+        scope = test_models.GrandparentModel.objects.create()
+        quota = scope.quotas.get(name=test_models.GrandparentModel.Quotas.regular_quota)
+        quota.usage = 13.0
+        quota.save()
+        stale_quota = Quota.objects.get(pk=quota.pk)
+        quota.add_usage(1)
+        versions_count = Version.objects.get_for_object(quota).count()
+
+        stale_quota.save()
+
+        self.assertEqual(Version.objects.get_for_object(quota).count(), versions_count + 1)
+        latest_version = Version.objects.get_for_object(quota).latest('revision__date_created')
+        self.assertEqual(latest_version._object_version.object.usage, 13)
+
+    def test_duplicate_version_is_detected_for_quota_without_fingerprint(self):
+        scope = test_models.GrandparentModel.objects.create()
+        quota = scope.quotas.get(name=test_models.GrandparentModel.Quotas.regular_quota)
+        quota.usage = 13.0
+        quota.save()
+        versions_count = Version.objects.get_for_object(quota).count()
+        Quota.objects.filter(pk=quota.pk).update(version_fingerprint='')
+
+        quota = Quota.objects.get(pk=quota.pk)
+        quota.save()
+
+        self.assertEqual(Version.objects.get_for_object(quota).count(), versions_count)
+        self.assertEqual(Quota.objects.get(pk=quota.pk).version_fingerprint, quota.get_version_fingerprint())
+
+    def test_quota_version_is_created_on_atomic_usage_change(self):
+        scope = test_models.GrandparentModel.objects.create()
+        scope.add_quota_usage(test_models.GrandparentModel.Quotas.regular_quota, 7)
+
+        quota = scope.quotas.get(name=test_models.GrandparentModel.Quotas.regular_quota)
+        latest_version = Version.objects.get_for_object(quota).latest('revision__date_created')
+        self.assertEqual(latest_version._object_version.object.usage, 7)
+
 
 class TestCounterQuotaField(TransactionTestCase):
 
@@ -184,6 +240,22 @@ class TestUsageAggregatorField(TransactionTestCase):
         quota = self.grandparent.quotas.get(name=self.grandparent_quota_field)
         self.assertEqual(quota.usage, usage_value * len(self.children))
 
+    def test_usage_aggregator_recalculation_with_specified_child_quota_name(self):
+        usage_value = 10
+        for child in self.children:
+            quota = child.quotas.get(name=self.child_quota_field)
+            quota.usage = usage_value
+            quota.save()
+        second_quota_field = test_models.ParentModel.Quotas.second_usage_aggregator_quota
+        for parent in self.parents:
+            parent.set_quota_usage(second_quota_field, 666)
+
+        silent_call('recalculatequotas', quota_names=[second_quota_field.name])
+
+        for parent in self.parents:
+            quota = parent.quotas.get(name=second_quota_field)
+            self.assertEqual(quota.usage, usage_value)
+
     def test_usage_aggregator_quota_works_with_specified_child_quota_name(self):
         usage_value = 10
         for child in self.children:
@@ -270,3 +342,93 @@ class TestLimitAggregatorField(TransactionTestCase):
 
         quota = self.grandparent.quotas.get(name=self.grandparent_quota_field)
         self.assertEqual(quota.usage, limit_value * len(self.children))
+
+
+class TestDeferredPropagation(TransactionTestCase):
+
+    def setUp(self):
+        self.grandparent = test_models.GrandparentModel.objects.create()
+        self.parents = [test_models.ParentModel.objects.create(parent=self.grandparent) for _ in range(2)]
+        self.children = [test_models.ChildModel.objects.create(parent=parent) for parent in self.parents]
+
+    def get_usage(self, scope, quota_name):
+        return scope.quotas.get(name=quota_name).usage
+
+    def test_aggregator_quotas_are_updated_when_block_is_finished(self):
+        with propagation.deferred_propagation():
+            for child in self.children:
+                child.set_quota_usage('usage_aggregator_quota', 5)
+                child.add_quota_usage('usage_aggregator_quota', 5)
+            self.assertEqual(self.get_usage(self.grandparent, 'usage_aggregator_quota'), 0)
+
+        for parent in self.parents:
+            self.assertEqual(self.get_usage(parent, 'usage_aggregator_quota'), 10)
+            self.assertEqual(self.get_usage(parent, 'second_usage_aggregator_quota'), 10)
+        self.assertEqual(self.get_usage(self.grandparent, 'usage_aggregator_quota'), 20)
+
+    def test_limit_aggregator_quotas_are_updated_when_block_is_finished(self):
+        with propagation.deferred_propagation():
+            for child in self.children:
+                child.set_quota_limit('limit_aggregator_quota', 10)
+
+        for parent in self.parents:
+            self.assertEqual(self.get_usage(parent, 'limit_aggregator_quota'), 10)
+        self.assertEqual(self.get_usage(self.grandparent, 'limit_aggregator_quota'), 20)
+
+    def test_child_deletion_is_propagated(self):
+        for child in self.children:
+            child.set_quota_usage('usage_aggregator_quota', 10)
+
+        with propagation.deferred_propagation():
+            self.children[0].delete()
+
+        self.assertEqual(self.get_usage(self.parents[0], 'usage_aggregator_quota'), 0)
+        self.assertEqual(self.get_usage(self.grandparent, 'usage_aggregator_quota'), 10)
+
+    def test_changes_of_rolled_back_transaction_are_not_propagated(self):
+        with propagation.deferred_propagation():
+            self.children[0].set_quota_usage('usage_aggregator_quota', 5)
+            try:
+                with transaction.atomic():
+                    self.children[1].set_quota_usage('usage_aggregator_quota', 10)
+                    raise ValueError()
+            except ValueError:
+                pass
+
+        self.assertEqual(self.get_usage(self.parents[0], 'usage_aggregator_quota'), 5)
+        self.assertEqual(self.get_usage(self.parents[1], 'usage_aggregator_quota'), 0)
+        self.assertEqual(self.get_usage(self.grandparent, 'usage_aggregator_quota'), 5)
+
+    def test_changes_are_applied_when_transaction_of_block_is_committed(self):
+        with transaction.atomic():
+            with propagation.deferred_propagation():
+                self.children[0].set_quota_usage('usage_aggregator_quota', 5)
+            self.assertEqual(self.get_usage(self.parents[0], 'usage_aggregator_quota'), 0)
+
+        self.assertEqual(self.get_usage(self.parents[0], 'usage_aggregator_quota'), 5)
+        self.assertEqual(self.get_usage(self.grandparent, 'usage_aggregator_quota'), 5)
+
+    @mock.patch.object(propagation.PropagationBuffer, 'UPDATE_CHUNK_SIZE', 1)
+    @mock.patch('waldur_core.quotas.history.record_current_samples')
+    def test_aggregator_quotas_are_not_updated_partially(self, mock_record):
+        # fail on update of the second aggregator quota
+        mock_record.side_effect = [None, IOError()]
+        with self.assertRaises(IOError):
+            with propagation.deferred_propagation():
+                self.children[0].set_quota_usage('usage_aggregator_quota', 5)
+
+        self.assertEqual(self.get_usage(self.children[0], 'usage_aggregator_quota'), 5)
+        self.assertEqual(self.get_usage(self.parents[0], 'usage_aggregator_quota'), 0)
+        self.assertEqual(self.get_usage(self.grandparent, 'usage_aggregator_quota'), 0)
+
+    def test_changes_are_applied_with_one_query_per_level(self):
+        buffer = propagation.PropagationBuffer()
+        for child in self.children:
+            quota = child.quotas.get(name='usage_aggregator_quota')
+            buffer.add_child_quota_change(quota, usage_delta=10, limit_delta=0)
+
+        with CaptureQueriesContext(connection) as context:
+            buffer.flush()
+        updates = [query for query in context.captured_queries if query['sql'].startswith('UPDATE "quotas_quota"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(self.get_usage(self.grandparent, 'usage_aggregator_quota'), 20)
@@ -1,8 +1,8 @@
 from datetime import timedelta
 from ddt import ddt, data
 from django.utils import timezone
+from freezegun import freeze_time
 from rest_framework import test, status
-from reversion.models import Version
 
 from waldur_core.core import utils as core_utils
 from waldur_core.quotas.tests import factories
@@ -47,12 +47,10 @@ class QuotaHistoryTest(test.APITransactionTestCase):
         self.owner = structure_factories.UserFactory(username='owner')
         self.customer.add_user(self.owner, structure_models.CustomerRole.OWNER)
 
-        self.quota = factories.QuotaFactory(scope=self.customer)
+        # Hook for test: lets say that quota was created one hour ago
+        with freeze_time(timezone.now() - timedelta(hours=1)):
+            self.quota = factories.QuotaFactory(scope=self.customer)
         self.url = factories.QuotaFactory.get_url(self.quota, 'history')
-        # Hook for test: lets say that revision was created one hour ago
-        version = Version.objects.get_for_object(self.quota).filter(revision__date_created__lte=timezone.now()).first()
-        version.revision.date_created = timezone.now() - timedelta(hours=1)
-        version.revision.save()
 
     def test_old_version_of_quota_is_available(self):
         old_usage = self.quota.usage
@@ -1,6 +1,9 @@
 from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.test import TestCase
+import six
 
+from waldur_core.core.utils import silent_call
 from waldur_core.structure.tests import factories as structure_factories
 
 
@@ -23,3 +26,38 @@ class RecalculateCommandTest(TestCase):
 
         call_command('recalculatequotas')
         self.assertEqual(customer.quotas.get(name='nc_resource_count').usage, 0)
+
+    def test_dry_run_does_not_change_quotas(self):
+        customer = structure_factories.CustomerFactory()
+        structure_factories.ProjectFactory(customer=customer)
+
+        customer.quotas.filter(name='nc_project_count').update(usage=10)
+
+        call_command('recalculatequotas', dry_run=True, stdout=six.StringIO())
+        self.assertEqual(customer.quotas.get(name='nc_project_count').usage, 10)
+
+    def test_dry_run_prints_changed_quotas(self):
+        customer = structure_factories.CustomerFactory()
+        structure_factories.ProjectFactory(customer=customer)
+
+        customer.quotas.filter(name='nc_project_count').update(usage=10)
+
+        output = six.StringIO()
+        call_command('recalculatequotas', dry_run=True, stdout=output)
+        self.assertIn('structure.Customer #%s nc_project_count: 10.0 -> 1' % customer.id, output.getvalue())
+
+    def test_quotas_are_filtered_by_model_and_name(self):
+        customer = structure_factories.CustomerFactory()
+        project = structure_factories.ProjectFactory(customer=customer)
+
+        customer.quotas.filter(name__in=['nc_project_count', 'nc_service_count']).update(usage=10)
+        project.quotas.filter(name='nc_service_project_link_count').update(usage=10)
+
+        silent_call('recalculatequotas', model_labels=['structure.Customer'], quota_names=['nc_project_count'])
+        self.assertEqual(customer.quotas.get(name='nc_project_count').usage, 1)
+        self.assertEqual(customer.quotas.get(name='nc_service_count').usage, 10)
+        self.assertEqual(project.quotas.get(name='nc_service_project_link_count').usage, 10)
+
+    def test_command_fails_for_model_without_quotas(self):
+        with self.assertRaises(CommandError):
+            silent_call('recalculatequotas', model_labels=['core.SshPublicKey'])
@@ -23,3 +23,15 @@ class GlobalQuotasHandlersTestCase(TestCase):
 
         reread_quota = models.Quota.objects.get(pk=quota.pk)
         self.assertEqual(reread_quota.usage, quota.usage - 1)
+
+    def test_global_quota_usage_is_synchronized_with_shards(self):
+        from waldur_core.quotas import tasks
+
+        for _ in range(3):
+            structure_factories.ProjectFactory()
+
+        tasks.sync_global_quotas()
+
+        stored_usage = models.Quota.objects.filter(name=structure_models.Project.GLOBAL_COUNT_QUOTA_NAME)\
+            .values_list('usage', flat=True).get()
+        self.assertEqual(stored_usage, 3)
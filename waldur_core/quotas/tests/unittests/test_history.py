@@ -0,0 +1,112 @@
+import datetime
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from freezegun import freeze_time
+
+from waldur_core.core.utils import silent_call
+from waldur_core.quotas import history, models
+from waldur_core.quotas.tests import factories
+
+
+def utc_datetime(*args):
+    return datetime.datetime(*args, tzinfo=timezone.utc)
+
+
+class QuotaHistoryTest(TestCase):
+
+    def setUp(self):
+        with freeze_time(utc_datetime(2017, 1, 20, 12, 0)):
+            self.quota = factories.QuotaFactory(usage=1, limit=10)
+
+    def set_usage(self, usage, time):
+        with freeze_time(time):
+            self.quota.usage = usage
+            self.quota.save()
+
+    def get_usages(self, *points):
+        return [state and state[0] for state in history.get_states([self.quota.pk], points)[self.quota.pk]]
+
+    def test_state_is_empty_before_quota_creation(self):
+        self.assertEqual(self.get_usages(utc_datetime(2017, 1, 20, 11, 0)), [None])
+
+    def test_state_is_taken_from_last_sample_before_point(self):
+        self.set_usage(2, utc_datetime(2017, 1, 20, 12, 10))
+        self.set_usage(3, utc_datetime(2017, 1, 20, 12, 20))
+
+        usages = self.get_usages(
+            utc_datetime(2017, 1, 20, 12, 5),
+            utc_datetime(2017, 1, 20, 12, 10),
+            utc_datetime(2017, 1, 20, 12, 15),
+            utc_datetime(2017, 1, 20, 12, 30),
+        )
+
+        self.assertEqual(usages, [1, 2, 2, 3])
+
+    def test_state_is_taken_from_rollups_of_previous_periods(self):
+        self.set_usage(2, utc_datetime(2017, 1, 20, 12, 10))
+        self.set_usage(3, utc_datetime(2017, 2, 5, 8, 30))
+        self.set_usage(4, utc_datetime(2017, 2, 5, 8, 40))
+
+        usages = self.get_usages(
+            # previous hour of the same day
+            utc_datetime(2017, 1, 20, 13, 30),
+            # previous day of the same month
+            utc_datetime(2017, 1, 25, 0, 0),
+            # previous month
+            utc_datetime(2017, 2, 5, 8, 0),
+            # the last sample of hour is stored in rollups
+            utc_datetime(2017, 2, 5, 9, 0),
+            utc_datetime(2017, 3, 1, 0, 0),
+        )
+
+        self.assertEqual(usages, [2, 2, 2, 4, 4])
+
+    def test_queries_count_does_not_depend_on_points_count(self):
+        points = [utc_datetime(2017, 1, 20) + datetime.timedelta(hours=i) for i in range(100)]
+
+        with CaptureQueriesContext(connection) as context:
+            history.get_states([self.quota.pk], points)
+
+        self.assertEqual(len(context.captured_queries), 4)
+
+    def test_sample_is_not_added_if_usage_and_limit_are_not_changed(self):
+        self.quota.threshold = 5
+        self.quota.save()
+
+        self.assertEqual(self.quota.samples.count(), 1)
+
+    def test_rollups_keep_last_sample_of_period(self):
+        self.set_usage(2, utc_datetime(2017, 1, 20, 12, 10))
+
+        rollups = {rollup.period: rollup.usage for rollup in self.quota.rollups.all()}
+
+        self.assertEqual(rollups, {'hour': 2, 'day': 2, 'month': 2})
+
+    def test_samples_are_added_on_atomic_usage_change(self):
+        with freeze_time(utc_datetime(2017, 1, 20, 12, 10)):
+            self.quota.add_usage(5)
+
+        self.assertEqual(self.get_usages(utc_datetime(2017, 1, 20, 12, 15)), [6])
+
+
+class BackfillQuotaHistoryTest(TestCase):
+
+    def test_samples_are_created_from_versions(self):
+        with freeze_time(utc_datetime(2017, 1, 20, 12, 0)):
+            quota = factories.QuotaFactory(usage=1, limit=10)
+        with freeze_time(utc_datetime(2017, 2, 20, 12, 0)):
+            quota.usage = 2
+            quota.save()
+        models.QuotaSample.objects.all().delete()
+        models.QuotaRollup.objects.all().delete()
+
+        silent_call('backfillquotahistory')
+        # command can be executed several times
+        silent_call('backfillquotahistory')
+
+        self.assertEqual(quota.samples.count(), 2)
+        states = history.get_states([quota.pk], [utc_datetime(2017, 2, 1), utc_datetime(2017, 3, 1)])[quota.pk]
+        self.assertEqual(states, [(1, 10), (2, 10)])
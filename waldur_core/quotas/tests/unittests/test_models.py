@@ -1,8 +1,13 @@
+from collections import defaultdict
+from functools import reduce
 import random
 
+from django.contrib.contenttypes.models import ContentType
 from django.test import TestCase
 
-from ..models import GrandparentModel
+from waldur_core.quotas.models import QuotaModelMixin
+
+from ..models import GrandparentModel, ParentModel
 from ... import exceptions
 
 
@@ -79,3 +84,83 @@ class QuotaModelMixinTest(TestCase):
         sum_of_quotas = GrandparentModel.get_sum_of_quotas_as_dict(
             instances, quota_names=['regular_quota'], fields=['limit'])
         self.assertEqual({'regular_quota': -1}, sum_of_quotas)
+
+    def test_quotas_sum_for_querysets_is_equal_to_sum_of_sums_for_each_model(self):
+        grandparents = [GrandparentModel.objects.create() for _ in range(2)]
+        grandparents[0].set_quota_limit('usage_aggregator_quota', 10)
+        grandparents[1].set_quota_limit('usage_aggregator_quota', 20)
+        grandparents[1].set_quota_usage('regular_quota', 5)
+        ParentModel.objects.create(parent=grandparents[0]).set_quota_limit('usage_aggregator_quota', 30)
+        querysets = [GrandparentModel.objects.all(), ParentModel.objects.all()]
+
+        sum_of_quotas = QuotaModelMixin.get_sum_of_quotas_for_querysets(querysets)
+
+        partial_sums = [qs.model.get_sum_of_quotas_as_dict(list(qs)) for qs in querysets]
+        expected_sum_of_quotas = reduce(QuotaModelMixin._sum_dicts, partial_sums, defaultdict(lambda: 0))
+        self.assertEqual(dict(expected_sum_of_quotas), dict(sum_of_quotas))
+        self.assertEqual(sum_of_quotas['usage_aggregator_quota'], 60)
+
+    def test_quotas_sum_for_querysets_is_calculated_with_one_query(self):
+        GrandparentModel.objects.create()
+        querysets = [GrandparentModel.objects.all(), ParentModel.objects.all()]
+        for qs in querysets:
+            ContentType.objects.get_for_model(qs.model)
+
+        with self.assertNumQueries(1):
+            sum_of_quotas = QuotaModelMixin.get_sum_of_quotas_for_querysets(querysets, ['regular_quota'])
+
+        self.assertEqual(dict(sum_of_quotas), {'regular_quota': -1, 'regular_quota_usage': 0})
+
+    def test_quotas_are_fetched_with_one_query(self):
+        instance = GrandparentModel.objects.get(pk=GrandparentModel.objects.create().pk)
+        with self.assertNumQueries(1):
+            for quota_name in instance.get_quotas_names():
+                instance.get_quota(quota_name)
+
+    def test_prefetched_quotas_are_reused(self):
+        GrandparentModel.objects.create()
+        instance = GrandparentModel.objects.prefetch_related('quotas').get()
+        with self.assertNumQueries(0):
+            self.assertEqual(instance.regular_quota, -1)
+            instance.validate_quota_change({'regular_quota': 10})
+
+    def test_cached_quota_is_updated_on_usage_change(self):
+        instance = GrandparentModel.objects.create()
+        instance.add_quota_usage('regular_quota', 10)
+        instance.add_quota_usage('regular_quota', 5)
+        self.assertEqual(instance.get_quota('regular_quota').usage, 15)
+        self.assertEqual(instance.quotas.get(name='regular_quota').usage, 15)
+
+    def test_quotas_cache_is_cleared_on_refresh(self):
+        instance = GrandparentModel.objects.create()
+        instance.get_quota('regular_quota')
+        instance.quotas.filter(name='regular_quota').update(limit=10)
+
+        instance.refresh_from_db()
+        self.assertEqual(instance.regular_quota, 10)
+
+    def test_add_usage_does_not_lose_concurrent_changes(self):
+        instance = GrandparentModel.objects.create()
+        stale_quota = instance.quotas.get(name='regular_quota')
+        instance.add_quota_usage('regular_quota', 10)
+
+        stale_quota.add_usage(5)
+
+        self.assertEqual(stale_quota.usage, 15)
+        self.assertEqual(instance.quotas.get(name='regular_quota').usage, 15)
+
+    def test_add_usage_validates_limit_in_database(self):
+        instance = GrandparentModel.objects.create()
+        stale_quota = instance.quotas.get(name='quota_with_default_limit')
+        instance.add_quota_usage('quota_with_default_limit', 90)
+
+        self.assertFalse(stale_quota.add_usage(20, validate=True))
+        self.assertEqual(stale_quota.usage, 90)
+        self.assertTrue(stale_quota.add_usage(10, validate=True))
+        self.assertEqual(stale_quota.usage, 100)
+
+    def test_negative_usage_is_reset_to_zero(self):
+        instance = GrandparentModel.objects.create()
+        instance.add_quota_usage('regular_quota', 5)
+        instance.add_quota_usage('regular_quota', -10)
+        self.assertEqual(instance.quotas.get(name='regular_quota').usage, 0)
@@ -5,3 +5,7 @@ from waldur_core.quotas import models
 
 def get_models_with_quotas():
     return [m for m in apps.get_models() if issubclass(m, models.QuotaModelMixin)]
+
+
+def get_global_quotas_names():
+    return [m.GLOBAL_COUNT_QUOTA_NAME for m in get_models_with_quotas() if hasattr(m, 'GLOBAL_COUNT_QUOTA_NAME')]
@@ -4,12 +4,11 @@ from django.utils.translation import ugettext_lazy as _
 from rest_framework import exceptions as rf_exceptions, decorators, response, status
 from rest_framework import mixins
 from rest_framework import viewsets
-from reversion.models import Version
 
 from waldur_core.core.pagination import UnlimitedLinkHeaderPagination
 from waldur_core.core.serializers import HistorySerializer
 from waldur_core.core.utils import datetime_to_timestamp
-from waldur_core.quotas import models, serializers, filters, exceptions
+from waldur_core.quotas import models, serializers, filters, exceptions, history
 
 
 class QuotaViewSet(mixins.UpdateModelMixin,
@@ -136,16 +135,14 @@ class QuotaViewSet(mixins.UpdateModelMixin,
 
         quota = self.get_object()
         serializer = self.get_serializer(quota)
+        points = history_serializer.get_filter_data()
+        states = history.get_states([quota.pk], points)[quota.pk]
         serialized_versions = []
-        for point_date in history_serializer.get_filter_data():
+        for point_date, state in zip(points, states):
             serialized = {'point': datetime_to_timestamp(point_date)}
-            version = Version.objects.get_for_object(quota).filter(revision__date_created__lte=point_date)
-            if version.exists():
-                # make copy of serialized data and update field that are stored in version
-                version_object = version.first()._object_version.object
+            if state is not None:
+                # make copy of serialized data and update fields that are stored in history
                 serialized['object'] = serializer.data.copy()
-                serialized['object'].update({
-                    f: getattr(version_object, f) for f in quota.get_version_fields()
-                })
+                serialized['object']['usage'], serialized['object']['limit'] = state
             serialized_versions.append(serialized)
         return response.Response(serialized_versions, status=status.HTTP_200_OK)
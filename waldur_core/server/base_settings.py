@@ -63,6 +63,8 @@ MIDDLEWARE = (
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'waldur_core.logging.middleware.CaptureEventContextMiddleware',
+    'waldur_core.logging.middleware.EventsPipelineMiddleware',
+    'waldur_core.quotas.middleware.DeferredQuotaPropagationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'defender.middleware.FailedLoginMiddleware',
@@ -241,6 +243,26 @@ CELERY_BEAT_SCHEDULE = {
         'schedule': timedelta(hours=24),
         'args': (),
     },
+    'poll-instances': {
+        'task': 'waldur_core.core.PollInstancesTask',
+        'schedule': timedelta(seconds=5),
+        'args': (),
+    },
+    'dispatch-throttled-tasks': {
+        'task': 'waldur_core.structure.ThrottleDispatchTask',
+        'schedule': timedelta(minutes=1),
+        'args': (),
+    },
+    'update-structure-counters': {
+        'task': 'waldur_core.structure.update_structure_counters',
+        'schedule': timedelta(hours=1),
+        'args': (),
+    },
+    'sync-global-quotas': {
+        'task': 'waldur_core.quotas.sync_global_quotas',
+        'schedule': timedelta(minutes=30),
+        'args': (),
+    },
 }
 
 # Logging
@@ -284,6 +306,50 @@ WALDUR_CORE = {
     'NOTIFICATIONS_PROFILE_CHANGES': {'ENABLED': True, 'FIELDS': ('email', 'phone_number', 'job_title')},
     # 'COUNTRIES': ['EE', 'LV', 'LT'],
     'ENABLE_ACCOUNTING_START_DATE': False,
+    'USE_PERMISSION_CLOSURE': True,
+    'WEBHOOK_DELIVERY': {
+        'MAX_WORKERS': 10,
+        'MAX_CONNECTIONS_PER_HOST': 4,
+        'TIMEOUT': 10,
+        'RETRIES': 3,
+        'BACKOFF': 0.5,
+        'BATCH_EVENTS': False,
+    },
+    'BACKEND_POOL': {
+        'ENABLED': False,
+        'MAX_SIZE': 100,
+        'IDLE_TIMEOUT': 600,
+    },
+    'POLLING': {
+        'ENABLED': True,
+        'INITIAL_DELAY': 5,
+        'MAX_DELAY': 60,
+        'BACKOFF_FACTOR': 1.5,
+        'BATCH_SIZE': 50,
+        'CLAIM_TIMEOUT': 300,
+    },
+    'THROTTLING': {
+        'ENABLED': True,
+        'CONCURRENCY': 4,
+        'RATE': None,
+        'BURST': 1,
+        'LEASE_TIMEOUT': 60 * 60,
+    },
+    'TOKEN_ACTIVITY': {
+        'ENABLED': True,
+        'FLUSH_INTERVAL': 60,
+        'BATCH_SIZE': 500,
+        'ACTIVITY_TIMEOUT': 24 * 60 * 60,
+        'LOOKUP_TIMEOUT': 5 * 60,
+    },
+    'COUNTERS': {
+        'ENABLED': True,
+    },
+    'EVENT_STORE': 'waldur_core.logging.elasticsearch_client.ElasticsearchClient',
+    'APPROXIMATE_COUNT': {
+        'THRESHOLD': 10000,
+        'CACHE_TIMEOUT': 60,
+    },
 }
 
 WALDUR_CORE_PUBLIC_SETTINGS = [
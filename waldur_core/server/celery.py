@@ -5,7 +5,9 @@ import os
 from celery import Celery
 from celery import signals
 
+from waldur_core.logging import pipeline as events_pipeline
 from waldur_core.logging.middleware import get_event_context, set_event_context, reset_event_context
+from waldur_core.quotas import propagation
 
 # set the default Django settings module for the 'celery' program.
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'waldur_core.server.settings')  # XXX:
@@ -59,3 +61,36 @@ def bind_event_context(sender=None, **kwargs):
 @signals.task_postrun.connect
 def unbind_event_context(sender=None, **kwargs):
     reset_event_context()
+
+
+# Aggregator quotas changes are collected during background task and applied once it is finished.
+# Eager tasks are executed inside caller propagation block.
+@signals.task_prerun.connect
+def start_quota_propagation(sender=None, **kwargs):
+    if sender is None or sender.request.is_eager:
+        return
+    propagation.reset()
+    propagation.start()
+
+
+@signals.task_postrun.connect
+def finish_quota_propagation(sender=None, **kwargs):
+    if sender is None or sender.request.is_eager:
+        return
+    propagation.finish()
+
+
+# Events of background task are emitted in batches. Eager tasks are executed inside caller pipeline block.
+@signals.task_prerun.connect
+def start_events_pipeline(sender=None, **kwargs):
+    if sender is None or sender.request.is_eager:
+        return
+    events_pipeline.reset()
+    events_pipeline.start()
+
+
+@signals.task_postrun.connect
+def finish_events_pipeline(sender=None, **kwargs):
+    if sender is None or sender.request.is_eager:
+        return
+    events_pipeline.finish()
@@ -454,6 +454,10 @@ class ServiceBackend(object):
     def sync(self):
         raise ServiceBackendNotImplemented
 
+    def pull_many(self, resources):
+        """ Pull resources of service settings with bulk request. """
+        raise ServiceBackendNotImplemented
+
     def has_global_properties(self):
         return False
 
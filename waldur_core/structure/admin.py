@@ -91,17 +91,17 @@ class ProtectedModelMixin(object):
 
 class ResourceCounterFormMixin(object):
     def get_vm_count(self, obj):
-        return obj.quotas.get(name=obj.Quotas.nc_vm_count).usage
+        return obj.get_quota(obj.Quotas.nc_vm_count).usage
 
     get_vm_count.short_description = _('VM count')
 
     def get_app_count(self, obj):
-        return obj.quotas.get(name=obj.Quotas.nc_app_count).usage
+        return obj.get_quota(obj.Quotas.nc_app_count).usage
 
     get_app_count.short_description = _('Application count')
 
     def get_private_cloud_count(self, obj):
-        return obj.quotas.get(name=obj.Quotas.nc_private_cloud_count).usage
+        return obj.get_quota(obj.Quotas.nc_private_cloud_count).usage
 
     get_private_cloud_count.short_description = _('Private cloud count')
 
@@ -11,6 +11,7 @@ class StructureConfig(AppConfig):
 
     def ready(self):
         from waldur_core.core.models import CoordinatesMixin, User
+        from waldur_core.logging.models import Alert
         from waldur_core.structure.executors import check_cleanup_executors
         from waldur_core.structure.models import ResourceMixin, Service, TagMixin, VirtualMachine
         from waldur_core.structure import handlers
@@ -104,6 +105,48 @@ class StructureConfig(AppConfig):
             dispatch_uid='waldur_core.structure.handlers.log_project_role_updated',
         )
 
+        for model in (CustomerPermission, ProjectPermission):
+            signals.post_save.connect(
+                handlers.sync_permission_closure,
+                sender=model,
+                dispatch_uid='waldur_core.structure.handlers.sync_permission_closure_on_%s_save' % model.__name__,
+            )
+
+            signals.post_delete.connect(
+                handlers.sync_permission_closure,
+                sender=model,
+                dispatch_uid='waldur_core.structure.handlers.sync_permission_closure_on_%s_delete' % model.__name__,
+            )
+
+        for model in structure_models_with_roles:
+            structure_signals.structure_role_revoked.connect(
+                handlers.sync_permission_closure_on_role_revoked,
+                sender=model,
+                dispatch_uid='waldur_core.structure.handlers.sync_permission_closure_on_%s_role_revoked' % (
+                    model.__name__),
+            )
+
+        for model in structure_models_with_roles:
+            structure_signals.structure_role_granted.connect(
+                handlers.invalidate_permitted_objects_uuids,
+                sender=model,
+                dispatch_uid='waldur_core.structure.handlers.invalidate_permitted_objects_uuids_on_%s_role_granted' % (
+                    model.__name__),
+            )
+
+            structure_signals.structure_role_revoked.connect(
+                handlers.invalidate_permitted_objects_uuids,
+                sender=model,
+                dispatch_uid='waldur_core.structure.handlers.invalidate_permitted_objects_uuids_on_%s_role_revoked' % (
+                    model.__name__),
+            )
+
+        signals.post_save.connect(
+            handlers.update_permission_closure_on_project_customer_change,
+            sender=Project,
+            dispatch_uid='waldur_core.structure.handlers.update_permission_closure_on_project_customer_change',
+        )
+
         signals.pre_delete.connect(
             handlers.revoke_roles_on_project_deletion,
             sender=Project,
@@ -132,6 +175,13 @@ class StructureConfig(AppConfig):
                     model.__name__, index),
             )
 
+            fsm_signals.post_transition.connect(
+                handlers.release_throttling_slots,
+                sender=model,
+                dispatch_uid='waldur_core.structure.handlers.release_throttling_slots_{}_{}'.format(
+                    model.__name__, index),
+            )
+
             signals.post_save.connect(
                 handlers.log_resource_creation_scheduled,
                 sender=model,
@@ -207,3 +257,60 @@ class StructureConfig(AppConfig):
             sender=User,
             dispatch_uid='waldur_core.structure.handlers.notify_about_user_profile_changes',
         )
+
+        ServiceSettings = self.get_model('ServiceSettings')
+
+        signals.post_save.connect(
+            handlers.evict_service_settings_backends,
+            sender=ServiceSettings,
+            dispatch_uid='waldur_core.structure.handlers.evict_service_settings_backends_on_save',
+        )
+
+        signals.post_delete.connect(
+            handlers.evict_service_settings_backends,
+            sender=ServiceSettings,
+            dispatch_uid='waldur_core.structure.handlers.evict_service_settings_backends_on_delete',
+        )
+
+        counted_models = [Project] + Service.get_all_models() + ResourceMixin.get_all_models()
+        for index, model in enumerate(counted_models):
+            signals.post_save.connect(
+                handlers.update_structure_counters,
+                sender=model,
+                dispatch_uid='waldur_core.structure.handlers.update_structure_counters_on_{}_save_{}'.format(
+                    model.__name__, index),
+            )
+
+            signals.pre_delete.connect(
+                handlers.update_structure_counters,
+                sender=model,
+                dispatch_uid='waldur_core.structure.handlers.update_structure_counters_on_{}_delete_{}'.format(
+                    model.__name__, index),
+            )
+
+        signals.post_save.connect(
+            handlers.update_structure_counters_on_alert_change,
+            sender=Alert,
+            dispatch_uid='waldur_core.structure.handlers.update_structure_counters_on_alert_save',
+        )
+
+        signals.pre_delete.connect(
+            handlers.update_structure_counters_on_alert_change,
+            sender=Alert,
+            dispatch_uid='waldur_core.structure.handlers.update_structure_counters_on_alert_delete',
+        )
+
+        for model in structure_models_with_roles:
+            structure_signals.structure_role_granted.connect(
+                handlers.update_structure_counters_on_role_change,
+                sender=model,
+                dispatch_uid='waldur_core.structure.handlers.update_structure_counters_on_%s_role_granted' % (
+                    model.__name__),
+            )
+
+            structure_signals.structure_role_revoked.connect(
+                handlers.update_structure_counters_on_role_change,
+                sender=model,
+                dispatch_uid='waldur_core.structure.handlers.update_structure_counters_on_%s_role_revoked' % (
+                    model.__name__),
+            )
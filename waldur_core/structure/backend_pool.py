@@ -0,0 +1,191 @@
+""" Per-process pool of service backends.
+
+Backends keep authenticated sessions, so they are reused by tasks and requests of the same process
+instead of being created on each get_backend call. Backend is identified by service settings PK,
+version of settings connection fields, backend class and keyword arguments of get_backend.
+When credentials, URL or options of settings are changed, version changes and new backend is created.
+Least recently used backends are evicted if pool is full, unused backends are evicted after IDLE_TIMEOUT seconds.
+Reused backend is bound to service settings instance of the caller, so it does not use stale settings.
+
+Pool is disabled by default, because it is safe only if backends do not keep state of an operation.
+
+Configuration example:
+    WALDUR_CORE['BACKEND_POOL'] = {
+        'ENABLED': True,
+        'MAX_SIZE': 100,
+        'IDLE_TIMEOUT': 600,
+    }
+"""
+from __future__ import unicode_literals
+
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.encoding import force_bytes, force_text
+
+from waldur_core.structure import SupportedServices
+
+DEFAULT_POOL_SETTINGS = {
+    'ENABLED': False,
+    'MAX_SIZE': 100,
+    'IDLE_TIMEOUT': 600,
+}
+
+VERSION_FIELDS = ('type', 'backend_url', 'username', 'password', 'domain', 'token', 'options')
+
+
+def get_pool_settings():
+    return dict(DEFAULT_POOL_SETTINGS, **settings.WALDUR_CORE.get('BACKEND_POOL', {}))
+
+
+def get_settings_version(service_settings):
+    """ Return stamp of service settings fields used to connect to backend. """
+    values = [getattr(service_settings, field) for field in VERSION_FIELDS]
+    values.append(force_text(service_settings.certificate or ''))
+    hash_input = json.dumps(values, sort_keys=True, cls=DjangoJSONEncoder)
+    # md5 is used for internal caching, not need to care about security
+    return hashlib.md5(force_bytes(hash_input)).hexdigest()  # nosec
+
+
+class BackendPoolMetrics(object):
+    """ Thread safe counters of backend pool. """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+            self.total_construction_time = 0.0
+            self.max_construction_time = 0.0
+
+    def record_hit(self):
+        with self._lock:
+            self.hits += 1
+
+    def record_miss(self, construction_time):
+        with self._lock:
+            self.misses += 1
+            self.total_construction_time += construction_time
+            self.max_construction_time = max(self.max_construction_time, construction_time)
+
+    def record_eviction(self, count=1):
+        with self._lock:
+            self.evictions += count
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'average_construction_time': self.total_construction_time / self.misses if self.misses else 0.0,
+                'max_construction_time': self.max_construction_time,
+            }
+
+
+class BackendPool(object):
+    """ Thread safe LRU cache of backends with idle eviction. """
+
+    def __init__(self, max_size=100, idle_timeout=600):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.metrics = BackendPoolMetrics()
+        self._lock = threading.Lock()
+        # key -> (backend, last usage time)
+        self._backends = OrderedDict()
+
+    def get_key(self, service_settings, backend_class, kwargs):
+        try:
+            kwargs_key = tuple(sorted(kwargs.items()))
+            hash(kwargs_key)
+        except TypeError:
+            return None
+        return service_settings.pk, get_settings_version(service_settings), backend_class, kwargs_key
+
+    def get_backend(self, service_settings, backend_class, **kwargs):
+        key = self.get_key(service_settings, backend_class, kwargs) if service_settings.pk else None
+        if key is None:
+            return backend_class(service_settings, **kwargs)
+
+        now = time.time()
+        with self._lock:
+            self._evict_idle(now)
+            if key in self._backends:
+                backend, _ = self._backends.pop(key)
+                self._backends[key] = (backend, now)
+                self.metrics.record_hit()
+                # Backend has been created with settings instance of another caller, which could be stale.
+                backend.settings = service_settings
+                return backend
+
+        started = time.time()
+        backend = backend_class(service_settings, **kwargs)
+        self.metrics.record_miss(time.time() - started)
+
+        with self._lock:
+            self._backends.pop(key, None)
+            self._backends[key] = (backend, time.time())
+            while len(self._backends) > self.max_size:
+                self._backends.popitem(last=False)
+                self.metrics.record_eviction()
+        return backend
+
+    def evict(self, settings_pk):
+        """ Remove backends of service settings from pool. """
+        with self._lock:
+            keys = [key for key in self._backends if key[0] == settings_pk]
+            for key in keys:
+                del self._backends[key]
+        if keys:
+            self.metrics.record_eviction(len(keys))
+
+    def clear(self):
+        with self._lock:
+            self._backends.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._backends)
+
+    def _evict_idle(self, now):
+        # Backends are ordered by last usage time, so idle backends are at the beginning.
+        evicted = 0
+        while self._backends:
+            key, (_, last_used) = next(iter(self._backends.items()))
+            if now - last_used <= self.idle_timeout:
+                break
+            del self._backends[key]
+            evicted += 1
+        if evicted:
+            self.metrics.record_eviction(evicted)
+
+
+_pool = {}
+
+
+def get_pool():
+    """ Return backend pool of current process, it is recreated after fork to avoid sharing connections. """
+    pid = os.getpid()
+    if _pool.get('pid') != pid:
+        conf = get_pool_settings()
+        _pool['pool'] = BackendPool(max_size=conf['MAX_SIZE'], idle_timeout=conf['IDLE_TIMEOUT'])
+        _pool['pid'] = pid
+    return _pool['pool']
+
+
+def get_backend(service_settings, **kwargs):
+    """ Return backend of service settings from pool of current process. """
+    backend_class = SupportedServices.get_service_backend(service_settings.type)
+    if not get_pool_settings()['ENABLED']:
+        return backend_class(service_settings, **kwargs)
+    return get_pool().get_backend(service_settings, backend_class, **kwargs)
@@ -0,0 +1,176 @@
+""" Materialized counters of entities related to customers and projects.
+
+Counters of customer and project are stored in one StructureCounters row, so dashboard
+counters are read with a single indexed query. Row is recalculated in background task
+scheduled after commit of transaction which creates or deletes project, service or resource,
+changes alert or grants or revokes role, so request is not slowed down by recalculation.
+All rows are reconciled periodically by update_structure_counters task.
+Counts are not filtered by permissions of user, so they are used only for users who
+are able to see all entities of customer or project.
+
+Configuration example:
+    WALDUR_CORE['COUNTERS'] = {
+        'ENABLED': True,
+    }
+"""
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count
+from django.utils.encoding import force_text
+
+from waldur_core.core.tasks import send_task
+from waldur_core.logging import models as logging_models
+from waldur_core.structure import filters, models
+
+DEFAULT_COUNTERS_SETTINGS = {
+    'ENABLED': True,
+}
+
+PROJECT_CATEGORIES = {
+    'vms': lambda: models.VirtualMachine.get_all_models(),
+    'apps': lambda: models.ApplicationMixin.get_all_models(),
+    'private_clouds': lambda: models.PrivateCloud.get_all_models(),
+    'storages': lambda: models.Storage.get_all_models(),
+}
+
+
+def get_counters_settings():
+    return dict(DEFAULT_COUNTERS_SETTINGS, **settings.WALDUR_CORE.get('COUNTERS', {}))
+
+
+def is_enabled():
+    return get_counters_settings()['ENABLED']
+
+
+def get_alert_counts(scope):
+    """ Return number of open alerts of scope and its descendants grouped by alert type. """
+    aggregate = 'customer' if isinstance(scope, models.Customer) else 'project'
+    alerts = filters.filter_alerts_by_aggregate(logging_models.Alert.objects, aggregate, None, scope.uuid.hex)
+    alerts = alerts.filter(closed__isnull=True).order_by().values('alert_type').annotate(count=Count('pk'))
+    return {row['alert_type']: row['count'] for row in alerts}
+
+
+def count_customer(customer):
+    service_models = models.Service.get_all_models()
+    return {
+        'alerts': get_alert_counts(customer),
+        'projects': models.Project.objects.filter(customer=customer).count(),
+        'services': sum(model.objects.filter(customer=customer).count() for model in service_models),
+        'users': customer.get_users().count(),
+    }
+
+
+def count_project(project):
+    # The same resource model could belong to several categories, it is counted once.
+    model_counts = {}
+    result = {}
+    for category, get_models in PROJECT_CATEGORIES.items():
+        for model in get_models():
+            if model not in model_counts:
+                model_counts[model] = model.objects.filter(project=project).count()
+        result[category] = sum(model_counts[model] for model in get_models())
+    result['alerts'] = get_alert_counts(project)
+    result['users'] = project.get_users().count()
+    return result
+
+
+def count(scope):
+    """ Return live counters of customer or project. """
+    if isinstance(scope, models.Customer):
+        return count_customer(scope)
+    return count_project(scope)
+
+
+def _get_lookup(scope):
+    field = 'customer' if isinstance(scope, models.Customer) else 'project'
+    return {field: scope}
+
+
+def store(scope, counters):
+    lookup = _get_lookup(scope)
+    if models.StructureCounters.objects.filter(**lookup).update(counters=counters):
+        return
+    try:
+        with transaction.atomic():
+            models.StructureCounters.objects.create(counters=counters, **lookup)
+    except IntegrityError:
+        # Row has been created concurrently.
+        models.StructureCounters.objects.filter(**lookup).update(counters=counters)
+
+
+def update(scope):
+    """ Recalculate and store counters of customer or project. """
+    counters = count(scope)
+    store(scope, counters)
+    return counters
+
+
+def get_stored(scope):
+    return models.StructureCounters.objects.filter(**_get_lookup(scope)).values_list(
+        'counters', flat=True).first()
+
+
+def get(scope):
+    """ Return stored counters of customer or project, they are calculated if they are not stored yet. """
+    counters = get_stored(scope)
+    if counters is None:
+        counters = update(scope)
+    return counters
+
+
+def get_alerts_count(counters, excluded_types=()):
+    return sum(value for alert_type, value in counters['alerts'].items() if alert_type not in excluded_types)
+
+
+def _get_related_id(instance, path):
+    if path == 'self':
+        return instance.pk
+    parts = path.split('__')
+    for part in parts[:-1]:
+        instance = getattr(instance, part, None)
+        if instance is None:
+            return None
+    return getattr(instance, parts[-1] + '_id', None)
+
+
+def get_serialized_scopes(instance):
+    """ Return list of serialized customer and project which counters depend on instance. """
+    permissions = getattr(instance, 'Permissions', None)
+    serialized_scopes = []
+    for model, path_name in ((models.Project, 'project_path'), (models.Customer, 'customer_path')):
+        path = getattr(permissions, path_name, None)
+        pk = path and _get_related_id(instance, path)
+        if pk:
+            # The same format as in waldur_core.core.utils.serialize_instance
+            serialized_scopes.append('{}:{}'.format(force_text(model._meta), pk))
+    return serialized_scopes
+
+
+def schedule_update(instance):
+    """ Recalculate counters depending on instance in background task after commit of current transaction. """
+    if not is_enabled() or instance is None:
+        return
+    serialized_scopes = get_serialized_scopes(instance)
+    if serialized_scopes:
+        transaction.on_commit(lambda: send_task('structure', 'update_scopes_counters')(serialized_scopes))
+
+
+def get_differences(stored, live):
+    """ Return dict of category to pair of stored and live values for differing categories. """
+    stored = stored or {}
+    keys = set(stored) | set(live)
+    return {key: (stored.get(key), live.get(key)) for key in keys if stored.get(key) != live.get(key)}
+
+
+def update_all():
+    """ Reconcile counters of all customers and projects, return number of fixed rows. """
+    fixed = 0
+    for model in (models.Customer, models.Project):
+        for scope in model.objects.all().only('pk', 'uuid').iterator():
+            live = count(scope)
+            if get_differences(get_stored(scope), live):
+                store(scope, live)
+                fixed += 1
+    return fixed
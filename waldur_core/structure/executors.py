@@ -1,5 +1,6 @@
-from celery import chain
+from celery import chain, group
 from django.core import checks
+from django.core.exceptions import ObjectDoesNotExist
 from django.db.migrations.topological_sort import stable_topological_sort
 from django.db.models import Model
 
@@ -54,6 +55,7 @@ class BaseCleanupExecutor(core_executors.BaseExecutor):
 
     2) Project's resources are specified by the `pre_models` field.
        It is assumed that each model class can be filtered by project.
+       They are deleted by `pre_apply` method when project cleanup reaches current executor.
 
     3) The value of `executors` field is list of tuples (model class, executor class).
        Executors are applied after resources specified by pre_models field are deleted.
@@ -99,7 +101,8 @@ class BaseCleanupExecutor(core_executors.BaseExecutor):
     def get_task_signature(cls, instance, serialized_instance, **kwargs):
         """
         Delete each resource using specific executor.
-        Convert executors to task and combine all deletion task into single sequential task.
+        Models are processed sequentially in order of `executors` field.
+        Resources of model are fetched when its task is started and they are deleted in parallel.
         """
         cleanup_tasks = [
             ProjectResourceCleanupTask().si(
@@ -111,12 +114,30 @@ class BaseCleanupExecutor(core_executors.BaseExecutor):
         ]
 
         if not cleanup_tasks:
-            return core_tasks.EmptyTask()
+            return core_tasks.EmptyTask().si()
 
         return chain(cleanup_tasks)
 
 
+class CleanupPreApplyTask(core_tasks.Task):
+    """ Run pre_apply method of cleanup executor when project cleanup reaches it. """
+
+    @classmethod
+    def get_description(cls, executor, project, *args, **kwargs):
+        return 'Prepare cleanup of project "%s" using executor %s.' % (project, executor)
+
+    def run(self, serialized_executor, serialized_project, *args, **kwargs):
+        executor = core_utils.deserialize_class(serialized_executor)
+        project = core_utils.deserialize_instance(serialized_project)
+        executor.pre_apply(project)
+
+
 class ProjectResourceCleanupTask(core_tasks.Task):
+    """ Delete resources of model in project.
+
+        Task is replaced by group of deletion tasks of each resource, so resources are deleted in parallel
+        and chain is continued when all of them are deleted. Eagerly executed task deletes resources sequentially.
+    """
 
     @classmethod
     def get_description(cls, executor, model, project, *args, **kwargs):
@@ -126,29 +147,47 @@ class ProjectResourceCleanupTask(core_tasks.Task):
         executor = core_utils.deserialize_class(serialized_executor)
         model_cls = core_utils.deserialize_class(serialized_model)
         project = core_utils.deserialize_instance(serialized_project)
+        resources = list(model_cls.objects.filter(project=project))
+
+        if len(resources) > 1 and self.request.id and not self.request.is_eager:
+            return self.replace(group([
+                ResourceCleanupTask().si(serialized_executor, core_utils.serialize_instance(resource), **kwargs)
+                for resource in resources
+            ]))
 
-        for resource in model_cls.objects.filter(project=project):
+        for resource in resources:
             executor.execute(resource, async=False, force=True, **kwargs)
 
 
+class ResourceCleanupTask(core_tasks.Task):
+
+    @classmethod
+    def get_description(cls, executor, resource, *args, **kwargs):
+        return 'Delete resource "%s" using executor %s.' % (resource, executor)
+
+    def run(self, serialized_executor, serialized_resource, *args, **kwargs):
+        executor = core_utils.deserialize_class(serialized_executor)
+        try:
+            resource = core_utils.deserialize_instance(serialized_resource)
+        except ObjectDoesNotExist:
+            # Resource could be deleted together with resource of previous wave.
+            return
+        executor.execute(resource, async=False, force=True, **kwargs)
+
+
 class ProjectCleanupExecutor(core_executors.BaseExecutor):
 
     @classmethod
     def get_task_signature(cls, instance, serialized_instance, **kwargs):
-        executors = cls.get_executors()
-
-        # Combine all executors into single sequential task
+        # Combine signatures of all executors into single chain
         # to cleanup related resources in correct order
-        cleanup_tasks = [
-            core_tasks.ExecutorTask().si(
-                core_utils.serialize_class(executor),
-                serialized_instance
-            )
-            for executor in executors
-        ]
+        cleanup_tasks = []
+        for executor in cls.get_executors():
+            cleanup_tasks.append(CleanupPreApplyTask().si(core_utils.serialize_class(executor), serialized_instance))
+            cleanup_tasks.append(executor.get_task_signature(instance, serialized_instance, **kwargs))
 
         if not cleanup_tasks:
-            return core_tasks.EmptyTask()
+            return core_tasks.EmptyTask().si()
 
         return chain(cleanup_tasks)
 
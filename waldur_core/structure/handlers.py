@@ -4,16 +4,19 @@ import logging
 import re
 
 from django.conf import settings
+from django.db import transaction
+from django.db.models import signals as django_signals
 from django.template.loader import render_to_string
 from django.utils import timezone
 
 from waldur_core.core import utils
 from waldur_core.core.models import StateMixin
 from waldur_core.core.tasks import send_task
-from waldur_core.structure import SupportedServices, signals
+from waldur_core.logging import utils as logging_utils
+from waldur_core.structure import SupportedServices, backend_pool, counters, signals, throttling
 from waldur_core.structure.log import event_logger
 from waldur_core.structure.models import (Customer, CustomerPermission, Project, ProjectPermission,
-                                          Service, ServiceSettings, CustomerRole)
+                                          Service, ServiceSettings, CustomerRole, PermissionClosure)
 
 logger = logging.getLogger(__name__)
 
@@ -209,6 +212,30 @@ def change_customer_nc_users_quota(sender, structure, user, role, signal, **kwar
     customer.set_quota_usage(Customer.Quotas.nc_user_count, customer_users.count())
 
 
+def sync_permission_closure(sender, instance, **kwargs):
+    """
+    Update permission closure on permission save or deletion.
+    Permission is saved on role grant and expiration time update.
+    """
+    structure_id = instance.project_id if sender is ProjectPermission else instance.customer_id
+    PermissionClosure.sync(sender, structure_id, instance.user_id, instance.role)
+
+
+def sync_permission_closure_on_role_revoked(sender, structure, user, role, **kwargs):
+    """ Permissions are revoked via queryset update, so post_save signal is not emitted for them. """
+    PermissionClosure.sync(structure.permissions.model, structure.pk, user.pk, role)
+
+
+def invalidate_permitted_objects_uuids(sender, structure, user, **kwargs):
+    """ Objects visible in events of user depend on user roles. """
+    logging_utils.invalidate_permitted_objects_uuids(user)
+
+
+def update_permission_closure_on_project_customer_change(sender, instance, created=False, **kwargs):
+    if not created and instance.tracker.has_changed('customer_id'):
+        PermissionClosure.objects.filter(project=instance).update(customer=instance.customer)
+
+
 def log_resource_deleted(sender, instance, **kwargs):
     event_logger.resource.info(
         '{resource_full_name} has been deleted.',
@@ -392,3 +419,34 @@ def notify_about_user_profile_changes(sender, instance, created=False, **kwargs)
         msg,
         event_type='user_profile_changed',
         event_context={'affected_user': user})
+
+
+def evict_service_settings_backends(sender, instance, created=False, signal=None, **kwargs):
+    """ Backends of deleted service settings or settings with changed connection fields should not be reused. """
+    if signal == django_signals.post_save and not created:
+        fields = backend_pool.VERSION_FIELDS + ('certificate',)
+        if not any(instance.tracker.has_changed(field) for field in fields):
+            return
+    backend_pool.get_pool().evict(instance.pk)
+
+
+def release_throttling_slots(sender, instance, name, source, target, **kwargs):
+    """ Resource releases provisioning slot when it leaves creating state or becomes erred. """
+    if source == StateMixin.States.CREATING or target == StateMixin.States.ERRED:
+        holder = utils.serialize_instance(instance)
+        transaction.on_commit(lambda: throttling.release(holder))
+
+
+def update_structure_counters(sender, instance, signal, created=False, **kwargs):
+    """ Counters of customer and project are updated when related entity is created or deleted. """
+    if signal == django_signals.post_save and not created:
+        return
+    counters.schedule_update(instance)
+
+
+def update_structure_counters_on_alert_change(sender, instance, **kwargs):
+    counters.schedule_update(instance.scope)
+
+
+def update_structure_counters_on_role_change(sender, structure, **kwargs):
+    counters.schedule_update(structure)
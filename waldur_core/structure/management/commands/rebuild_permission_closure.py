@@ -0,0 +1,62 @@
+from __future__ import unicode_literals
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from waldur_core.structure import managers, models
+
+
+class Command(BaseCommand):
+    help = 'Rebuild permission closure table and verify it against permissions of customers and projects.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify-only', dest='verify_only', action='store_true',
+                            help='Verify permission closure table without rebuilding it.')
+
+    def handle(self, verify_only=False, **options):
+        if not verify_only:
+            self.stdout.write('Rebuilding permission closure')
+            count = models.PermissionClosure.rebuild()
+            self.stdout.write('...done, %s rows created' % count)
+
+        self.stdout.write('Verifying permission closure')
+        errors_count = self.verify_rows() + self.verify_querysets()
+        if errors_count:
+            raise CommandError('Permission closure is inconsistent, %s errors found.' % errors_count)
+        self.stdout.write('...done, permission closure is consistent')
+
+    def verify_rows(self):
+        expected_rows = models.PermissionClosure.get_expected_rows()
+        actual_rows = models.PermissionClosure.get_actual_rows()
+        for row in expected_rows - actual_rows:
+            self.stdout.write('Missing row: user %s, customer %s, project %s, role %s, expiration time %s' % row)
+        for row in actual_rows - expected_rows:
+            self.stdout.write('Stale row: user %s, customer %s, project %s, role %s, expiration time %s' % row)
+        return len(expected_rows ^ actual_rows)
+
+    def verify_querysets(self):
+        """ Compare objects visible to each user with permissions via joins and via permission closure. """
+        errors_count = 0
+        users = get_user_model().objects.filter(
+            Q(customerpermission__is_active=True) | Q(projectpermission__is_active=True),
+            is_staff=False, is_support=False,
+        ).distinct()
+        for model in self.get_models_with_permissions():
+            queryset = model._default_manager.all()
+            for user in users.iterator():
+                expected = set(managers.filter_queryset_by_permissions(queryset, user).values_list('pk', flat=True))
+                actual = set(managers.filter_queryset_by_permission_closure(queryset, user).values_list(
+                    'pk', flat=True))
+                if expected != actual:
+                    errors_count += 1
+                    self.stdout.write('%s objects visible to user %s differ: missing %s, extra %s' % (
+                        model._meta.label, user.username, sorted(expected - actual), sorted(actual - expected)))
+        return errors_count
+
+    def get_models_with_permissions(self):
+        return [model for model in apps.get_models()
+                if hasattr(model, 'Permissions') and
+                (getattr(model.Permissions, 'customer_path', None) or
+                 getattr(model.Permissions, 'project_path', None))]
@@ -0,0 +1,40 @@
+from __future__ import unicode_literals
+
+from django.core.management.base import BaseCommand, CommandError
+
+from waldur_core.structure import counters, models
+
+
+class Command(BaseCommand):
+    help = 'Compare stored counters of customers and projects with live counts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', dest='fix', action='store_true',
+                            help='Store live counts for customers and projects with inconsistent counters.')
+
+    def handle(self, fix=False, **options):
+        self.stdout.write('Verifying structure counters')
+        errors_count = 0
+        for model in (models.Customer, models.Project):
+            for scope in model.objects.all().only('pk', 'uuid').iterator():
+                stored = counters.get_stored(scope)
+                if stored is None:
+                    # Counters are calculated on first read.
+                    continue
+                live = counters.count(scope)
+                differences = counters.get_differences(stored, live)
+                if not differences:
+                    continue
+                errors_count += 1
+                for category, (stored_value, live_value) in sorted(differences.items()):
+                    self.stdout.write('%s %s, %s: stored %s, live %s' % (
+                        model.__name__, scope.uuid.hex, category, stored_value, live_value))
+                if fix:
+                    counters.store(scope, live)
+
+        if errors_count and not fix:
+            raise CommandError('Structure counters are inconsistent, %s errors found.' % errors_count)
+        if errors_count:
+            self.stdout.write('...done, counters of %s customers and projects have been fixed' % errors_count)
+        else:
+            self.stdout.write('...done, structure counters are consistent')
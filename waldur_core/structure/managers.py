@@ -1,4 +1,8 @@
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import FieldDoesNotExist
 from django.db import models
+from django.utils.lru_cache import lru_cache
 
 from waldur_core.core.managers import GenericKeyMixin, SummaryQuerySet
 
@@ -31,20 +35,113 @@ def get_permission_subquery(permissions, user):
     return subquery
 
 
+@lru_cache(maxsize=None)
+def is_multi_valued_path(model, path):
+    """ Check whether filtering by given path could return the same object several times. """
+    try:
+        for name in path.split('__'):
+            field = model._meta.get_field(name)
+            if field.many_to_many or field.one_to_many:
+                return True
+            model = field.related_model
+    except FieldDoesNotExist:
+        # Path is defined only for concrete models, so it could not be checked for abstract model.
+        return True
+    return False
+
+
+def get_permission_closure_subquery(model, user):
+    """
+    Return query that checks visibility of objects using PermissionClosure
+    and flag that shows whether it could return duplicates.
+    """
+    from waldur_core.structure.models import PermissionClosure
+
+    closure = PermissionClosure.objects.filter(user=user)
+    structure_ids = {
+        'customer': closure.filter(project=None).values('customer'),
+        'project': closure.exclude(project=None).values('project'),
+    }
+
+    subquery = models.Q()
+    needs_distinct = False
+    for entity in ('customer', 'project'):
+        path = getattr(model.Permissions, '%s_path' % entity, None)
+        if not path:
+            continue
+
+        ids = structure_ids[entity]
+        if path == 'self':
+            subquery |= models.Q(pk__in=ids)
+        elif not is_multi_valued_path(model, path):
+            subquery |= models.Q(**{path + '__in': ids})
+        elif not model._meta.abstract:
+            # Semi-join by primary key does not duplicate objects with several related structures.
+            subquery |= models.Q(pk__in=model._base_manager.filter(**{path + '__in': ids}).values('pk'))
+        else:
+            subquery |= models.Q(**{path + '__in': ids})
+            needs_distinct = True
+
+    extra_query = getattr(model.Permissions, 'extra_query', None)
+    if extra_query:
+        subquery |= models.Q(**extra_query)
+
+    return subquery, needs_distinct
+
+
+def filter_queryset_by_permissions(queryset, user):
+    """ Filter queryset using joins through permissions of customers and projects. """
+    subquery = get_permission_subquery(queryset.model.Permissions, user)
+    if not subquery:
+        return queryset
+
+    return queryset.filter(subquery).distinct()
+
+
+def filter_queryset_by_permission_closure(queryset, user):
+    """ Filter queryset using semi-joins with PermissionClosure table. """
+    subquery, needs_distinct = get_permission_closure_subquery(queryset.model, user)
+    if not subquery:
+        return queryset
+
+    queryset = queryset.filter(subquery)
+    return queryset.distinct() if needs_distinct else queryset
+
+
 def filter_queryset_for_user(queryset, user):
     if user is None or user.is_staff or user.is_support:
         return queryset
 
-    try:
-        permissions = queryset.model.Permissions
-    except AttributeError:
+    if not hasattr(queryset.model, 'Permissions'):
         return queryset
 
-    subquery = get_permission_subquery(permissions, user)
-    if not subquery:
-        return queryset
+    if settings.WALDUR_CORE.get('USE_PERMISSION_CLOSURE', True):
+        return filter_queryset_by_permission_closure(queryset, user)
 
-    return queryset.filter(subquery).distinct()
+    return filter_queryset_by_permissions(queryset, user)
+
+
+def filter_scope_queryset_for_user(queryset, user, scope_models):
+    """
+    Filter queryset of objects connected to scope via generic foreign key, such as quotas or alerts,
+    leaving only objects with scope of given models visible to user.
+
+    Objects are selected with UNION ALL of subqueries per scope content type, so each of them
+    could use index by content type and object id. Objects are not filtered by staff or support status.
+    """
+    branches = []
+    for model in scope_models:
+        scope_ids = filter_queryset_for_user(model.objects.all(), user).order_by().values('pk')
+        content_type = ContentType.objects.get_for_model(model)
+        branches.append(queryset.model._base_manager.filter(
+            content_type=content_type,
+            object_id__in=scope_ids,
+        ).order_by().values('pk'))
+
+    if not branches:
+        return queryset.none()
+
+    return queryset.filter(pk__in=branches[0].union(*branches[1:], all=True))
 
 
 class StructureQueryset(models.QuerySet):
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_permission_closure(apps, schema_editor):
+    CustomerPermission = apps.get_model('structure', 'CustomerPermission')
+    ProjectPermission = apps.get_model('structure', 'ProjectPermission')
+    PermissionClosure = apps.get_model('structure', 'PermissionClosure')
+
+    rows = []
+    for permission in CustomerPermission.objects.filter(is_active=True).iterator():
+        rows.append(PermissionClosure(
+            user_id=permission.user_id,
+            customer_id=permission.customer_id,
+            role=permission.role,
+            expiration_time=permission.expiration_time,
+        ))
+    for permission in ProjectPermission.objects.filter(is_active=True).select_related('project').iterator():
+        rows.append(PermissionClosure(
+            user_id=permission.user_id,
+            customer_id=permission.project.customer_id,
+            project_id=permission.project_id,
+            role=permission.role,
+            expiration_time=permission.expiration_time,
+        ))
+    PermissionClosure.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('structure', '0002_immutable_default_json'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PermissionClosure',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.CharField(max_length=30)),
+                ('expiration_time', models.DateTimeField(blank=True, null=True)),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='structure.Customer')),
+                ('project', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='structure.Project')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='permissionclosure',
+            unique_together=set([('user', 'customer', 'project', 'role')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='permissionclosure',
+            index_together=set([('user', 'project')]),
+        ),
+        migrations.RunPython(fill_permission_closure, reverse_code=migrations.RunPython.noop),
+    ]
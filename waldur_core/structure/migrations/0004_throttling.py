@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import waldur_core.core.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('structure', '0003_permissionclosure'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ThrottleBucket',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('operation', models.CharField(max_length=255)),
+                ('tokens', models.FloatField(default=0)),
+                ('updated', models.DateTimeField(default=django.utils.timezone.now)),
+                ('settings', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='structure.ServiceSettings')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ThrottleLease',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('holder', models.CharField(db_index=True, max_length=255)),
+                ('expires', models.DateTimeField()),
+                ('bucket', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leases', to='structure.ThrottleBucket')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ThrottleWaiter',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('holder', models.CharField(max_length=255)),
+                ('task', waldur_core.core.fields.JSONField()),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+                ('bucket', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waiters', to='structure.ThrottleBucket')),
+            ],
+            options={
+                'ordering': ('created', 'pk'),
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='throttlebucket',
+            unique_together=set([('settings', 'operation')]),
+        ),
+        migrations.AlterUniqueTogether(
+            name='throttlelease',
+            unique_together=set([('bucket', 'holder')]),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+import waldur_core.core.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('structure', '0004_throttling'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StructureCounters',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('counters', waldur_core.core.fields.JSONField(default=dict)),
+                ('modified', models.DateTimeField(auto_now=True)),
+                ('customer', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='structure.Customer')),
+                ('project', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='structure.Project')),
+            ],
+            options={
+                'verbose_name_plural': 'Structure counters',
+            },
+        ),
+    ]
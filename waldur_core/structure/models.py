@@ -9,6 +9,7 @@ from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ObjectDoesNotExist
 from django.core.cache import cache
 from django.core.validators import MaxLengthValidator
 from django.core.validators import MinValueValidator, MaxValueValidator
@@ -33,7 +34,7 @@ from waldur_core.core.validators import validate_name, validate_cidr_list, FileT
 from waldur_core.logging.loggers import LoggableMixin
 from waldur_core.monitoring.models import MonitoringModelMixin
 from waldur_core.quotas import models as quotas_models, fields as quotas_fields
-from waldur_core.structure import SupportedServices
+from waldur_core.structure import SupportedServices, backend_pool
 from waldur_core.structure.images import ImageModelMixin
 from waldur_core.structure.managers import StructureManager, filter_queryset_for_user, \
     ServiceSettingsManager, PrivateServiceSettingsManager, SharedServiceSettingsManager
@@ -84,6 +85,18 @@ class StructureLoggableMixin(LoggableMixin):
         key = core_utils.camel_case_to_underscore(cls.__name__) + '_uuid'
         return {key: uuids}
 
+    def get_permitted_users(self):
+        """ Object is permitted to users of its customer, shared objects are permitted to all users. """
+        permissions = getattr(self, 'Permissions', None)
+        path = getattr(permissions, 'customer_path', None)
+        if not path or getattr(permissions, 'extra_query', None):
+            return None
+        try:
+            customer = self if path == 'self' else reduce(getattr, path.split('__'), self)
+        except ObjectDoesNotExist:
+            return None
+        return customer.get_users()
+
 
 class TagMixin(models.Model):
     """
@@ -501,6 +514,95 @@ class ProjectPermission(core_models.UuidMixin, BasePermission):
         return '%s | %s' % (self.project.name, self.get_role_display())
 
 
+@python_2_unicode_compatible
+class PermissionClosure(models.Model):
+    """
+    Denormalized copy of active customer and project permissions.
+    Customer permission is stored as row without project, project permission is stored
+    together with customer of the project. Rows are kept in sync by signal handlers,
+    so visibility of objects for user could be checked with semi-join by indexed column
+    instead of joins through permissions of each structure.
+    """
+    class Meta(object):
+        unique_together = ('user', 'customer', 'project', 'role')
+        index_together = (('user', 'project'),)
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='+')
+    customer = models.ForeignKey('structure.Customer', related_name='+')
+    project = models.ForeignKey('structure.Project', null=True, blank=True, related_name='+')
+    role = models.CharField(max_length=30)
+    expiration_time = models.DateTimeField(null=True, blank=True)
+
+    @classmethod
+    def sync(cls, permission_model, structure_id, user_id, role):
+        """ Update row of user role in customer or project according to its active permission. """
+        if permission_model is ProjectPermission:
+            lookup = dict(project_id=structure_id, user_id=user_id, role=role)
+            rows = cls.objects.filter(**lookup)
+        else:
+            lookup = dict(customer_id=structure_id, user_id=user_id, role=role)
+            rows = cls.objects.filter(project=None, **lookup)
+
+        permission = permission_model.objects.filter(is_active=True, **lookup).first()
+        if permission is None:
+            rows.delete()
+        elif not rows.update(expiration_time=permission.expiration_time):
+            if permission_model is ProjectPermission:
+                lookup['customer_id'] = permission.project.customer_id
+            cls.objects.create(expiration_time=permission.expiration_time, **lookup)
+
+    @classmethod
+    def get_expected_rows(cls):
+        """ Return set of (user_id, customer_id, project_id, role, expiration_time) for active permissions. """
+        rows = set()
+        customer_permissions = CustomerPermission.objects.filter(is_active=True).values_list(
+            'user_id', 'customer_id', 'role', 'expiration_time')
+        for user_id, customer_id, role, expiration_time in customer_permissions.iterator():
+            rows.add((user_id, customer_id, None, role, expiration_time))
+
+        project_permissions = ProjectPermission.objects.filter(is_active=True).values_list(
+            'user_id', 'project__customer_id', 'project_id', 'role', 'expiration_time')
+        rows.update(project_permissions.iterator())
+        return rows
+
+    @classmethod
+    def get_actual_rows(cls):
+        return set(cls.objects.values_list('user_id', 'customer_id', 'project_id', 'role', 'expiration_time'))
+
+    @classmethod
+    @transaction.atomic()
+    def rebuild(cls):
+        """ Recreate all rows from active permissions and return count of created rows. """
+        cls.objects.all().delete()
+        rows = [cls(user_id=user_id, customer_id=customer_id, project_id=project_id,
+                    role=role, expiration_time=expiration_time)
+                for user_id, customer_id, project_id, role, expiration_time in cls.get_expected_rows()]
+        cls.objects.bulk_create(rows, batch_size=500)
+        return len(rows)
+
+    def __str__(self):
+        return '%s | %s | %s' % (self.user_id, self.project_id or self.customer_id, self.role)
+
+
+@python_2_unicode_compatible
+class StructureCounters(models.Model):
+    """
+    Stored counters of entities related to customer or project, such as projects, resources and alerts.
+    Row has either customer or project. Rows are updated by signal handlers and by periodic task,
+    see waldur_core.structure.counters module.
+    """
+    class Meta(object):
+        verbose_name_plural = 'Structure counters'
+
+    customer = models.OneToOneField('structure.Customer', null=True, blank=True, related_name='+')
+    project = models.OneToOneField('structure.Project', null=True, blank=True, related_name='+')
+    counters = JSONField(default=dict)
+    modified = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return '%s | %s' % (self.customer_id or self.project_id, self.counters)
+
+
 @python_2_unicode_compatible
 class ProjectType(core_models.DescribableMixin, core_models.UuidMixin, core_models.NameMixin):
     class Meta(object):
@@ -708,14 +810,14 @@ class ServiceSettings(quotas_models.ExtendableQuotaModelMixin,
     objects = ServiceSettingsManager('scope')
 
     def get_backend(self, **kwargs):
-        return SupportedServices.get_service_backend(self.type)(self, **kwargs)
+        return backend_pool.get_backend(self, **kwargs)
 
     def get_option(self, name):
         options = self.options or {}
         if name in options:
             return options.get(name)
         else:
-            defaults = self.get_backend().DEFAULTS
+            defaults = SupportedServices.get_service_backend(self.type).DEFAULTS
             return defaults.get(name)
 
     def __str__(self):
@@ -762,6 +864,41 @@ class PrivateServiceSettings(ServiceSettings):
         verbose_name_plural = _('Private provider settings')
 
 
+class ThrottleBucket(models.Model):
+    """ Admission state of operation of service settings, see waldur_core.structure.throttling.
+
+        Row is locked during admission, so concurrent workers admit operations one by one.
+    """
+    settings = models.ForeignKey(ServiceSettings, related_name='+', on_delete=models.CASCADE)
+    operation = models.CharField(max_length=255)
+    tokens = models.FloatField(default=0)
+    updated = models.DateTimeField(default=timezone.now)
+
+    class Meta(object):
+        unique_together = ('settings', 'operation')
+
+
+class ThrottleLease(models.Model):
+    """ Slot of operation of service settings that is held by object until lease is released or expired. """
+    bucket = models.ForeignKey(ThrottleBucket, related_name='leases', on_delete=models.CASCADE)
+    holder = models.CharField(max_length=255, db_index=True)
+    expires = models.DateTimeField()
+
+    class Meta(object):
+        unique_together = ('bucket', 'holder')
+
+
+class ThrottleWaiter(models.Model):
+    """ Task that waits for free slot, waiters are admitted in FIFO order. """
+    bucket = models.ForeignKey(ThrottleBucket, related_name='waiters', on_delete=models.CASCADE)
+    holder = models.CharField(max_length=255)
+    task = JSONField()
+    created = models.DateTimeField(default=timezone.now)
+
+    class Meta(object):
+        ordering = ('created', 'pk')
+
+
 @python_2_unicode_compatible
 class Service(core_models.UuidMixin,
               core_models.DescendantMixin,
@@ -5,11 +5,13 @@ import logging
 from celery import shared_task
 from django.core import exceptions
 from django.db import transaction
+from django.db.models import F
 from django.db.utils import DatabaseError
 import six
 
 from waldur_core.core import utils as core_utils, tasks as core_tasks, models as core_models
-from waldur_core.structure import SupportedServices, models, utils, ServiceBackendError
+from waldur_core.structure import (SupportedServices, counters, models, throttling, utils, ServiceBackendError,
+                                   ServiceBackendNotImplemented)
 
 logger = logging.getLogger(__name__)
 
@@ -48,6 +50,30 @@ def check_expired_permissions():
             permission.revoke()
 
 
+@shared_task(name='waldur_core.structure.update_structure_counters')
+def update_structure_counters():
+    """ Reconcile stored counters of customers and projects with live counts. """
+    if not counters.is_enabled():
+        return
+    fixed = counters.update_all()
+    if fixed:
+        logger.info('Counters of %s customers and projects have been fixed.', fixed)
+
+
+@shared_task(name='waldur_core.structure.update_scopes_counters')
+def update_scopes_counters(serialized_scopes):
+    """ Recalculate stored counters of customers and projects after related entities are changed. """
+    if not counters.is_enabled():
+        return
+    for serialized_scope in serialized_scopes:
+        try:
+            scope = core_utils.deserialize_instance(serialized_scope)
+        except exceptions.ObjectDoesNotExist:
+            # Scope could be deleted after task is scheduled.
+            continue
+        counters.update(scope)
+
+
 class ConnectSharedSettingsTask(core_tasks.Task):
 
     def execute(self, service_settings):
@@ -76,23 +102,51 @@ class BackgroundPullTask(core_tasks.BackgroundTask):
 
     def run(self, serialized_instance):
         instance = core_utils.deserialize_instance(serialized_instance)
+        self.pull_instance(instance)
+
+    def pull_instance(self, instance, backend=None):
         try:
-            self.pull(instance)
+            if backend is None:
+                self.pull(instance)
+            else:
+                self.pull(instance, backend)
         except ServiceBackendError as e:
             self.on_pull_fail(instance, e)
         else:
             self.on_pull_success(instance)
 
-    def is_equal(self, other_task, serialized_instance):
-        return self.name == other_task.get('name') and serialized_instance in other_task.get('args', [])
+    def get_identity(self, serialized_instance):
+        return serialized_instance
 
-    def pull(self, instance):
+    def pull(self, instance, backend=None):
         """ Pull instance from backend.
 
+            Backend is passed if it is shared by instances pulled in batch,
+            otherwise backend of instance should be used.
             This method should not handle backend exception.
         """
         raise NotImplementedError('Pull task should implement pull method.')
 
+    def pull_batch(self, instances):
+        """ Pull instances connected to the same service settings using one backend.
+
+            Backend method "pull_many" is used if it is implemented,
+            otherwise instances are pulled one by one.
+        """
+        try:
+            # Backend is kept in local variable, because task instance is shared by all task runs of worker.
+            backend = instances[0].get_backend()
+            backend.pull_many(instances)
+        except ServiceBackendNotImplemented:
+            for instance in instances:
+                self.pull_instance(instance, backend)
+        except ServiceBackendError as e:
+            for instance in instances:
+                self.on_pull_fail(instance, e)
+        else:
+            for instance in instances:
+                self.on_pull_success(instance)
+
     def on_pull_fail(self, instance, error):
         error_message = six.text_type(error)
         self.log_error_message(instance, error_message)
@@ -122,19 +176,67 @@ class BackgroundPullTask(core_tasks.BackgroundTask):
         instance.save(update_fields=['state', 'error_message'])
 
 
+class BatchPullTask(core_tasks.BackgroundTask):
+    """ Pull chunk of objects by method "pull_batch" of pull task. """
+    name = 'waldur_core.structure.BatchPullTask'
+
+    def get_identity(self, pull_task_name, serialized_instances):
+        return [pull_task_name, serialized_instances]
+
+    def run(self, pull_task_name, serialized_instances):
+        instances = []
+        for serialized_instance in serialized_instances:
+            try:
+                instances.append(core_utils.deserialize_instance(serialized_instance))
+            except exceptions.ObjectDoesNotExist:
+                logger.debug('Skipping pull of missing object %s.', serialized_instance)
+        if instances:
+            self.app.tasks[pull_task_name].pull_batch(instances)
+
+
 class BackgroundListPullTask(core_tasks.BackgroundTask):
-    """ Schedules pull task for each stable object of the model. """
+    """ Schedules pull task for each stable object of the model.
+
+        If batch_size is defined, objects are grouped by service settings and
+        each chunk of batch_size objects is pulled by one task.
+    """
     model = NotImplemented
     pull_task = NotImplemented
+    batch_size = None
+    service_settings_field = 'service_project_link__service__settings'
 
-    def is_equal(self, other_task):
-        return self.name == other_task.get('name')
+    def get_identity(self):
+        return None
 
     def get_pulled_objects(self):
         States = self.model.States
         return self.model.objects.filter(state__in=[States.ERRED, States.OK]).exclude(backend_id='')
 
+    def get_batches(self):
+        """ Yield chunks of serialized objects, objects of chunk are connected to the same service settings. """
+        objects = self.get_pulled_objects()
+        if self.service_settings_field:
+            objects = objects.annotate(batch_key=F(self.service_settings_field)).order_by('batch_key', 'pk')
+        else:
+            objects = objects.order_by('pk')
+
+        batch, batch_key = [], None
+        for instance in objects.iterator():
+            instance_key = getattr(instance, 'batch_key', None)
+            if batch and (instance_key != batch_key or len(batch) >= self.batch_size):
+                yield batch
+                batch = []
+            batch_key = instance_key
+            batch.append(core_utils.serialize_instance(instance))
+        if batch:
+            yield batch
+
     def run(self):
+        if self.batch_size:
+            for batch in self.get_batches():
+                BatchPullTask().apply_async(args=(self.pull_task.name, batch), kwargs={})
+            return
+
         for instance in self.get_pulled_objects():
             serialized = core_utils.serialize_instance(instance)
             self.pull_task().apply_async(args=(serialized,), kwargs={})
@@ -142,15 +244,22 @@ class BackgroundListPullTask(core_tasks.BackgroundTask):
 
 class ServiceSettingsBackgroundPullTask(BackgroundPullTask):
 
-    def pull(self, service_settings):
-        backend = service_settings.get_backend()
+    def pull(self, service_settings, backend=None):
+        backend = backend or service_settings.get_backend()
         backend.sync()
 
+    def pull_batch(self, instances):
+        # Each service settings has its own backend.
+        for service_settings in instances:
+            self.pull_instance(service_settings)
+
 
 class ServiceSettingsListPullTask(BackgroundListPullTask):
     name = 'waldur_core.structure.ServiceSettingsListPullTask'
     model = models.ServiceSettings
     pull_task = ServiceSettingsBackgroundPullTask
+    batch_size = 20
+    service_settings_field = None
 
     def get_pulled_objects(self):
         States = self.model.States
@@ -172,11 +281,52 @@ class RetryUntilAvailableTask(core_tasks.Task):
 
 class BaseThrottleProvisionTask(RetryUntilAvailableTask):
     """
-    Before starting resource provisioning, count how many resources
-    are already in "creating" state and delay provisioning if there are too many of them.
+    Before starting resource provisioning, take provisioning slot of service settings.
+    If there is no free slot, task waits in FIFO queue and it is applied again when slot is
+    released by other resource. Slot is released when resource leaves "creating" state.
+    See waldur_core.structure.throttling for limits configuration.
+
+    Eagerly executed task counts how many resources are already in "creating" state
+    and delays provisioning if there are too many of them.
     """
     DEFAULT_LIMIT = 4
 
+    def pre_execute(self, instance):
+        self.is_waiting = False
+        if not throttling.is_supported(self):
+            return super(BaseThrottleProvisionTask, self).pre_execute(instance)
+
+        service_settings = self.get_service_settings(instance)
+        operation = self.get_operation(instance)
+        limits = throttling.get_limits(service_settings, operation, self.DEFAULT_LIMIT)
+        limits['concurrency'] = self.get_limit(instance)
+        holder = core_utils.serialize_instance(instance)
+        task = throttling.get_task(self, limits)
+        if not throttling.acquire(service_settings, operation, holder, limits, task=task):
+            # Chain is continued by task that is applied when slot is released.
+            self.is_waiting = True
+            self.request.chain = None
+            self.request.callbacks = None
+            return
+        # Skip availability check of RetryUntilAvailableTask
+        super(RetryUntilAvailableTask, self).pre_execute(instance)
+
+    def execute(self, instance, *args, **kwargs):
+        if self.is_waiting:
+            return
+        return super(BaseThrottleProvisionTask, self).execute(instance, *args, **kwargs)
+
+    def post_execute(self, instance, *args, **kwargs):
+        if self.is_waiting:
+            return
+        return super(BaseThrottleProvisionTask, self).post_execute(instance)
+
+    def get_service_settings(self, resource):
+        return resource.service_project_link.service.settings
+
+    def get_operation(self, resource):
+        return 'provision:%s' % resource._meta.label_lower
+
     def is_available(self, resource):
         usage = self.get_usage(resource)
         limit = self.get_limit(resource)
@@ -190,7 +340,19 @@ class BaseThrottleProvisionTask(RetryUntilAvailableTask):
             service_project_link__service__settings=service_settings).count()
 
     def get_limit(self, resource):
-        return self.DEFAULT_LIMIT
+        service_settings = self.get_service_settings(resource)
+        return throttling.get_limits(service_settings, self.get_operation(resource), self.DEFAULT_LIMIT)['concurrency']
+
+
+class ThrottleDispatchTask(core_tasks.BackgroundTask):
+    """ Admit tasks waiting for provisioning slots, it allows to reclaim slots of expired leases. """
+    name = throttling.DISPATCH_TASK_NAME
+
+    def run(self, bucket_id=None):
+        if bucket_id is None:
+            throttling.dispatch_all()
+        else:
+            throttling.dispatch(bucket_id)
 
 
 class ThrottleProvisionTask(BaseThrottleProvisionTask, core_tasks.BackendMethodTask):
@@ -8,10 +8,11 @@ from django.utils import timezone
 from freezegun import freeze_time
 from mock_django import mock_signal_receiver
 from rest_framework import status, test
+from six.moves import mock
 
 from waldur_core.core.tests.helpers import override_waldur_core_settings
 from waldur_core.quotas.tests import factories as quota_factories
-from waldur_core.structure import signals
+from waldur_core.structure import signals, tasks
 from waldur_core.structure.models import Customer, CustomerRole, ProjectRole
 from waldur_core.structure.tests import factories, fixtures
 
@@ -570,6 +571,11 @@ class CustomerCountersListTest(test.APITransactionTestCase):
         self.customer = self.fixture.customer
         self.service = self.fixture.service
         self.url = factories.CustomerFactory.get_url(self.customer, action='counters')
+        # Counters are updated in background task, it is executed synchronously in tests.
+        patcher = mock.patch('waldur_core.structure.counters.send_task',
+                             lambda app_label, task_name: getattr(tasks, task_name))
+        patcher.start()
+        self.addCleanup(patcher.stop)
 
     @data('owner', 'customer_support')
     def test_user_can_get_customer_counters(self, user):
@@ -578,6 +584,20 @@ class CustomerCountersListTest(test.APITransactionTestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data, {'users': 5, 'projects': 1, 'services': 1})
 
+    def test_projects_counter_is_updated_when_project_is_created(self):
+        self.client.force_authenticate(self.owner)
+        self.client.get(self.url, {'fields': ['projects']})
+
+        factories.ProjectFactory(customer=self.customer)
+        response = self.client.get(self.url, {'fields': ['projects']})
+        self.assertEqual(response.data, {'projects': 2})
+
+    def test_counters_are_filtered_for_project_user(self):
+        factories.ProjectFactory(customer=self.customer)
+        self.client.force_authenticate(self.admin)
+        response = self.client.get(self.url, {'fields': ['projects']})
+        self.assertEqual(response.data, {'projects': 1})
+
 
 class UserCustomersFilterTest(test.APITransactionTestCase):
     def setUp(self):
@@ -7,8 +7,10 @@ from mock_django import mock_signal_receiver
 from rest_framework import status, test
 from six.moves import mock
 
+from waldur_core.core import executors as core_executors, tasks as core_tasks, utils as core_utils
+from waldur_core.logging.tests import factories as logging_factories
 from waldur_core.quotas.tests import factories as quota_factories
-from waldur_core.structure import executors, models, signals, views
+from waldur_core.structure import executors, models, signals, tasks, views
 from waldur_core.structure.models import CustomerRole, Project, ProjectRole
 from waldur_core.structure.tests import factories, fixtures, models as test_models
 
@@ -443,6 +445,11 @@ class ProjectCountersListTest(test.APITransactionTestCase):
         self.service = self.fixture.service
         self.resource = self.fixture.resource
         self.url = factories.ProjectFactory.get_url(self.project, action='counters')
+        # Counters are updated in background task, it is executed synchronously in tests.
+        patcher = mock.patch('waldur_core.structure.counters.send_task',
+                             lambda app_label, task_name: getattr(tasks, task_name))
+        patcher.start()
+        self.addCleanup(patcher.stop)
 
     def test_user_can_get_project_counters(self):
         self.client.force_authenticate(self.fixture.owner)
@@ -450,6 +457,47 @@ class ProjectCountersListTest(test.APITransactionTestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data, {'users': 2, 'apps': 0, 'vms': 1})
 
+    def test_counters_are_updated_when_resource_is_created_or_deleted(self):
+        self.client.force_authenticate(self.fixture.owner)
+        response = self.client.get(self.url, {'fields': ['vms']})
+        self.assertEqual(response.data, {'vms': 1})
+
+        factories.TestNewInstanceFactory(service_project_link=self.fixture.service_project_link)
+        response = self.client.get(self.url, {'fields': ['vms']})
+        self.assertEqual(response.data, {'vms': 2})
+
+        self.resource.delete()
+        response = self.client.get(self.url, {'fields': ['vms']})
+        self.assertEqual(response.data, {'vms': 1})
+
+    def test_counters_are_recalculated_in_background_task(self):
+        with mock.patch('waldur_core.structure.counters.send_task') as mocked_send_task:
+            factories.TestNewInstanceFactory(service_project_link=self.fixture.service_project_link)
+
+        mocked_send_task.assert_called_once_with('structure', 'update_scopes_counters')
+        mocked_send_task.return_value.assert_called_once_with([
+            core_utils.serialize_instance(self.project),
+            core_utils.serialize_instance(self.fixture.customer),
+        ])
+
+    def test_alerts_counter_is_updated_when_alert_is_closed(self):
+        alert = logging_factories.AlertFactory(scope=self.resource)
+        self.client.force_authenticate(self.fixture.owner)
+        response = self.client.get(self.url, {'fields': ['alerts']})
+        self.assertEqual(response.data, {'alerts': 1})
+
+        alert.close()
+        response = self.client.get(self.url, {'fields': ['alerts']})
+        self.assertEqual(response.data, {'alerts': 0})
+
+    def test_users_counter_is_updated_when_role_is_granted(self):
+        self.client.force_authenticate(self.fixture.owner)
+        self.client.get(self.url, {'fields': ['users']})
+
+        self.project.add_user(factories.UserFactory(), ProjectRole.ADMINISTRATOR)
+        response = self.client.get(self.url, {'fields': ['users']})
+        self.assertEqual(response.data, {'users': 3})
+
     def test_additional_counters_could_be_registered(self):
         views.ProjectCountersView.register_counter('test', lambda project: 100)
         self.client.force_authenticate(self.fixture.owner)
@@ -583,6 +631,19 @@ class TestExecutor(executors.BaseCleanupExecutor):
     pre_models = (test_models.TestNewInstance,)
 
 
+class TestInstanceDeleteExecutor(core_executors.DeleteExecutor):
+
+    @classmethod
+    def get_task_signature(cls, instance, serialized_instance, **kwargs):
+        return core_tasks.EmptyTask().si()
+
+
+class TestResourceExecutor(executors.BaseCleanupExecutor):
+    executors = (
+        (test_models.TestNewInstance, TestInstanceDeleteExecutor),
+    )
+
+
 @mock.patch('waldur_core.core.WaldurExtension.get_extensions')
 class ProjectCleanupTest(test.APITransactionTestCase):
 
@@ -644,3 +705,80 @@ class ProjectCleanupTest(test.APITransactionTestCase):
 
         self.assertFalse(models.Project.objects.filter(id=project.id).exists())
         self.assertFalse(test_models.TestNewInstance.objects.filter(id=resource.id).exists())
+
+    @mock.patch.object(executors.ProjectResourceCleanupTask, 'replace')
+    def test_resources_of_the_same_model_are_deleted_in_parallel(self, mock_replace, get_extensions):
+        fixture = fixtures.ServiceFixture()
+        for _ in range(3):
+            factories.TestNewInstanceFactory(
+                service_project_link=fixture.service_project_link, state=test_models.TestNewInstance.States.OK)
+        task = executors.ProjectResourceCleanupTask()
+
+        task.push_request(id='task_id', is_eager=False)
+        try:
+            task.run(core_utils.serialize_class(TestInstanceDeleteExecutor),
+                     core_utils.serialize_class(test_models.TestNewInstance),
+                     core_utils.serialize_instance(fixture.project))
+        finally:
+            task.pop_request()
+
+        signature = mock_replace.call_args[0][0]
+        self.assertEqual(signature.subtask_type, 'group')
+        self.assertEqual(len(signature.tasks), 3)
+
+    def test_resources_are_fetched_when_cleanup_step_is_started(self, get_extensions):
+        fixture = fixtures.ServiceFixture()
+        project = fixture.project
+
+        class TestExtension(object):
+            @staticmethod
+            def get_cleanup_executor():
+                return TestResourceExecutor
+
+        get_extensions.return_value = [TestExtension]
+        signature = executors.ProjectCleanupExecutor.get_task_signature(
+            project, core_utils.serialize_instance(project))
+        resource = factories.TestNewInstanceFactory(
+            service_project_link=fixture.service_project_link, state=test_models.TestNewInstance.States.OK)
+
+        result = core_executors.apply_signature_sync(signature)
+        self.assertFalse(result.failed())
+        self.assertFalse(test_models.TestNewInstance.objects.filter(id=resource.id).exists())
+
+    def test_pre_models_are_deleted_when_cleanup_step_is_started(self, get_extensions):
+        fixture = fixtures.ServiceFixture()
+        project = fixture.project
+        resource = fixture.resource
+
+        class TestExtension(object):
+            @staticmethod
+            def get_cleanup_executor():
+                return TestExecutor
+
+        get_extensions.return_value = [TestExtension]
+        executors.ProjectCleanupExecutor.pre_apply(project)
+        signature = executors.ProjectCleanupExecutor.get_task_signature(
+            project, core_utils.serialize_instance(project))
+        self.assertTrue(test_models.TestNewInstance.objects.filter(id=resource.id).exists())
+
+        core_executors.apply_signature_sync(signature)
+        self.assertFalse(test_models.TestNewInstance.objects.filter(id=resource.id).exists())
+
+    def test_project_with_resources_is_deleted_by_resource_executors(self, get_extensions):
+        fixture = fixtures.ServiceFixture()
+        project = fixture.project
+        for _ in range(3):
+            factories.TestNewInstanceFactory(
+                service_project_link=fixture.service_project_link, state=test_models.TestNewInstance.States.OK)
+
+        class TestExtension(object):
+            @staticmethod
+            def get_cleanup_executor():
+                return TestResourceExecutor
+
+        get_extensions.return_value = [TestExtension]
+        executors.ProjectCleanupExecutor.execute(project, async=False)
+
+        self.assertFalse(models.Project.objects.filter(id=project.id).exists())
+        self.assertFalse(test_models.TestNewInstance.objects.filter(
+            service_project_link__project_id=project.id).exists())
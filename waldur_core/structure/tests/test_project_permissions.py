@@ -572,7 +572,7 @@ class GetProjectUsersTest(test.APITransactionTestCase):
 
     def test_get_users_by_default_returns_both_managers_and_admins(self):
         users = list(self.project.get_users())
-        self.assertListEqual(users, [self.admin, self.manager])
+        self.assertListEqual(users, sorted([self.admin, self.manager], key=lambda user: user.username))
 
     def test_get_users_by_returns_admins(self):
         users = list(self.project.get_users(ProjectRole.ADMINISTRATOR))
@@ -0,0 +1,96 @@
+from django.conf import settings
+from django.test import TestCase, override_settings
+from six.moves import mock
+
+from waldur_core.structure import backend_pool
+from waldur_core.structure.tests import TestBackend, factories
+
+
+class BackendPoolTest(TestCase):
+
+    def setUp(self):
+        self.pool = backend_pool.BackendPool(max_size=2, idle_timeout=60)
+        self.settings = factories.ServiceSettingsFactory()
+
+    def test_backend_is_reused(self):
+        backend = self.pool.get_backend(self.settings, TestBackend)
+
+        self.assertIs(self.pool.get_backend(self.settings, TestBackend), backend)
+        self.assertEqual(self.pool.metrics.as_dict()['hits'], 1)
+        self.assertEqual(self.pool.metrics.as_dict()['misses'], 1)
+
+    def test_reused_backend_is_bound_to_settings_of_caller(self):
+        self.pool.get_backend(self.settings, TestBackend)
+        settings_instance = type(self.settings).objects.get(pk=self.settings.pk)
+
+        self.assertIs(self.pool.get_backend(settings_instance, TestBackend).settings, settings_instance)
+
+    def test_backend_is_created_if_credentials_are_changed(self):
+        backend = self.pool.get_backend(self.settings, TestBackend)
+        self.settings.password = 'new password'
+
+        self.assertIsNot(self.pool.get_backend(self.settings, TestBackend), backend)
+
+    def test_backends_with_different_arguments_are_not_shared(self):
+        backend = self.pool.get_backend(self.settings, TestBackend)
+
+        self.assertIsNot(self.pool.get_backend(self.settings, TestBackend, tenant_id='1'), backend)
+
+    def test_least_recently_used_backend_is_evicted(self):
+        backend = self.pool.get_backend(self.settings, TestBackend)
+        self.pool.get_backend(factories.ServiceSettingsFactory(), TestBackend)
+        self.pool.get_backend(self.settings, TestBackend)
+        self.pool.get_backend(factories.ServiceSettingsFactory(), TestBackend)
+
+        self.assertEqual(len(self.pool), 2)
+        self.assertIs(self.pool.get_backend(self.settings, TestBackend), backend)
+
+    @mock.patch('waldur_core.structure.backend_pool.time')
+    def test_idle_backend_is_evicted(self, mock_time):
+        mock_time.time.return_value = 1000
+        backend = self.pool.get_backend(self.settings, TestBackend)
+        mock_time.time.return_value = 1061
+
+        self.assertIsNot(self.pool.get_backend(self.settings, TestBackend), backend)
+        self.assertEqual(self.pool.metrics.as_dict()['evictions'], 1)
+
+
+def override_backend_pool_settings(**kwargs):
+    waldur_settings = settings.WALDUR_CORE.copy()
+    waldur_settings['BACKEND_POOL'] = dict(waldur_settings.get('BACKEND_POOL', {}), **kwargs)
+    return override_settings(WALDUR_CORE=waldur_settings)
+
+
+@override_backend_pool_settings(ENABLED=True)
+class ServiceSettingsBackendTest(TestCase):
+
+    def setUp(self):
+        backend_pool.get_pool().clear()
+        self.settings = factories.ServiceSettingsFactory()
+
+    def test_backend_of_service_settings_is_reused(self):
+        self.assertIs(self.settings.get_backend(), self.settings.get_backend())
+
+    def test_backends_are_evicted_when_connection_fields_are_updated(self):
+        backend = self.settings.get_backend()
+        self.settings.backend_url = 'http://example.com/'
+        self.settings.save()
+
+        self.assertEqual(len(backend_pool.get_pool()), 0)
+        self.assertIsNot(self.settings.get_backend(), backend)
+
+    def test_backends_are_evicted_when_settings_are_deleted(self):
+        self.settings.get_backend()
+        self.settings.delete()
+
+        self.assertEqual(len(backend_pool.get_pool()), 0)
+
+    @override_backend_pool_settings(ENABLED=False)
+    def test_backend_is_not_reused_if_pool_is_disabled(self):
+        self.assertIsNot(self.settings.get_backend(), self.settings.get_backend())
+
+    @mock.patch.object(TestBackend, '__init__', return_value=None)
+    def test_backend_is_not_created_to_get_default_option(self, mock_init):
+        self.settings.get_option('tenant_name')
+
+        self.assertFalse(mock_init.called)
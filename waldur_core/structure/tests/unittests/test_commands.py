@@ -2,11 +2,14 @@
 from __future__ import unicode_literals
 
 from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.test import TestCase
 import six
 from six import StringIO
 
-from .. import factories
+from waldur_core.structure import counters, models
+
+from .. import factories, fixtures
 
 
 class DumpUsersCommandTest(TestCase):
@@ -22,3 +25,69 @@ class DumpUsersCommandTest(TestCase):
         if not isinstance(value, six.text_type):
             value = value.decode('utf-8')
         self.assertIn(user.full_name, value)
+
+
+class RebuildPermissionClosureCommandTest(TestCase):
+
+    def setUp(self):
+        self.fixture = fixtures.ProjectFixture()
+        self.owner = self.fixture.owner
+        self.admin = self.fixture.admin
+
+    def test_missing_and_stale_rows_are_fixed(self):
+        models.PermissionClosure.objects.filter(user=self.owner).delete()
+        models.PermissionClosure.objects.create(
+            user=self.fixture.user, customer=self.fixture.customer, role=models.CustomerRole.OWNER)
+
+        call_command('rebuild_permission_closure', stdout=StringIO())
+
+        self.assertEqual(models.PermissionClosure.get_actual_rows(), models.PermissionClosure.get_expected_rows())
+        self.assertEqual(models.PermissionClosure.objects.count(), 2)
+
+    def test_inconsistent_table_is_reported_in_verify_only_mode(self):
+        models.PermissionClosure.objects.filter(user=self.admin).delete()
+        output = StringIO()
+
+        with self.assertRaises(CommandError):
+            call_command('rebuild_permission_closure', verify_only=True, stdout=output)
+
+        self.assertIn('Missing row: user %s' % self.admin.id, output.getvalue())
+
+    def test_consistent_table_passes_verification(self):
+        output = StringIO()
+
+        call_command('rebuild_permission_closure', verify_only=True, stdout=output)
+
+        self.assertIn('permission closure is consistent', output.getvalue())
+
+
+class VerifyStructureCountersCommandTest(TestCase):
+
+    def setUp(self):
+        self.fixture = fixtures.ServiceFixture()
+        self.project = self.fixture.project
+        self.resource = self.fixture.resource
+
+    def test_inconsistent_counters_are_reported(self):
+        counters.store(self.project, dict(counters.count(self.project), vms=10))
+        output = StringIO()
+
+        with self.assertRaises(CommandError):
+            call_command('verify_structure_counters', stdout=output)
+
+        self.assertIn('Project %s, vms: stored 10, live 1' % self.project.uuid.hex, output.getvalue())
+
+    def test_inconsistent_counters_are_fixed(self):
+        counters.store(self.project, dict(counters.count(self.project), vms=10))
+
+        call_command('verify_structure_counters', fix=True, stdout=StringIO())
+
+        self.assertEqual(counters.get_stored(self.project)['vms'], 1)
+
+    def test_consistent_counters_pass_verification(self):
+        counters.update(self.project)
+        output = StringIO()
+
+        call_command('verify_structure_counters', stdout=output)
+
+        self.assertIn('structure counters are consistent', output.getvalue())
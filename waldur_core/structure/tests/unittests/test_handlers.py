@@ -1,9 +1,12 @@
+from datetime import timedelta
+
 from django.test import TestCase
+from django.utils import timezone
 from six.moves import mock
 
 from .. import factories, fixtures
 
-from waldur_core.structure import models as structure_models
+from waldur_core.structure import managers, models as structure_models
 
 
 class LogProjectSaveTest(TestCase):
@@ -135,3 +138,76 @@ class LogRoleEventTest(TestCase):
                     'role_name': 'Manager',
                 },
             )
+
+
+class PermissionClosureTest(TestCase):
+
+    def setUp(self):
+        self.fixture = fixtures.ServiceFixture()
+        self.user = self.fixture.user
+
+    def get_rows(self):
+        return set(structure_models.PermissionClosure.objects.filter(user=self.user).values_list(
+            'customer_id', 'project_id', 'role'))
+
+    def test_row_is_created_when_customer_role_is_granted(self):
+        self.fixture.customer.add_user(self.user, structure_models.CustomerRole.OWNER)
+
+        self.assertEqual(self.get_rows(), {(self.fixture.customer.id, None, structure_models.CustomerRole.OWNER)})
+
+    def test_row_is_created_with_customer_when_project_role_is_granted(self):
+        self.fixture.project.add_user(self.user, structure_models.ProjectRole.ADMINISTRATOR)
+
+        self.assertEqual(self.get_rows(), {(self.fixture.customer.id, self.fixture.project.id,
+                                            structure_models.ProjectRole.ADMINISTRATOR)})
+
+    def test_row_is_deleted_when_role_is_revoked(self):
+        self.fixture.project.add_user(self.user, structure_models.ProjectRole.ADMINISTRATOR)
+        self.fixture.project.add_user(self.user, structure_models.ProjectRole.MANAGER)
+
+        self.fixture.project.remove_user(self.user, structure_models.ProjectRole.ADMINISTRATOR)
+
+        self.assertEqual(self.get_rows(), {(self.fixture.customer.id, self.fixture.project.id,
+                                            structure_models.ProjectRole.MANAGER)})
+
+    def test_row_expiration_time_is_updated_with_permission(self):
+        permission, _ = self.fixture.customer.add_user(self.user, structure_models.CustomerRole.OWNER)
+        permission.expiration_time = timezone.now() + timedelta(days=1)
+        permission.save()
+
+        row = structure_models.PermissionClosure.objects.get(user=self.user)
+        self.assertEqual(row.expiration_time, permission.expiration_time)
+
+    def test_rows_are_deleted_when_project_is_deleted(self):
+        self.fixture.project.add_user(self.user, structure_models.ProjectRole.ADMINISTRATOR)
+
+        self.fixture.project.delete()
+
+        self.assertEqual(self.get_rows(), set())
+
+    def test_row_customer_is_updated_when_project_is_moved(self):
+        self.fixture.project.add_user(self.user, structure_models.ProjectRole.ADMINISTRATOR)
+        new_customer = factories.CustomerFactory()
+
+        self.fixture.project.customer = new_customer
+        self.fixture.project.save()
+
+        self.assertEqual(self.get_rows(), {(new_customer.id, self.fixture.project.id,
+                                            structure_models.ProjectRole.ADMINISTRATOR)})
+
+    def test_permission_closure_filter_returns_the_same_objects_as_permissions_filter(self):
+        self.fixture.project.add_user(self.user, structure_models.ProjectRole.ADMINISTRATOR)
+        other_fixture = fixtures.ServiceFixture()
+        other_fixture.customer.add_user(self.user, structure_models.CustomerRole.OWNER)
+        for fixture in (self.fixture, other_fixture):
+            fixture.resource
+            factories.ProjectFactory(customer=fixture.customer)
+            factories.TestServiceProjectLinkFactory(service=fixture.service)
+
+        for model in (structure_models.Customer, structure_models.Project, structure_models.ProjectPermission,
+                      self.fixture.service.__class__, self.fixture.resource.__class__):
+            queryset = model.objects.all()
+            expected = managers.filter_queryset_by_permissions(queryset, self.user).order_by('pk')
+            actual = managers.filter_queryset_by_permission_closure(queryset, self.user).order_by('pk')
+            self.assertEqual(list(expected), list(actual))
+            self.assertFalse(actual.query.distinct)
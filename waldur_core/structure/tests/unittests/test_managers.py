@@ -0,0 +1,156 @@
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from waldur_core.core import managers as core_managers
+from waldur_core.quotas import models as quotas_models
+from waldur_core.structure import managers, models
+from waldur_core.structure.tests import factories, fixtures, models as test_models
+
+
+class FilterScopeQuerysetForUserTest(TestCase):
+
+    def setUp(self):
+        self.fixture = fixtures.ServiceFixture()
+        self.other_fixture = fixtures.ServiceFixture()
+        self.scope_models = [models.Customer, models.Project, self.fixture.resource.__class__]
+        self.other_fixture.resource
+
+    def filter_quotas(self, user):
+        return managers.filter_scope_queryset_for_user(quotas_models.Quota.objects.all(), user, self.scope_models)
+
+    def get_scopes(self, quotas):
+        return {quota.scope for quota in quotas}
+
+    def test_project_admin_can_see_quotas_of_project_its_customer_and_resources(self):
+        quotas = self.filter_quotas(self.fixture.admin)
+
+        self.assertEqual(self.get_scopes(quotas), {self.fixture.customer, self.fixture.project, self.fixture.resource})
+
+    def test_customer_owner_can_see_quotas_of_customer_projects_and_resources(self):
+        quotas = self.filter_quotas(self.fixture.owner)
+
+        self.assertEqual(self.get_scopes(quotas), {self.fixture.customer, self.fixture.project, self.fixture.resource})
+
+    def test_quotas_of_scopes_of_other_models_are_not_returned(self):
+        quotas = managers.filter_scope_queryset_for_user(
+            quotas_models.Quota.objects.all(), self.fixture.owner, [models.Project])
+
+        self.assertEqual(self.get_scopes(quotas), {self.fixture.project})
+
+    def test_user_without_permissions_can_not_see_quotas(self):
+        self.assertFalse(self.filter_quotas(factories.UserFactory()).exists())
+
+    def test_quotas_are_filtered_with_one_query(self):
+        owner = self.fixture.owner
+
+        with CaptureQueriesContext(connection) as context:
+            list(self.filter_quotas(owner))
+
+        self.assertEqual(len([query for query in context.captured_queries
+                              if query['sql'].startswith('SELECT')]), 1)
+
+    def test_filtered_queryset_is_not_extended(self):
+        quotas = quotas_models.Quota.objects.filter(content_type=ContentType.objects.get_for_model(models.Project))
+
+        filtered_quotas = managers.filter_scope_queryset_for_user(quotas, self.fixture.owner, self.scope_models)
+
+        self.assertEqual(self.get_scopes(filtered_quotas), {self.fixture.project})
+
+
+class SummaryQuerySetTest(TestCase):
+
+    def setUp(self):
+        self.instances_link = factories.TestServiceProjectLinkFactory()
+        self.volumes_link = factories.TestServiceProjectLinkFactory()
+        self.instances = [factories.TestNewInstanceFactory(service_project_link=self.instances_link, name=name)
+                          for name in ('b', 'D', 'f')]
+        self.volumes = [factories.TestVolumeFactory(service_project_link=self.volumes_link, name=name)
+                        for name in ('a', 'C', 'e')]
+        self.summary_models = [test_models.TestNewInstance, test_models.TestVolume]
+
+    def get_summary_queryset(self):
+        return core_managers.SummaryQuerySet(self.summary_models)
+
+    def get_names(self, objects):
+        return [obj.name for obj in objects]
+
+    def test_count_is_calculated_with_one_query(self):
+        with CaptureQueriesContext(connection) as context:
+            count = self.get_summary_queryset().count()
+
+        self.assertEqual(count, 6)
+        self.assertEqual(len(context.captured_queries), 1)
+
+    def test_counts_per_queryset_are_calculated_with_one_query(self):
+        queryset = self.get_summary_queryset().filter(name__in=['a', 'b', 'D'])
+
+        with CaptureQueriesContext(connection) as context:
+            counts = queryset.count_per_queryset()
+
+        self.assertEqual(counts, [2, 1])
+        self.assertEqual(len(context.captured_queries), 1)
+
+    def test_count_of_empty_queryset_is_zero(self):
+        queryset = self.get_summary_queryset().filter(name__in=['a', 'C'])
+
+        self.assertEqual(queryset.count_per_queryset(), [0, 2])
+
+    def test_objects_are_ordered_across_models_case_insensitively(self):
+        queryset = self.get_summary_queryset().order_by('name')
+
+        self.assertEqual(self.get_names(queryset[:]), ['a', 'b', 'C', 'D', 'e', 'f'])
+        self.assertEqual(self.get_names(queryset.order_by('-name')[1:3]), ['e', 'D'])
+
+    def test_common_ordering_of_querysets_is_used(self):
+        queryset = self.get_summary_queryset()
+        queryset.querysets = [qs.order_by('-name') for qs in queryset.querysets]
+
+        self.assertEqual(self.get_names(queryset[:2]), ['f', 'e'])
+
+    def test_only_page_objects_are_fetched(self):
+        queryset = self.get_summary_queryset().order_by('name')
+
+        with CaptureQueriesContext(connection) as context:
+            objects = queryset[4:6]
+
+        self.assertEqual(self.get_names(objects), ['e', 'f'])
+        # one query for page rows and one query per model of page objects
+        self.assertEqual(len(context.captured_queries), 3)
+
+    def test_objects_are_filtered(self):
+        queryset = self.get_summary_queryset().filter(name__in=['a', 'b']).order_by('name')
+
+        self.assertEqual(self.get_names(queryset[:]), ['a', 'b'])
+        self.assertEqual(queryset.count(), 2)
+
+    def test_index_out_of_range_raises_index_error(self):
+        with self.assertRaises(IndexError):
+            self.get_summary_queryset()[6]
+
+    def test_keyset_pagination_returns_all_objects_in_order(self):
+        queryset = self.get_summary_queryset().order_by('-name')
+
+        names = []
+        objects, cursor = queryset.get_page(size=4)
+        names.extend(self.get_names(objects))
+        objects, next_cursor = queryset.get_page(size=4, cursor=cursor)
+        names.extend(self.get_names(objects))
+
+        self.assertEqual(names, ['f', 'e', 'D', 'C', 'b', 'a'])
+        self.assertIsNone(next_cursor)
+
+    def test_keyset_pagination_orders_null_values_first(self):
+        models.ServiceSettings.objects.filter(pk=self.instances_link.service.settings.pk).update(domain=None)
+        models.ServiceSettings.objects.filter(pk=self.volumes_link.service.settings.pk).update(domain='domain')
+        queryset = self.get_summary_queryset().order_by('service_project_link__service__settings__domain', 'name')
+
+        objects, cursor = queryset.get_page(size=2)
+        next_objects, _ = queryset.get_page(size=10, cursor=cursor)
+
+        self.assertEqual(self.get_names(objects + next_objects), ['b', 'D', 'f', 'a', 'C', 'e'])
+
+    def test_invalid_cursor_is_rejected(self):
+        with self.assertRaises(ValueError):
+            self.get_summary_queryset().get_page(size=2, cursor='invalid')
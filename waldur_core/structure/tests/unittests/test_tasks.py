@@ -61,3 +61,68 @@ class ThrottleProvisionTaskTest(TestCase):
             'create',
             state_transition='begin_starting').apply()
         self.assertEqual(mocked_retry.called, params['retried'])
+
+
+class TestInstancePullTask(tasks.BackgroundPullTask):
+
+    def pull(self, instance, backend=None):
+        (backend or instance.get_backend()).pull_instance(instance)
+
+
+class TestInstanceListPullTask(tasks.BackgroundListPullTask):
+    model = models.TestNewInstance
+    pull_task = TestInstancePullTask
+    batch_size = 2
+
+
+class BatchPullTaskTest(TestCase):
+
+    def setUp(self):
+        self.link = factories.TestServiceProjectLinkFactory()
+        self.instances = factories.TestNewInstanceFactory.create_batch(
+            size=3, service_project_link=self.link, state=models.TestNewInstance.States.OK, backend_id='id')
+        self.other_instance = factories.TestNewInstanceFactory(
+            state=models.TestNewInstance.States.OK, backend_id='id')
+
+    def test_objects_are_grouped_by_service_settings_and_chunked(self):
+        batches = list(TestInstanceListPullTask().get_batches())
+
+        self.assertEqual(batches, [
+            [utils.serialize_instance(instance) for instance in self.instances[:2]],
+            [utils.serialize_instance(self.instances[2])],
+            [utils.serialize_instance(self.other_instance)],
+        ])
+
+    @mock.patch('waldur_core.structure.tasks.BatchPullTask.apply_async')
+    def test_one_task_is_scheduled_per_chunk(self, mock_apply_async):
+        TestInstanceListPullTask().run()
+
+        self.assertEqual(mock_apply_async.call_count, 3)
+
+    @mock.patch.object(models.TestNewInstance, 'get_backend')
+    def test_backend_bulk_method_is_used_if_it_is_implemented(self, mock_get_backend):
+        TestInstancePullTask().pull_batch(self.instances)
+
+        backend = mock_get_backend.return_value
+        backend.pull_many.assert_called_once_with(self.instances)
+        self.assertFalse(backend.pull_instance.called)
+
+    @mock.patch.object(models.TestNewInstance, 'get_backend')
+    def test_instances_are_pulled_one_by_one_using_shared_backend(self, mock_get_backend):
+        backend = mock_get_backend.return_value
+        backend.pull_many.side_effect = tasks.ServiceBackendNotImplemented
+
+        TestInstancePullTask().pull_batch(self.instances)
+
+        self.assertEqual(mock_get_backend.call_count, 1)
+        self.assertEqual(backend.pull_instance.call_count, 3)
+
+    @mock.patch.object(models.TestNewInstance, 'get_backend')
+    def test_instances_are_marked_as_erred_if_bulk_pull_fails(self, mock_get_backend):
+        mock_get_backend.return_value.pull_many.side_effect = tasks.ServiceBackendError('Error')
+
+        TestInstancePullTask().pull_batch(self.instances)
+
+        for instance in self.instances:
+            instance.refresh_from_db()
+            self.assertEqual(instance.state, models.TestNewInstance.States.ERRED)
@@ -0,0 +1,93 @@
+import datetime
+
+from django.test import TestCase
+from django.utils import timezone
+from six.moves import mock
+
+from waldur_core.structure import models, throttling
+from waldur_core.structure.tests import factories
+
+
+@mock.patch('waldur_core.structure.throttling.signature')
+class ThrottlingTest(TestCase):
+
+    def setUp(self):
+        self.settings = factories.ServiceSettingsFactory()
+        self.limits = {'concurrency': 2, 'rate': None, 'burst': 1}
+
+    def acquire(self, holder, limits=None):
+        task = {'name': 'task', 'args': [holder], 'kwargs': {}, 'options': {}, 'limits': limits or self.limits}
+        return throttling.acquire(self.settings, 'provision', holder, limits or self.limits, task=task)
+
+    def test_operations_are_admitted_until_concurrency_is_reached(self, mock_signature):
+        self.assertTrue(self.acquire('first'))
+        self.assertTrue(self.acquire('second'))
+        self.assertFalse(self.acquire('third'))
+
+        self.assertEqual(throttling.get_queue_length(self.settings, 'provision'), 1)
+
+    def test_waiting_tasks_are_applied_in_fifo_order_when_slot_is_released(self, mock_signature):
+        self.acquire('first')
+        self.acquire('second')
+        self.acquire('third')
+        self.acquire('fourth')
+
+        throttling.release('first')
+
+        mock_signature.assert_called_once_with('task', args=['third'], kwargs={}, app=mock.ANY)
+        self.assertTrue(self.acquire('third'))
+        self.assertEqual(throttling.get_queue_length(self.settings, 'provision'), 1)
+
+    def test_new_operation_waits_if_queue_is_not_empty(self, mock_signature):
+        self.acquire('first')
+        self.acquire('second')
+        self.acquire('third')
+        models.ThrottleLease.objects.filter(holder='first').delete()
+
+        self.assertFalse(self.acquire('fourth'))
+
+    def test_expired_lease_is_reclaimed(self, mock_signature):
+        self.acquire('first')
+        self.acquire('second')
+        models.ThrottleLease.objects.filter(holder='first').update(
+            expires=timezone.now() - datetime.timedelta(seconds=1))
+
+        self.assertTrue(self.acquire('third'))
+
+    @mock.patch('waldur_core.structure.throttling.current_app')
+    def test_dispatch_is_scheduled_when_token_is_available(self, mock_app, mock_signature):
+        limits = {'concurrency': 10, 'rate': 0.5, 'burst': 1}
+        self.assertTrue(self.acquire('first', limits))
+        self.assertFalse(self.acquire('second', limits))
+
+        throttling.dispatch_all()
+
+        self.assertFalse(mock_signature.called)
+        self.assertEqual(mock_app.send_task.call_count, 1)
+        self.assertGreater(mock_app.send_task.call_args[1]['countdown'], 0)
+
+    def test_limits_are_defined_by_service_settings_options(self, mock_signature):
+        self.settings.options = {'throttling': {'provision': {'concurrency': 1, 'rate': 0.1}}}
+
+        limits = throttling.get_limits(self.settings, 'provision:structure_tests.testnewinstance')
+
+        self.assertEqual(limits['concurrency'], 1)
+        self.assertEqual(limits['rate'], 0.1)
+
+
+class ThrottlingSupportTest(TestCase):
+
+    def setUp(self):
+        self.task = mock.Mock()
+        self.task.request.id = 'task_id'
+        self.task.request.is_eager = False
+        self.task.request.chord = None
+
+    def test_task_of_chain_is_throttled(self):
+        self.assertTrue(throttling.is_supported(self.task))
+
+    def test_task_of_group_is_not_throttled(self):
+        # Chord body is called when task of chord header returns, so chain could not be suspended.
+        self.task.request.chord = {'task': 'next_wave'}
+
+        self.assertFalse(throttling.is_supported(self.task))
@@ -0,0 +1,235 @@
+""" Distributed limiter of concurrent operations of service settings.
+
+Operation of service settings, for example resource provisioning, is admitted only if there is
+free slot and, if rate is limited, token in the bucket. Slot is held by object until it is
+released or lease expires in LEASE_TIMEOUT seconds, so slots of crashed workers are reclaimed.
+Tasks that are not admitted wait in FIFO queue without retries, they are applied again when
+slot is released. State is stored in database and rows of bucket are locked during admission.
+
+Limits are defined per service settings by "throttling" option, for example:
+    {"throttling": {"provision": {"concurrency": 2, "rate": 0.1, "burst": 2}}}
+where rate is number of admissions per second and burst is maximal number of stored tokens.
+
+Default limits:
+    WALDUR_CORE['THROTTLING'] = {
+        'ENABLED': True,
+        'CONCURRENCY': 4,
+        'RATE': None,
+        'BURST': 1,
+        'LEASE_TIMEOUT': 60 * 60,
+    }
+"""
+from __future__ import unicode_literals
+
+import datetime
+import logging
+import threading
+
+from celery import current_app, signature
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from waldur_core.structure import models
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_THROTTLING_SETTINGS = {
+    'ENABLED': True,
+    'CONCURRENCY': 4,
+    'RATE': None,
+    'BURST': 1,
+    'LEASE_TIMEOUT': 60 * 60,
+}
+
+DISPATCH_TASK_NAME = 'waldur_core.structure.ThrottleDispatchTask'
+
+
+def get_throttling_settings():
+    return dict(DEFAULT_THROTTLING_SETTINGS, **settings.WALDUR_CORE.get('THROTTLING', {}))
+
+
+def get_limits(service_settings, operation, default_concurrency=None):
+    """ Return limits of operation defined by service settings options or by default settings.
+        Operation could be qualified by model, for example "provision:openstack.instance",
+        in this case limits of general operation "provision" are used if specific ones are not defined.
+    """
+    conf = get_throttling_settings()
+    options = (service_settings.options or {}).get('throttling') or {}
+    limits = options.get(operation) or options.get(operation.split(':')[0]) or {}
+    if default_concurrency is None:
+        default_concurrency = conf['CONCURRENCY']
+    return {
+        'concurrency': limits.get('concurrency', default_concurrency),
+        'rate': limits.get('rate', conf['RATE']),
+        'burst': limits.get('burst', conf['BURST']),
+    }
+
+
+class ThrottlingMetrics(object):
+    """ Thread safe counters of limiter. """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.admitted = 0
+            self.queued = 0
+            self.total_wait_time = 0.0
+            self.max_wait_time = 0.0
+
+    def record_admission(self, wait_time):
+        with self._lock:
+            self.admitted += 1
+            self.total_wait_time += wait_time
+            self.max_wait_time = max(self.max_wait_time, wait_time)
+
+    def record_queued(self):
+        with self._lock:
+            self.queued += 1
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'admitted': self.admitted,
+                'queued': self.queued,
+                'average_wait_time': self.total_wait_time / self.admitted if self.admitted else 0.0,
+                'max_wait_time': self.max_wait_time,
+            }
+
+
+metrics = ThrottlingMetrics()
+
+
+def get_queue_length(service_settings, operation):
+    return models.ThrottleWaiter.objects.filter(bucket__settings=service_settings, bucket__operation=operation).count()
+
+
+def is_supported(task):
+    """ Eagerly executed tasks are not queued, because their chain is not passed in request.
+        Tasks of chord header are not queued too, because chord body is called on their return.
+    """
+    request = task.request
+    return (get_throttling_settings()['ENABLED'] and bool(request.id) and
+            not request.is_eager and not request.chord)
+
+
+def get_task(task, limits):
+    """ Return description of task that allows to apply it again with the same chain and callbacks. """
+    request = task.request
+    return {
+        'name': task.name,
+        'args': list(request.args or []),
+        'kwargs': request.kwargs or {},
+        'options': {
+            'chain': request.chain,
+            'link': request.callbacks,
+            'link_error': request.errbacks,
+            'root_id': request.root_id,
+            'parent_id': request.parent_id,
+        },
+        'limits': limits,
+    }
+
+
+def _lock_bucket(service_settings, operation, limits):
+    bucket, _ = models.ThrottleBucket.objects.get_or_create(
+        settings=service_settings, operation=operation, defaults={'tokens': limits['burst'] or 0})
+    return models.ThrottleBucket.objects.select_for_update().get(pk=bucket.pk)
+
+
+def _take(bucket, limits, now):
+    """ Take slot and token of bucket. Return None if they are taken,
+        otherwise return number of seconds until token is available or 0 if there is no free slot.
+    """
+    if bucket.leases.filter(expires__gt=now).count() >= limits['concurrency']:
+        return 0
+    rate = limits['rate']
+    if rate:
+        elapsed = max((now - bucket.updated).total_seconds(), 0)
+        bucket.tokens = min(limits['burst'], bucket.tokens + elapsed * rate)
+        bucket.updated = now
+        if bucket.tokens < 1:
+            return (1 - bucket.tokens) / rate
+        bucket.tokens -= 1
+    return None
+
+
+def _lease(bucket, holder, now):
+    expires = now + datetime.timedelta(seconds=get_throttling_settings()['LEASE_TIMEOUT'])
+    models.ThrottleLease.objects.update_or_create(bucket=bucket, holder=holder, defaults={'expires': expires})
+
+
+def acquire(service_settings, operation, holder, limits, task=None):
+    """ Take slot of operation for holder, return True if holder is admitted.
+        If there is no free slot or other tasks are waiting, task is queued
+        and it is applied again when holder is admitted.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        bucket = _lock_bucket(service_settings, operation, limits)
+        bucket.leases.filter(expires__lte=now).delete()
+        if bucket.leases.filter(holder=holder).exists():
+            # Holder has been admitted while it was waiting.
+            return True
+        if not bucket.waiters.exists() and _take(bucket, limits, now) is None:
+            bucket.save(update_fields=['tokens', 'updated'])
+            _lease(bucket, holder, now)
+            metrics.record_admission(0)
+            return True
+        bucket.save(update_fields=['tokens', 'updated'])
+        if task is not None:
+            models.ThrottleWaiter.objects.create(bucket=bucket, holder=holder, task=task)
+            metrics.record_queued()
+    return False
+
+
+def release(holder):
+    """ Release slots held by holder and admit waiting tasks. """
+    leases = models.ThrottleLease.objects.filter(holder=holder)
+    bucket_ids = list(leases.values_list('bucket_id', flat=True))
+    if not bucket_ids:
+        return
+    leases.delete()
+    for bucket_id in bucket_ids:
+        dispatch(bucket_id)
+
+
+def dispatch(bucket_id):
+    """ Admit waiting tasks of bucket in FIFO order while slots and tokens are available. """
+    now = timezone.now()
+    admitted = []
+    retry_after = None
+    with transaction.atomic():
+        try:
+            bucket = models.ThrottleBucket.objects.select_for_update().get(pk=bucket_id)
+        except models.ThrottleBucket.DoesNotExist:
+            return
+        bucket.leases.filter(expires__lte=now).delete()
+        for waiter in bucket.waiters.all():
+            wait = _take(bucket, waiter.task['limits'], now)
+            if wait is not None:
+                retry_after = wait or None
+                break
+            _lease(bucket, waiter.holder, now)
+            admitted.append(waiter)
+            waiter.delete()
+        bucket.save(update_fields=['tokens', 'updated'])
+
+    for waiter in admitted:
+        metrics.record_admission((now - waiter.created).total_seconds())
+        task = waiter.task
+        options = {key: value for key, value in task['options'].items() if value}
+        signature(task['name'], args=task['args'], kwargs=task['kwargs'], app=current_app).apply_async(**options)
+    if retry_after is not None:
+        # Rate is limited, check bucket again when token is available.
+        current_app.send_task(DISPATCH_TASK_NAME, args=(bucket_id,), countdown=retry_after)
+
+
+def dispatch_all():
+    """ Admit waiting tasks of all buckets, it allows to reclaim expired leases. """
+    bucket_ids = models.ThrottleWaiter.objects.order_by().values_list('bucket_id', flat=True).distinct()
+    for bucket_id in list(bucket_ids):
+        dispatch(bucket_id)
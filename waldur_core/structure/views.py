@@ -7,6 +7,7 @@ from functools import partial
 
 from django.conf import settings as django_settings
 from django.contrib import auth
+from django.contrib.contenttypes.models import ContentType
 from django.db import transaction, IntegrityError
 from django.db.models import Q
 from django.http import Http404
@@ -21,7 +22,6 @@ from rest_framework import serializers as rf_serializers
 from rest_framework.decorators import detail_route, list_route
 from rest_framework.exceptions import PermissionDenied, MethodNotAllowed, NotFound, APIException, ValidationError
 from rest_framework.response import Response
-from reversion.models import Version
 import six
 
 from waldur_core.core import managers as core_managers
@@ -34,10 +34,11 @@ from waldur_core.core import views as core_views
 from waldur_core.core.utils import datetime_to_timestamp, sort_dict
 from waldur_core.logging import models as logging_models
 from waldur_core.logging.loggers import expand_alert_groups
+from waldur_core.quotas import history as quotas_history
 from waldur_core.quotas.models import QuotaModelMixin, Quota
 from waldur_core.structure import (
     SupportedServices, ServiceBackendError, ServiceBackendNotImplemented,
-    filters, managers, models, permissions, serializers)
+    counters as structure_counters, filters, managers, models, permissions, serializers)
 from waldur_core.structure.managers import filter_queryset_for_user
 from waldur_core.structure.metadata import ActionsMetadata
 from waldur_core.structure.signals import resource_imported, structure_role_updated
@@ -658,6 +659,8 @@ class ProjectPermissionLogViewSet(mixins.RetrieveModelMixin,
     serializer_class = serializers.ProjectPermissionLogSerializer
     filter_backends = (filters.GenericRoleFilter, DjangoFilterBackend,)
     filter_class = filters.ProjectPermissionFilter
+    pagination_ordering = ('-created',)
+    pagination_approximate_count = True
 
 
 class CustomerPermissionViewSet(BasePermissionViewSet):
@@ -732,6 +735,8 @@ class CustomerPermissionLogViewSet(mixins.RetrieveModelMixin,
     serializer_class = serializers.CustomerPermissionLogSerializer
     filter_backends = (filters.GenericRoleFilter, DjangoFilterBackend,)
     filter_class = filters.CustomerPermissionFilter
+    pagination_ordering = ('-created',)
+    pagination_approximate_count = True
 
 
 class CreationTimeStatsView(views.APIView):
@@ -1144,8 +1149,9 @@ class ResourceSummaryViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
             }
         """
         queryset = self.filter_queryset(self.get_queryset())
-        return Response({SupportedServices.get_name_for_model(qs.model): qs.count()
-                         for qs in queryset.querysets})
+        counts = queryset.count_per_queryset()
+        return Response({SupportedServices.get_name_for_model(qs.model): count
+                         for qs, count in zip(queryset.querysets, counts)})
 
 
 class ServicesViewSet(mixins.ListModelMixin,
@@ -1209,8 +1215,25 @@ class BaseCounterView(viewsets.GenericViewSet):
     def get_fields(self):
         raise NotImplementedError()
 
+    def can_use_stored_counters(self):
+        """ Stored counters are not filtered by permissions, so user should be able to see all counted entities. """
+        return False
+
+    @cached_property
+    def stored_counters(self):
+        if not structure_counters.is_enabled() or not self.can_use_stored_counters():
+            return None
+        return structure_counters.get(self.object)
+
+    def _get_counter(self, name, func):
+        if self.stored_counters is not None:
+            return self.stored_counters[name]
+        return func()
+
     def _get_alerts(self, aggregate_by):
         alert_types_to_exclude = expand_alert_groups(self.request.query_params.getlist('exclude_features'))
+        if self.stored_counters is not None:
+            return structure_counters.get_alerts_count(self.stored_counters, alert_types_to_exclude)
         return filters.filter_alerts_by_aggregate(
             logging_models.Alert.objects,
             aggregate_by,
@@ -1250,18 +1273,22 @@ class CustomerCountersView(BaseCounterView):
             'users': self.get_users
         }
 
+    def can_use_stored_counters(self):
+        user = self.request.user
+        return user.is_staff or user.is_support or self.object.has_user(user)
+
     def get_alerts(self):
         return self._get_alerts('customer')
 
     def get_users(self):
-        return self.object.get_users().count()
+        return self._get_counter('users', lambda: self.object.get_users().count())
 
     def get_projects(self):
-        return self._count_model(models.Project)
+        return self._get_counter('projects', lambda: self._count_model(models.Project))
 
     def get_services(self):
         models = [item['service'] for item in SupportedServices.get_service_models().values()]
-        return self._total_count(models)
+        return self._get_counter('services', lambda: self._total_count(models))
 
     def _total_count(self, models):
         return sum(self._count_model(model) for model in models)
@@ -1304,23 +1331,28 @@ class ProjectCountersView(BaseCounterView):
         }
         return fields
 
+    def can_use_stored_counters(self):
+        # All entities of project are visible to users who are able to see project.
+        return True
+
     def get_alerts(self):
         return self._get_alerts('project')
 
     def get_vms(self):
-        return self._total_count(models.VirtualMachine.get_all_models())
+        return self._get_counter('vms', lambda: self._total_count(models.VirtualMachine.get_all_models()))
 
     def get_apps(self):
-        return self._total_count(models.ApplicationMixin.get_all_models())
+        return self._get_counter('apps', lambda: self._total_count(models.ApplicationMixin.get_all_models()))
 
     def get_private_clouds(self):
-        return self._total_count(models.PrivateCloud.get_all_models())
+        return self._get_counter(
+            'private_clouds', lambda: self._total_count(models.PrivateCloud.get_all_models()))
 
     def get_storages(self):
-        return self._total_count(models.Storage.get_all_models())
+        return self._get_counter('storages', lambda: self._total_count(models.Storage.get_all_models()))
 
     def get_users(self):
-        return self.object.get_users().count()
+        return self._get_counter('users', lambda: self.object.get_users().count())
 
     def _total_count(self, models):
         return sum(self._count_model(model) for model in models)
@@ -1647,12 +1679,17 @@ class QuotaTimelineStatsView(views.APIView):
         ranges = self.get_ranges(request)
         items = request.query_params.getlist('item') or self.get_all_spls_quotas()
 
+        quotas = self.get_quotas(scopes, items)
+        states = quotas_history.get_states([quota.pk for quota in quotas], [end for end, _ in ranges])
+
         collector = QuotaTimelineCollector()
-        for item in items:
-            for scope in scopes:
-                values = self.get_stats_for_scope(item, scope, ranges)
-                for (end, start), (limit, usage) in zip(ranges, values):
-                    collector.add_quota(start, end, item, limit, usage)
+        for quota in quotas:
+            for (end, start), state in zip(ranges, states[quota.pk]):
+                # Stats of quota are collected until the first point without quota history.
+                if state is None:
+                    break
+                usage, limit = state
+                collector.add_quota(start, end, quota.name, limit, usage)
 
         stats = list(map(sort_dict, collector.to_dict()))[::-1]
         return Response(stats, status=status.HTTP_200_OK)
@@ -1676,25 +1713,16 @@ class QuotaTimelineStatsView(views.APIView):
                       for m in models.ServiceProjectLink.get_all_models()]
         return sum([spl_model.get_quotas_names() for spl_model in spl_models], [])
 
-    def get_stats_for_scope(self, quota_name, scope, dates):
-        stats_data = []
-        try:
-            quota = scope.quotas.get(name=quota_name)
-        except Quota.DoesNotExist:
-            return stats_data
-        versions = Version.objects.get_for_object(quota).select_related('revision').filter(
-            revision__date_created__lte=dates[0][0]).iterator()
-        version = None
-        for end, start in dates:
-            try:
-                while version is None or version.revision.date_created > end:
-                    version = next(versions)
-                stats_data.append((version._object_version.object.limit,
-                                   version._object_version.object.usage))
-            except StopIteration:
-                break
-
-        return stats_data
+    def get_quotas(self, scopes, quota_names):
+        """ Return quotas of scopes with given names, quotas are fetched with one query per scope model. """
+        scopes_ids = defaultdict(list)
+        for scope in scopes:
+            scopes_ids[scope.__class__].append(scope.pk)
+        quotas = []
+        for model, ids in scopes_ids.items():
+            content_type = ContentType.objects.get_for_model(model)
+            quotas.extend(Quota.objects.filter(content_type=content_type, object_id__in=ids, name__in=quota_names))
+        return quotas
 
     def get_ranges(self, request):
         mapped = {